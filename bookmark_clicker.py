@@ -15,303 +15,620 @@ Usage:
 1. Make sure you have enabled Accessibility permissions for your terminal or IDE.
    (System Settings -> Privacy & Security -> Accessibility)
 2. Run `pip install -r requirements.txt`.
-3. Update the CONFIG section in the script if needed.
-4. Run the script: `python bookmark_clicker.py`
+3. Adjust config.json if needed; edits are picked up while the script runs.
+4. Run the script: `python bookmark_clicker.py` (optionally `--config PATH` and `--set NAME=VALUE`)
 """
-import subprocess
+from __future__ import annotations
+
+import argparse
+import json
 import time
 import logging
-import sys
 import os
 import threading
-from typing import Optional, Tuple, List
+from typing import Any, Dict, Optional, Set, Tuple, List
 
-import cv2
-import numpy as np
-import pyautogui
-from pynput import keyboard
-from PIL import Image
+# Process start, for the launch-to-ready time
+LAUNCHED = time.perf_counter()
 
 # --- CONFIGURATION ---
-from src.config import (
-    IMAGE_PATH, CONFIDENCE, CLICK_DELAY, SCAN_DELAY,
-    WATCHDOG_LIMIT, DOWNSCALE_FACTOR, USE_GRAYSCALE,
-    BLACKLIST_DURATION, TOOLBAR_HEIGHT, TOGGLE_HOTKEY
-)
-
-CONFIG = {
-    "image_path": IMAGE_PATH,
-    "confidence": CONFIDENCE,
-    "click_delay": CLICK_DELAY,
-    "scan_delay": SCAN_DELAY,
-    "watchdog_limit": WATCHDOG_LIMIT,
-    "downscale_factor": DOWNSCALE_FACTOR,
-    "use_grayscale": USE_GRAYSCALE,
-    "blacklist_duration": BLACKLIST_DURATION,
-    "hotkey": TOGGLE_HOTKEY
-}
+from src.config import CONFIG_WATCH_INTERVAL
+from src.buffers import FrameBuffers, thread_buffers
+from src.clicker import ClickExecutor
+from src.controller import PAUSED, RUNNING, Controller
+from src.engine import MatchEngine
+from src.frames import FrameSource, ScreenSource
+from src.history import ClickHistory
+from src.incremental import IncrementalMatcher
+from src.lazy import lazy_import, preload
+from src.log import THROTTLE, log_event, setup_logging, shutdown_logging
+from src.matcher import detect_from_responses, refine_candidates
+from src.metrics import MetricsServer, PeriodicReporter, dump_metrics, get_metrics, install_dump_signal
+from src.parallel import ParallelMatcher
+from src.pipeline import Detections, Frame, Matches, Pipeline
+from src.region import AppleScriptBackend, RegionTracker
+from src.scheduler import ScanScheduler
+from src.settings import RESTART_REQUIRED, ConfigWatcher, Settings, load_settings, parse_overrides
+from src.templates import get_template_store
+from src.tracker import IconTracker
+from src.transform import frame_transform, image_size
+
+# Defaults from src/config.py until main() loads config.json, BOOKMARK_CLICKER_*
+# variables and --set options. Replaced as a whole when the file changes, so read
+# it once per stage for a consistent view.
+CONFIG = Settings()
+
+# Heavy libraries load on first use, or in warm_up() while the browser is detected,
+# so --help and --check-config never pay for them
+np = lazy_import("numpy")
+pyautogui = lazy_import("pyautogui")
+keyboard = lazy_import("pynput.keyboard")
 
 # --- GLOBAL STATE ---
 STATE = {
-    "paused": True,
-    "running": True,
     "click_count": 0,
     "region": None, # (x, y, width, height)
+    "screen_size": None, # (width, height) when the region was last read
+    "matches": 0, # bookmarks found by the latest scan
 }
 
-# --- LOGGING SETUP ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] - %(message)s",
-    handlers=[
-        logging.FileHandler("bookmark_clicker.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-
-def get_browser_region() -> Optional[Tuple[int, int, int, int]]:
-    """Gets the active browser window's toolbar region using AppleScript."""
-    applescript = '''
-    tell application "System Events"
-        set frontApp to name of first application process whose frontmost is true
-    end tell
-    try
-        tell application frontApp
-            if frontApp is in {"Google Chrome", "Safari", "Firefox", "Microsoft Edge", "Brave Browser"} then
-                get bounds of front window
-            else
-                error "Active window is not a supported browser."
-            end if
-        end tell
-    on error
-        return missing value
-    end try
-    '''
-    try:
-        proc = subprocess.Popen(['osascript', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        stdout, stderr = proc.communicate(applescript)
-
-        if proc.returncode != 0 or "missing value" in stdout:
-            logging.error(f"AppleScript Error: {stderr.strip()}")
-            return None
-
-        bounds_str = stdout.strip()
-        x, y, x2, y2 = [int(v) for v in bounds_str.split(', ')]
-        logging.info(f"Detected browser region: ({x}, {y}, {x2-x}, {y2-y})")
-        # Only return the toolbar region
-        return (x, y, x2 - x, TOOLBAR_HEIGHT)
-    except Exception as e:
-        logging.error(f"Failed to execute AppleScript: {e}")
+# Run/pause/stop; starts paused and every wait in the loop wakes on a change
+CONTROLLER = Controller(paused=True)
+
+# Stage latencies and counters; read via the log, SIGUSR1, a hotkey or /metrics
+METRICS = get_metrics()
+
+# The rest is built from the loaded settings by init_runtime(). Importing this
+# script, as spawned matcher processes do, constructs none of it.
+
+# Browser bounds are refreshed in the background; the loop only reads memory
+REGION_TRACKER: Optional[RegionTracker] = None
+
+# Live capture; swap for another FrameSource to replay recorded frames
+FRAME_SOURCE: Optional[FrameSource] = None
+
+# Every template variant is matched in one batch per frame
+MATCH_ENGINE: Optional[MatchEngine] = None
+
+# Carries response maps between scans so unchanged tiles are not re-matched
+INCREMENTAL_MATCHER: Optional[IncrementalMatcher] = None
+
+# Process pool for large frames; None when parallel matching is disabled
+PARALLEL_MATCHER: Optional[ParallelMatcher] = None
+
+# Follows icons between full detections; None when tracking is disabled
+TRACKER: Optional[IconTracker] = None
+
+# Decides when each scan happens and paces clicks; retuned in place on reload
+SCHEDULER: Optional[ScanScheduler] = None
+
+# Clicks whole batches in a short cursor path, paced without PyAutoGUI's per-call PAUSE
+CLICK_EXECUTOR: Optional[ClickExecutor] = None
+
+# Recent clicks and blacklisted coordinates, matched with a pixel tolerance
+HISTORY: Optional[ClickHistory] = None
+
+def current_region() -> Tuple[int, int, int, int]:
+    """Read the browser region kept current by the region tracker."""
+    # A display or resolution change moves the window; re-query instead of waiting out the TTL
+    screen_size = CLICK_EXECUTOR.screen_size()
+    if STATE["screen_size"] is not None and screen_size != STATE["screen_size"]:
+        REGION_TRACKER.invalidate()
+    STATE["screen_size"] = screen_size
+    with METRICS.timer("region"):
+        new_region = REGION_TRACKER.current()
+    if new_region:
+        STATE['region'] = new_region
+    else:
+        METRICS.inc("region_fallbacks")
+        logging.warning('Browser region lost. Falling back to full screen.', extra=THROTTLE)
+        STATE['region'] = (0, 0, *CLICK_EXECUTOR.screen_size())
+    return STATE['region']
+
+def build_match_engine(settings: Settings) -> MatchEngine:
+    """Every template variant is matched in one batch per frame."""
+    return MatchEngine(
+        {"bookmark": settings["image_path"], **settings["extra_templates"]},
+        backend=settings["match_backend"],
+    )
+
+def build_tracker(settings: Settings) -> Optional[IconTracker]:
+    """Follows icons between full detections and gives them stable IDs; None when disabled."""
+    if not settings["tracking"]:
         return None
+    return IconTracker(
+        settings["track_redetect_interval"],
+        search_margin=settings["track_search_margin"],
+        max_misses=settings["track_max_misses"],
+        confidence=settings["confidence"],
+    )
+
+def build_parallel_matcher(settings: Settings) -> Optional[ParallelMatcher]:
+    """Process pool for large frames; None when parallel matching is disabled."""
+    if not settings["parallel_matching"]:
+        return None
+    return ParallelMatcher(
+        settings["parallel_workers"],
+        tile_size=settings["parallel_tile_size"],
+        confidence=settings["confidence"],
+        iou_threshold=settings["nms_iou_threshold"],
+    )
+
+def template_downscales(settings: Settings) -> Tuple[float, ...]:
+    """The downscale factors templates are matched at: coarse and native with coarse-to-fine."""
+    if settings["coarse_to_fine"]:
+        return min(settings["coarse_downscale_factor"], 1.0), 1.0
+    return (min(settings["downscale_factor"], 1.0),)
+
+def init_runtime(settings: Settings) -> None:
+    """Build the capture, matching, scheduling and clicking state from ``settings``.
+
+    Called once by main() after the settings are loaded; later changes go
+    through apply_settings().
+    """
+    global CONFIG, REGION_TRACKER, FRAME_SOURCE, MATCH_ENGINE, INCREMENTAL_MATCHER
+    global PARALLEL_MATCHER, TRACKER, SCHEDULER, CLICK_EXECUTOR, HISTORY
+    CONFIG = settings
+    REGION_TRACKER = RegionTracker(
+        AppleScriptBackend(), ttl=settings["region_refresh_interval"], toolbar_height=settings["toolbar_height"]
+    )
+    FRAME_SOURCE = ScreenSource(current_region)
+    MATCH_ENGINE = build_match_engine(settings)
+    INCREMENTAL_MATCHER = IncrementalMatcher(confidence=settings["confidence"])
+    PARALLEL_MATCHER = build_parallel_matcher(settings)
+    TRACKER = build_tracker(settings)
+    SCHEDULER = ScanScheduler(
+        min_interval=settings["scan_min_interval"],
+        max_interval=settings["scan_max_interval"],
+        initial_interval=settings["scan_delay"],
+        backoff=settings["scan_backoff"],
+        click_interval=settings["click_delay"],
+    )
+    CLICK_EXECUTOR = ClickExecutor(
+        interval=settings["click_delay"],
+        order=settings["click_order"],
+        geometry_ttl=settings["click_geometry_ttl"],
+        metrics=METRICS,
+    )
+    HISTORY = ClickHistory(
+        settings['click_tolerance'], settings['blacklist_duration'], capacity=settings['history_capacity']
+    )
+    # Templates load with the variants the configured scans use already built
+    get_template_store().warm(template_downscales(settings))
+
+def apply_settings(settings: Settings) -> Settings:
+    """Swap in reloaded settings, rebuilding only the state that depends on what changed.
+
+    Thresholds, delays, downscale and grayscale take effect from the next scan.
+    The match engine is rebuilt only when a template or the backend changes, and
+    the tracker only when tracking is switched or its interval changes; caches
+    keyed by downscale rebuild themselves when they see new template variants.
+    Settings in RESTART_REQUIRED are recorded but only take effect on restart.
+
+    Args:
+        settings: The new settings
+
+    Returns:
+        The settings now in effect: ``settings`` with any rejected values kept at their old ones
+    """
+    global CONFIG, MATCH_ENGINE, TRACKER
+    old = CONFIG
+    changed = old.diff(settings)
+    if not changed:
+        return old
+
+    if changed & {"image_path", "extra_templates", "match_backend"}:
+        engine = build_match_engine(settings)
+        try:
+            # Load before swapping so a bad path leaves the running engine in place
+            for path in engine.templates.values():
+                get_template_store().get(path)
+        except ValueError as e:
+            logging.error(f"Keeping the previous templates: {e}")
+            settings = settings.replace(**{name: old[name] for name in ("image_path", "extra_templates", "match_backend")})
+            changed = old.diff(settings)
+        else:
+            MATCH_ENGINE = engine
+
+    if "confidence" in changed:
+        INCREMENTAL_MATCHER.confidence = settings["confidence"]
+        if PARALLEL_MATCHER is not None:
+            PARALLEL_MATCHER.confidence = settings["confidence"]
+    if changed & {"tracking", "track_redetect_interval", "track_search_margin", "track_max_misses"}:
+        TRACKER = build_tracker(settings)
+    elif TRACKER is not None and "confidence" in changed:
+        TRACKER.confidence = settings["confidence"]
+    if changed & {"scan_min_interval", "scan_max_interval", "scan_backoff", "click_delay"}:
+        SCHEDULER.retune(
+            min_interval=settings["scan_min_interval"],
+            max_interval=settings["scan_max_interval"],
+            backoff=settings["scan_backoff"],
+            click_interval=settings["click_delay"],
+        )
+    if "click_delay" in changed:
+        CLICK_EXECUTOR.interval = settings["click_delay"]
+    if "click_order" in changed:
+        CLICK_EXECUTOR.order = settings["click_order"]
+    if "click_geometry_ttl" in changed:
+        CLICK_EXECUTOR.geometry_ttl = settings["click_geometry_ttl"]
+    if PARALLEL_MATCHER is not None and changed & {"nms_iou_threshold", "parallel_tile_size"}:
+        PARALLEL_MATCHER.iou_threshold = settings["nms_iou_threshold"]
+        PARALLEL_MATCHER.tile_size = settings["parallel_tile_size"]
+    if "blacklist_duration" in changed:
+        HISTORY.blacklist_rounds = settings["blacklist_duration"]
+    if changed & {"downscale_factor", "coarse_downscale_factor", "coarse_to_fine"}:
+        get_template_store().warm(template_downscales(settings))
+    if "toolbar_height" in changed:
+        REGION_TRACKER.toolbar_height = settings["toolbar_height"]
+    if "region_refresh_interval" in changed:
+        REGION_TRACKER.ttl = settings["region_refresh_interval"]
+
+    pending = changed & RESTART_REQUIRED
+    if pending:
+        logging.warning(f"Restart to apply: {', '.join(sorted(pending))}")
+    CONFIG = settings
+    if changed - RESTART_REQUIRED:
+        logging.info(f"Settings reloaded: {', '.join(sorted(changed - RESTART_REQUIRED))}")
+    return settings
+
+def watch_settings(path: Optional[str], overrides: Dict[str, Any]) -> ConfigWatcher:
+    """A ConfigWatcher, not yet started, that applies every reload to the running loop."""
+    watcher = ConfigWatcher(CONFIG, path, CONFIG_WATCH_INTERVAL, overrides=overrides)
+
+    def reload(old: Settings, new: Settings, changed: Set[str]) -> None:
+        # The next reload is compared with what took effect, not with a rejected template
+        watcher.settings = apply_settings(new)
+
+    watcher.add_listener(reload)
+    return watcher
+
+def capture_region() -> Optional[Tuple[Tuple[int, int, int, int], np.ndarray]]:
+    """Capture stage: screenshot the current browser region."""
+    return FRAME_SOURCE.read()
+
+def match_responses(image: np.ndarray, variants: list, buffers: Optional[FrameBuffers] = None) -> list:
+    """Perform multi-scale, multi-template matching, reusing unchanged tiles if enabled."""
+    engine = MATCH_ENGINE
+    if CONFIG['incremental_matching']:
+        # Full scans still use the configured backend
+        return INCREMENTAL_MATCHER.responses(image, variants, engine.responses)
+    return engine.responses(image, variants, buffers)
+
+def detect_bookmarks(frame: Frame) -> Matches:
+    """Match stage: find unique bookmark rects in a captured frame, and how they map to the screen."""
+    # One consistent view even if the settings are reloaded mid-scan
+    config, engine, tracker = CONFIG, MATCH_ENGINE, TRACKER
+
+    # Convert screenshot for template matching, into this thread's reusable buffers
+    buffers = thread_buffers()
+    screenshot_cv = frame.image
+    if config['use_grayscale']:
+        with METRICS.timer("convert"):
+            screenshot_cv = buffers.to_gray(screenshot_cv)
+
+    # Downscale the screenshot for faster processing if needed; coarse-to-fine
+    # searches an aggressively downscaled copy and verifies at native resolution
+    full_cv = screenshot_cv
+    if config['coarse_to_fine']:
+        downscale = min(config['coarse_downscale_factor'], 1.0)
+    else:
+        downscale = min(config['downscale_factor'], 1.0)
+    with METRICS.timer("resize"):
+        screenshot_cv = buffers.downscale(screenshot_cv, downscale)
+
+    # Templates are cached per (downscale x scale); no disk reads or resizes once warm
+    variants, labels = engine.variants(config['use_grayscale'], downscale)
+
+    fine_variants, fine_labels = engine.variants(config['use_grayscale'], 1.0)
+
+    def detect_all() -> list:
+        # One scored box per icon: local maxima, then NMS across every scale and template.
+        # With coarse-to-fine this proposes candidates, verified at native resolution below
+        threshold = config['coarse_confidence'] if config['coarse_to_fine'] else config['confidence']
+        if PARALLEL_MATCHER is not None and PARALLEL_MATCHER.worthwhile(screenshot_cv):
+            # Large frames (e.g. the full-screen fallback) are split across worker processes
+            METRICS.inc("parallel_scans")
+            with METRICS.timer("match"):
+                found = PARALLEL_MATCHER.detect(screenshot_cv, variants, labels, confidence=threshold)
+        else:
+            with METRICS.timer("match"):
+                responses = match_responses(screenshot_cv, variants, buffers)
+            with METRICS.timer("group"):
+                found = detect_from_responses(
+                    responses, variants, threshold, config['nms_iou_threshold'], labels=labels
+                )
+        if not config['coarse_to_fine']:
+            return found
+        with METRICS.timer("group"):
+            return refine_candidates(
+                full_cv, found, fine_variants, downscale, config['confidence'], config['nms_iou_threshold'],
+                labels=fine_labels
+            )
+
+    if tracker is not None:
+        # Known icons are re-verified locally; full detection only every few scans or on loss
+        with METRICS.timer("track"):
+            if config['coarse_to_fine']:
+                unique_rects = tracker.update(full_cv, fine_variants, fine_labels, detect_all)
+            else:
+                unique_rects = tracker.update(screenshot_cv, variants, labels, detect_all)
+    else:
+        unique_rects = detect_all()
+
+    # Rects are in the pixels of the image they were matched in: native with
+    # coarse-to-fine, otherwise the downscaled copy
+    matched = full_cv if config['coarse_to_fine'] else screenshot_cv
+    transform = frame_transform(tuple(frame.region), image_size(frame.image), image_size(matched))
+
+    if not unique_rects and STATE["matches"]:
+        # Bookmarks vanishing at once usually means focus moved or the window was resized
+        REGION_TRACKER.invalidate()
+    STATE["matches"] = len(unique_rects)
+
+    if not unique_rects:
+        logging.info("No bookmarks found in this scan.", extra=THROTTLE)
+    else:
+        logging.info(f"Found {len(unique_rects)} unique bookmarks.", extra=THROTTLE)
+    latency = time.monotonic() - frame.captured_at
+    METRICS.observe("scan", latency)
+    METRICS.inc("scans")
+    log_event("scan", seq=frame.seq, matches=len(unique_rects), latency_ms=round(latency * 1000, 2))
+    return Matches(unique_rects, transform)
+
+def click_bookmarks(batch: Detections, pipeline: Pipeline, history: ClickHistory) -> int:
+    """Click stage: click every detection in a batch that isn't blacklisted.
+
+    Returns:
+        The number of clicks made in this round
+    """
+    # --- BLACKLIST LOGIC START ---
+    # Only entries that expire this round are touched
+    history.next_round()
+
+    # 3. Pick the targets, then click them as one batch
+    points = []
+    track_ids = []
+    # Box centres in screen points: region offset, downscale and backing scale in one step
+    centers = batch.screen_transform().centers(batch.rects).tolist()
+    for rect, coord in zip(batch.rects, centers):
+        coord = tuple(coord)
+        # Tracked detections also carry an identity that survives larger moves
+        track_id = getattr(rect, "track_id", None)
+
+        # Blacklist check, within CONFIG['click_tolerance'] pixels
+        if history.is_blacklisted(coord, track_id):
+            METRICS.inc("blacklist_hits")
+            logging.info(f"Skipping blacklisted coordinate {coord}", extra=THROTTLE)
+            continue
 
-def group_rectangles(rects: List[Tuple[int, int, int, int]], threshold: int = 10) -> List[Tuple[int, int, int, int]]:
-    """Groups overlapping rectangles to avoid multiple clicks on the same item."""
-    if not rects:
-        return []
+        # If this coordinate was clicked last round, blacklist it
+        if history.clicked_last_round(coord, track_id):
+            history.ban(coord, track_id)
+            logging.info(f"Blacklisting coordinate {coord} for {CONFIG['blacklist_duration']} rounds")
+            continue
 
-    # Sort rectangles by their x-coordinate
-    rects.sort(key=lambda r: r[0])
-    
-    grouped = []
-    current_group = list(rects[0])
-
-    for i in range(1, len(rects)):
-        rect = rects[i]
-        # Check for overlap or proximity
-        if rect[0] < current_group[0] + current_group[2] + threshold:
-            # Merge rectangles
-            new_x2 = max(current_group[0] + current_group[2], rect[0] + rect[2])
-            new_y2 = max(current_group[1] + current_group[3], rect[1] + rect[3])
-            current_group[0] = min(current_group[0], rect[0])
-            current_group[1] = min(current_group[1], rect[1])
-            current_group[2] = new_x2 - current_group[0]
-            current_group[3] = new_y2 - current_group[1]
-        else:
-            grouped.append(tuple(current_group))
-            current_group = list(rect)
-    
-    grouped.append(tuple(current_group))
-    return grouped
+        points.append(coord)
+        track_ids.append(track_id)
+
+    def should_stop() -> bool:
+        # Stop on pause/exit, or when a newer frame has already been matched
+        return pipeline.interrupted() or pipeline.superseded(batch)
+
+    def on_click(index: int, point: Tuple[int, int]) -> None:
+        # The scheduler brings the next scan forward after each click
+        pipeline.scheduler.record_click()
+        # Capture to click, the end-to-end cycle the 300 ms target applies to
+        latency = time.monotonic() - batch.captured_at
+        METRICS.observe("cycle", latency)
+        METRICS.inc("clicks")
+        STATE["click_count"] += 1
+        logging.info(f"Clicked bookmark #{STATE['click_count']} at {point}")
+        log_event(
+            "click", seq=batch.seq, x=point[0], y=point[1], track=track_ids[index], latency_ms=round(latency * 1000, 2)
+        )
+        history.record_click(point, track_ids[index])
+
+        if STATE["click_count"] >= CONFIG["watchdog_limit"]:
+            logging.info(f"Watchdog limit of {CONFIG['watchdog_limit']} reached. Stopping.")
+            CONTROLLER.stop()
+
+    try:
+        result = CLICK_EXECUTOR.run(points, should_stop, on_click)
+    except pyautogui.FailSafeException:
+        # Raised by the input backend, not the screenshot, when the mouse hits a corner
+        METRICS.inc("failsafe_stops")
+        logging.error('PyAutoGUI fail-safe triggered. Stopping.')
+        CONTROLLER.stop()
+        return 0
+    if result.skipped:
+        screen_width, screen_height = CLICK_EXECUTOR.screen_size()
+        logging.warning(f"Skipped {result.skipped} coordinates outside screen bounds ({screen_width}x{screen_height})")
+
+    # --- BLACKLIST LOGIC END ---
+    return len(result.clicked)
+
+def warm_up():
+    """Load the matching and automation libraries and the templates before the first scan."""
+    # Failures are left for the automation loop, which reports them when it needs the same things
+    try:
+        preload(("numpy", "cv2"))
+        config = CONFIG
+        for downscale in template_downscales(config):
+            MATCH_ENGINE.variants(config['use_grayscale'], downscale)
+    except ValueError as e:
+        logging.debug(f"Template warm-up failed: {e}")
+
+    # Check for accessibility permissions (heuristic); this also loads pyautogui
+    if not pyautogui.onScreen(0, 0):
+        logging.warning("Accessibility permissions may not be granted. This is a common cause of issues.")
+        logging.warning("Please ensure your terminal/IDE has accessibility access in System Settings.")
 
 def automation_loop():
-    """The main loop for screenshotting, matching, and clicking."""
+    """The main loop: runs the capture, match and click stages as a pipeline."""
     logging.info("Automation loop started. Press hotkey to begin.")
 
-    # Initialize blacklist and history for coordinates
-    blacklist = {}  # (x, y) -> rounds left
-    last_clicked = set()
-
     try:
-        # Load and process template image
-        template = cv2.imread(CONFIG["image_path"], cv2.IMREAD_GRAYSCALE)
-        if template is None:
-            logging.error(f"Failed to load template image from {CONFIG['image_path']}")
-            STATE["running"] = False
-            return
-    except Exception as e:
-        logging.error(f"Failed to load template: {e}")
-        STATE["running"] = False
+        # Load the templates once; the store keeps every scaled variant in memory
+        for path in MATCH_ENGINE.templates.values():
+            get_template_store().get(path)
+    except ValueError as e:
+        logging.error(str(e))
+        CONTROLLER.stop()
         return
 
-    h, w = template.shape
-    while STATE["running"]:
-        if STATE["paused"]:
-            time.sleep(0.5)
-            continue
-
-        try:
-            # Refresh browser region periodically
-            new_region = get_browser_region()
-            if new_region:
-                STATE['region'] = new_region
-            else:
-                logging.warning('Browser region lost. Falling back to full screen.')
-                STATE['region'] = (0, 0, *pyautogui.size())
-
-            # Take a screenshot of the browser region
-            try:
-                screenshot = pyautogui.screenshot(region=STATE["region"])
-            except pyautogui.FailSafeException:
-                logging.error('PyAutoGUI fail-safe triggered. Stopping.')
-                STATE['running'] = False
-                continue
-            
-            # Convert screenshot for template matching
-            screenshot_cv = np.array(screenshot)
-            if CONFIG['use_grayscale']:
-                screenshot_cv = cv2.cvtColor(screenshot_cv, cv2.COLOR_RGB2GRAY)
-                template = cv2.imread(CONFIG["image_path"], cv2.IMREAD_GRAYSCALE)
-            else:
-                template = cv2.imread(CONFIG["image_path"], cv2.IMREAD_COLOR)
-
-            # Downscale both images for faster processing if needed
-            if CONFIG['downscale_factor'] < 1.0:
-                h, w = screenshot_cv.shape[:2]
-                new_h = int(h * CONFIG["downscale_factor"])
-                new_w = int(w * CONFIG["downscale_factor"])
-                screenshot_cv = cv2.resize(screenshot_cv, (new_w, new_h))
-                template = cv2.resize(template, (0, 0), fx=CONFIG["downscale_factor"], fy=CONFIG["downscale_factor"])
-
-            # Perform multi-scale template matching
-            matches = match_template_at_scales(screenshot_cv, template)
-
-            unique_rects = group_rectangles(matches)
-
-            if not unique_rects:
-                logging.info("No bookmarks found in this scan.")
-            else:
-                logging.info(f"Found {len(unique_rects)} unique bookmarks.")
-
-            # --- BLACKLIST LOGIC START ---
-            # Decrement blacklist and remove expired
-            expired = []
-            for coord in blacklist:
-                blacklist[coord] -= 1
-                if blacklist[coord] <= 0:
-                    expired.append(coord)
-            for coord in expired:
-                del blacklist[coord]
-
-            current_clicked = set()
-            # 3. Click & Count
-            for rect in unique_rects:
-                if STATE["paused"] or not STATE["running"]:
-                    break
-                
-                # Validate coordinates are within screen bounds
-                screen_width, screen_height = pyautogui.size()
-                if not (0 <= rect[0] <= screen_width and 0 <= rect[1] <= screen_height):
-                    logging.warning(f'Invalid coordinate {rect} outside screen bounds ({screen_width}x{screen_height})')
-                    continue
-
-                # Map back to full resolution
-                original_x = int((rect[0] + rect[2] / 2)) + STATE["region"][0]
-                original_y = int((rect[1] + rect[3] / 2)) + STATE["region"][1]
-
-                # Blacklist check
-                if coord in blacklist:
-                    logging.info(f"Skipping blacklisted coordinate {coord}")
-                    continue
-
-                # If this coordinate was clicked last round, blacklist it for 2 rounds
-                if coord in last_clicked:
-                    blacklist[coord] = CONFIG['blacklist_duration']
-                    logging.info(f"Blacklisting coordinate {coord} for {CONFIG['blacklist_duration']} rounds")
-                    continue
-
-                pyautogui.click(original_x, original_y)
-                STATE["click_count"] += 1
-                logging.info(f"Clicked bookmark #{STATE['click_count']} at ({original_x}, {original_y})")
-                current_clicked.add(coord)
-
-                if STATE["click_count"] >= CONFIG["watchdog_limit"]:
-                    logging.info(f"Watchdog limit of {CONFIG['watchdog_limit']} reached. Stopping.")
-                    STATE["running"] = False
-                    break
-
-                time.sleep(CONFIG["click_delay"])
-
-            # Update last_clicked for next round
-            last_clicked = current_clicked
-            # --- BLACKLIST LOGIC END ---
-
-        except Exception as e:
-            logging.error(f"An error occurred in the automation loop: {e}")
-            # Optional: could pause or stop on error
-            # STATE["paused"] = True
-
-        time.sleep(CONFIG["scan_delay"])
+    def click_stage(batch: Detections, pipeline: Pipeline) -> None:
+        click_bookmarks(batch, pipeline, HISTORY)
+
+    ready = time.perf_counter() - LAUNCHED
+    METRICS.observe("startup", ready)
+    logging.info(f"Ready to scan {ready * 1000:.0f} ms after launch.")
+
+    pipeline = Pipeline(
+        capture=capture_region,
+        match=detect_bookmarks,
+        click=click_stage,
+        controller=CONTROLLER,
+        match_workers=CONFIG["match_workers"],
+        scheduler=SCHEDULER,
+    )
+    try:
+        pipeline.run()
+    finally:
+        if PARALLEL_MATCHER is not None:
+            PARALLEL_MATCHER.close()
+        logging.info(f"Scan scheduler: {pipeline.scheduler.metrics()}")
+        logging.info(f"Click history: {HISTORY.stats()}")
+        if TRACKER is not None:
+            logging.info(f"Tracker: {TRACKER.stats()}")
 
     logging.info("Automation loop finished.")
 
 def on_toggle_pause():
     """Callback function for the hotkey to toggle pause/resume."""
-    STATE["paused"] = not STATE["paused"]
-    status = "Paused" if STATE["paused"] else "Resumed"
-    logging.info(f"--- {status} ---")
+    # Timed until the pipeline first sees the new state (hotkey_latency)
+    METRICS.mark("hotkey")
+    CONTROLLER.toggle()
 
 def on_exit():
     """Callback function to stop the script."""
     logging.info("Exit hotkey pressed. Shutting down.")
-    STATE["running"] = False
-
-def main():
-    """Main function to set up and run the application."""
+    CONTROLLER.stop()
+
+def on_state_change(old: str, new: str):
+    """Controller observer: report pause/resume, pause region polling with the loop and cut clicking short."""
+    if new != RUNNING:
+        # A batch in progress stops within milliseconds rather than at its next click
+        CLICK_EXECUTOR.cancel()
+    if new == PAUSED:
+        logging.info("--- Paused ---")
+        REGION_TRACKER.suspend()
+    elif new == RUNNING:
+        logging.info("--- Resumed ---")
+        # The cancel from pausing must not cut short the first batch after resuming
+        CLICK_EXECUTOR.clear_cancel()
+        REGION_TRACKER.resume()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Command-line options; ``--set`` values take precedence over the file and environment."""
+    parser = argparse.ArgumentParser(description="Click bookmark icons in the frontmost browser window.")
+    parser.add_argument("--config", help="Settings file, JSON or TOML (default: config.json)")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Override one setting, e.g. --set confidence=0.85 (repeatable)"
+    )
+    parser.add_argument("--check-config", action="store_true", help="Print the validated settings and exit")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    """Main function to set up and run the application.
+
+    Args:
+        argv: Command-line options; None reads ``sys.argv``
+    """
+    args = parse_args(argv)
+    try:
+        overrides = parse_overrides(args.set)
+        settings = load_settings(args.config, overrides=overrides)
+    except (OSError, ValueError) as e:
+        # Logging is not set up yet, so this goes to stderr and the log file is left alone
+        logging.error(f"Could not load settings: {e}")
+        raise SystemExit(1)
+    if args.check_config:
+        print(json.dumps(settings.as_dict(), indent=2))
+        return
+    init_runtime(settings)
+
+    # Records are queued and written by a background thread; the loop never waits on disk
+    setup_logging(
+        CONFIG["log_path"],
+        max_bytes=CONFIG["log_max_bytes"],
+        when=CONFIG["log_rotate_when"],
+        json_path=CONFIG["log_json_path"],
+        repeat_interval=CONFIG["log_repeat_interval"],
+        sample_every=CONFIG["log_sample_every"],
+    )
     logging.info("Starting Bookmark Clicker.")
 
+    # Imports and template preparation overlap with hotkey setup and browser detection
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
     # Set up a listener for the exit hotkey first, so the user can always quit.
     exit_listener = keyboard.GlobalHotKeys({
-        '<cmd>+<shift>+q': on_exit
+        CONFIG["exit_hotkey"]: on_exit
     })
     exit_listener.start()
-    logging.info("Press <cmd>+<shift>+q to quit at any time.")
-
-    # Check for accessibility permissions (heuristic)
-    if not pyautogui.onScreen(0, 0):
-        logging.warning("Accessibility permissions may not be granted. This is a common cause of issues.")
-        logging.warning("Please ensure your terminal/IDE has accessibility access in System Settings.")
+    logging.info(f"Press {CONFIG['exit_hotkey']} to quit at any time.")
 
     # Repeatedly try to get the browser region until successful
     logging.info("Attempting to detect a supported browser window...")
     logging.info("Please make sure the browser is the frontmost window.")
     
-    while STATE["region"] is None and STATE["running"]:
-        STATE["region"] = get_browser_region()
+    while STATE["region"] is None and CONTROLLER.is_running():
+        STATE["region"] = REGION_TRACKER.refresh()
         if STATE["region"] is None:
-            # Check if we should stop, in case the exit hotkey was pressed
-            if not STATE["running"]:
-                break
-            logging.info("Browser not detected. Retrying in 2 seconds...")
-            time.sleep(2)
+            logging.info("Browser not detected. Retrying in 2 seconds...", extra=THROTTLE)
+            # Returns at once if the exit hotkey is pressed
+            CONTROLLER.wait_for_stop(2)
     
-    if not STATE["running"] or STATE["region"] is None:
+    if not CONTROLLER.is_running() or STATE["region"] is None:
         logging.info("Could not detect browser or shutdown was requested. Exiting.")
         exit_listener.stop()
         return
     
     logging.info("Browser detected successfully!")
 
+    # Keep the region fresh off the automation thread; it idles while paused
+    CONTROLLER.add_observer(on_state_change)
+    REGION_TRACKER.start()
+    if CONTROLLER.is_paused():
+        REGION_TRACKER.suspend()
+
+    # Ways to read the metrics while running
+    install_dump_signal(METRICS)
+    reporter = None
+    if CONFIG["metrics_report_interval"]:
+        reporter = PeriodicReporter(METRICS, CONFIG["metrics_report_interval"])
+        reporter.start()
+    server = None
+    if CONFIG["metrics_port"] is not None:
+        try:
+            server = MetricsServer(METRICS, CONFIG["metrics_port"])
+            server.start()
+            logging.info(f"Serving metrics at http://127.0.0.1:{server.port}/metrics")
+        except OSError as e:
+            logging.error(f"Could not start the metrics endpoint: {e}")
+            server = None
+
+    # Tuning changes to the settings file apply to the running loop without a restart
+    watcher = None
+    if CONFIG_WATCH_INTERVAL > 0:
+        watcher = watch_settings(args.config, overrides)
+        watcher.start()
+        logging.info(f"Watching {watcher.path} for changes.")
+
     # Start the automation loop in a separate thread
     automation_thread = threading.Thread(target=automation_loop, daemon=True)
     automation_thread.start()
@@ -321,12 +638,14 @@ def main():
     exit_listener.stop()
     hotkey_map = {
         CONFIG["hotkey"]: on_toggle_pause,
-        '<cmd>+<shift>+q': on_exit,
+        CONFIG["metrics_hotkey"]: dump_metrics,
+        CONFIG["exit_hotkey"]: on_exit,
     }
     
     listener = keyboard.GlobalHotKeys(hotkey_map)
     listener.start()
     logging.info(f"Hotkey listener started. Press {CONFIG['hotkey']} to toggle pause/resume.")
+    logging.info(f"Press {CONFIG['metrics_hotkey']} to log a metrics summary.")
     
     try:
         # Keep the main thread alive to listen for hotkeys
@@ -334,10 +653,19 @@ def main():
     except KeyboardInterrupt:
         logging.info("Keyboard interrupt received. Shutting down.")
     finally:
-        STATE["running"] = False
+        CONTROLLER.stop()
         if listener.is_alive():
             listener.stop()
+        REGION_TRACKER.stop()
+        if watcher is not None:
+            watcher.stop()
+        if reporter is not None:
+            reporter.stop()
+        if server is not None:
+            server.stop()
+        dump_metrics(METRICS)
         logging.info("Application has been shut down.")
+        shutdown_logging()
 
 if __name__ == "__main__":
     main()
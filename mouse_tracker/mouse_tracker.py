@@ -1,99 +1,412 @@
 #!/usr/bin/env python3
-import tkinter as tk
-import pyautogui
+"""
+Mouse Tracker
+
+Shows the cursor position live and moves the mouse to typed-in coordinates,
+for calibrating click targets.
+
+Positions arrive as events from a pynput mouse listener (or a synthetic source
+with --fake) on a background thread and go into a bounded queue. The Tk main
+loop drains it once per frame with after() and makes at most one label update
+per frame, so Tk is only touched from its own thread and bursts of movement
+cost one redraw. With recording on, every drained position also goes into a
+fixed-size ring buffer that can be exported as CSV or a compact binary file.
+"""
+import argparse
+import math
+import struct
+import sys
 import threading
 import time
+import tkinter as tk
+from array import array
+from collections import deque
+from tkinter import filedialog
+
+# Queued positions not yet drained by the UI; the oldest are dropped beyond this
+QUEUE_SIZE = 8192
+# How often the UI drains the queue (about 60 frames per second)
+FRAME_MS = 16
+# Positions kept while recording (16 bytes each); older ones are overwritten
+RECORD_CAPACITY = 200_000
+
+# Binary export: magic, version, sample count, then the t (float64), x and y (int32) columns
+BINARY_MAGIC = b"MTRK"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHI")
+
+
+class PynputSource:
+    """Cursor positions from a pynput mouse listener, delivered on its thread."""
+
+    def __init__(self):
+        self.listener = None
+
+    def start(self, callback):
+        from pynput import mouse
+
+        def on_move(x, y):
+            callback(time.perf_counter(), int(x), int(y))
+
+        def on_click(x, y, button, pressed):
+            callback(time.perf_counter(), int(x), int(y))
+
+        self.listener = mouse.Listener(on_move=on_move, on_click=on_click)
+        self.listener.daemon = True
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+class FakeSource:
+    """Synthetic positions on a circle at a fixed rate, for testing without a mouse.
+
+    Args:
+        rate: Events per second
+        center: Centre of the circle
+        radius: Radius in pixels
+        period: Seconds per revolution
+    """
+
+    def __init__(self, rate=1000.0, center=(500, 400), radius=300, period=2.0):
+        self.rate = rate
+        self.center = center
+        self.radius = radius
+        self.period = period
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, callback):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(callback,), name="fake-mouse", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, callback):
+        start = time.perf_counter()
+        step = 1.0 / self.rate
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            # Catch up in a burst if the thread was descheduled, like a real event storm
+            due = int((now - start) / step) + 1
+            while self.sent < due:
+                angle = 2 * math.pi * (self.sent * step) / self.period
+                x = self.center[0] + round(self.radius * math.cos(angle))
+                y = self.center[1] + round(self.radius * math.sin(angle))
+                callback(start + self.sent * step, x, y)
+                self.sent += 1
+            self._stop.wait(step)
+
+
+class RingRecorder:
+    """Fixed-size record of (time, x, y) in preallocated arrays; the oldest are overwritten.
+
+    Args:
+        capacity: Positions kept
+    """
+
+    def __init__(self, capacity=RECORD_CAPACITY):
+        self.capacity = capacity
+        self.t = array("d", bytes(8 * capacity))
+        self.x = array("i", bytes(4 * capacity))
+        self.y = array("i", bytes(4 * capacity))
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, t, x, y):
+        i = self.total % self.capacity
+        self.t[i] = t
+        self.x[i] = x
+        self.y[i] = y
+        self.total += 1
+
+    def clear(self):
+        self.total = 0
+
+    def columns(self):
+        """The kept positions, oldest first, as (t, x, y) arrays."""
+        if self.total <= self.capacity:
+            n = self.total
+            return self.t[:n], self.x[:n], self.y[:n]
+        i = self.total % self.capacity
+        return self.t[i:] + self.t[:i], self.x[i:] + self.x[:i], self.y[i:] + self.y[:i]
+
+    def export_csv(self, path):
+        """Write ``t,x,y`` rows, with times in seconds from the first position."""
+        t, x, y = self.columns()
+        origin = t[0] if len(t) else 0.0
+        with open(path, "w") as f:
+            f.write("t,x,y\n")
+            f.writelines(f"{ti - origin:.6f},{xi},{yi}\n" for ti, xi, yi in zip(t, x, y))
+
+    def export_binary(self, path):
+        """Write a header and the three columns as little-endian arrays (16 bytes per position)."""
+        t, x, y = self.columns()
+        with open(path, "wb") as f:
+            f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(t)))
+            for column in (t, x, y):
+                if sys.byteorder != "little":
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                column.tofile(f)
+
+    def export(self, path):
+        """CSV for ``.csv`` paths, binary otherwise."""
+        if path.lower().endswith(".csv"):
+            self.export_csv(path)
+        else:
+            self.export_binary(path)
+
+
+def load_binary(path):
+    """Read a binary export back as (t, x, y) arrays."""
+    with open(path, "rb") as f:
+        magic, version, count = BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError(f"{path} is not a mouse tracker recording")
+        columns = []
+        for typecode in ("d", "i", "i"):
+            column = array(typecode)
+            column.fromfile(f, count)
+            if sys.byteorder != "little":
+                column.byteswap()
+            columns.append(column)
+    return tuple(columns)
+
+
+class CursorStream:
+    """Bounded hand-off of positions from a source thread to the UI thread.
+
+    The source thread only appends to a deque; ``drain`` runs on the UI thread,
+    feeds the recorder and returns the newest position.
+
+    Args:
+        source: PynputSource, FakeSource or anything with start(callback) and stop()
+        queue_size: Positions buffered between drains
+        recorder: RingRecorder to fill while ``recording`` is set
+    """
+
+    def __init__(self, source, queue_size=QUEUE_SIZE, recorder=None):
+        self.source = source
+        self.queue = deque(maxlen=queue_size)
+        self.recorder = recorder
+        self.recording = False
+        self.received = 0
+        self.dropped = 0
+        self.drained = 0
+
+    def start(self):
+        self.source.start(self.push)
+
+    def stop(self):
+        self.source.stop()
+
+    def push(self, t, x, y):
+        """Called on the source thread for every position."""
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append((t, x, y))
+        self.received += 1
+
+    def drain(self):
+        """Take every queued position; returns the newest, or None if there was none."""
+        latest = None
+        queue = self.queue
+        record = self.recorder.append if self.recording and self.recorder is not None else None
+        while True:
+            try:
+                latest = queue.popleft()
+            except IndexError:
+                break
+            self.drained += 1
+            if record is not None:
+                record(*latest)
+        return latest
+
 
 class MouseTrackerApp:
-    def __init__(self, root):
+    def __init__(self, root, stream=None, frame_ms=FRAME_MS):
         self.root = root
         self.root.title("Mouse Tracker")
-        self.root.geometry("400x300")
+        self.root.geometry("400x360")
         self.root.resizable(False, False)
-        
+
+        self.stream = stream or CursorStream(PynputSource(), recorder=RingRecorder())
+        self.frame_ms = frame_ms
+        self.shown = None
+        self.rate_count = 0
+        self.rate_started = time.perf_counter()
+
         # Set up the UI
         self.setup_ui()
-        
+
         # Start tracking mouse position
         self.tracking = True
-        self.track_thread = threading.Thread(target=self.track_mouse)
-        self.track_thread.daemon = True
-        self.track_thread.start()
-    
+        self.stream.start()
+        self.root.after(self.frame_ms, self.update_position)
+
     def setup_ui(self):
         # Current position frame
         position_frame = tk.LabelFrame(self.root, text="Current Mouse Position", padx=10, pady=10)
         position_frame.pack(fill="x", padx=10, pady=10)
-        
+
         self.position_label = tk.Label(position_frame, text="X: 0, Y: 0", font=("Arial", 14))
         self.position_label.pack()
-        
+
+        self.rate_label = tk.Label(position_frame, text="", fg="gray")
+        self.rate_label.pack()
+
         # Go to position frame
         goto_frame = tk.LabelFrame(self.root, text="Go To Position", padx=10, pady=10)
         goto_frame.pack(fill="x", padx=10, pady=10)
-        
+
         # X coordinate input
         x_frame = tk.Frame(goto_frame)
         x_frame.pack(fill="x", pady=5)
-        
+
         tk.Label(x_frame, text="X:").pack(side="left", padx=5)
         self.x_entry = tk.Entry(x_frame)
         self.x_entry.pack(side="left", fill="x", expand=True)
-        
+
         # Y coordinate input
         y_frame = tk.Frame(goto_frame)
         y_frame.pack(fill="x", pady=5)
-        
+
         tk.Label(y_frame, text="Y:").pack(side="left", padx=5)
         self.y_entry = tk.Entry(y_frame)
         self.y_entry.pack(side="left", fill="x", expand=True)
-        
+
         # Go button
         self.go_button = tk.Button(goto_frame, text="Go To", command=self.go_to_position)
         self.go_button.pack(pady=10)
-        
+
+        # Recording controls
+        record_frame = tk.Frame(self.root)
+        record_frame.pack(fill="x", padx=10)
+
+        self.record_var = tk.BooleanVar(value=self.stream.recording)
+        tk.Checkbutton(
+            record_frame, text="Record", variable=self.record_var, command=self.toggle_recording
+        ).pack(side="left")
+        tk.Button(record_frame, text="Export...", command=self.export_recording).pack(side="right")
+
         # Status label
         self.status_label = tk.Label(self.root, text="", fg="blue")
         self.status_label.pack(pady=5)
-    
-    def track_mouse(self):
-        """Track the mouse position in a separate thread"""
-        while self.tracking:
-            x, y = pyautogui.position()
-            self.position_label.config(text=f"X: {x}, Y: {y}")
-            time.sleep(0.1)
-    
+
+    def update_position(self):
+        """Drain queued positions on the Tk thread; one label update per frame at most"""
+        if not self.tracking:
+            return
+        before = self.stream.drained
+        latest = self.stream.drain()
+        self.rate_count += self.stream.drained - before
+        if latest is not None and latest[1:] != self.shown:
+            self.shown = latest[1:]
+            self.position_label.config(text=f"X: {self.shown[0]}, Y: {self.shown[1]}")
+
+        now = time.perf_counter()
+        if now - self.rate_started >= 1.0:
+            rate = self.rate_count / (now - self.rate_started)
+            text = f"{rate:.0f} events/s"
+            if self.stream.dropped:
+                text += f", {self.stream.dropped} dropped"
+            if self.stream.recording and self.stream.recorder is not None:
+                text += f", {len(self.stream.recorder)} recorded"
+            self.rate_label.config(text=text)
+            self.rate_count = 0
+            self.rate_started = now
+        self.root.after(self.frame_ms, self.update_position)
+
+    def toggle_recording(self):
+        self.stream.recording = self.record_var.get()
+        state = "started" if self.stream.recording else "paused"
+        self.status_label.config(text=f"Recording {state}", fg="blue")
+
+    def export_recording(self):
+        """Save the recorded positions as CSV or binary, chosen by file extension"""
+        recorder = self.stream.recorder
+        if recorder is None or not len(recorder):
+            self.status_label.config(text="Nothing recorded yet", fg="red")
+            return
+        path = filedialog.asksaveasfilename(
+            parent=self.root,
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("Binary", "*.bin")],
+        )
+        if not path:
+            return
+        try:
+            recorder.export(path)
+        except OSError as e:
+            self.status_label.config(text=f"Export failed: {e}", fg="red")
+        else:
+            self.status_label.config(text=f"Saved {len(recorder)} positions", fg="green")
+
     def go_to_position(self):
         """Move the mouse to the specified coordinates"""
+        import pyautogui
+
         try:
             x = int(self.x_entry.get())
             y = int(self.y_entry.get())
-            
+
             # Get screen size
             screen_width, screen_height = pyautogui.size()
-            
+
             # Check if coordinates are within screen bounds
             if 0 <= x <= screen_width and 0 <= y <= screen_height:
                 pyautogui.moveTo(x, y, duration=0.5)
                 self.status_label.config(text=f"Mouse moved to X: {x}, Y: {y}", fg="green")
             else:
                 self.status_label.config(
-                    text=f"Coordinates out of bounds (max: {screen_width}x{screen_height})", 
+                    text=f"Coordinates out of bounds (max: {screen_width}x{screen_height})",
                     fg="red"
                 )
         except ValueError:
             self.status_label.config(text="Please enter valid numbers", fg="red")
-    
+
     def on_closing(self):
         """Clean up before closing"""
         self.tracking = False
+        self.stream.stop()
         self.root.destroy()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Show the mouse position and record it for calibration.")
+    parser.add_argument("--fake", type=float, metavar="RATE", help="Use a synthetic cursor at RATE events per second")
+    parser.add_argument("--record", action="store_true", help="Start with recording on")
+    parser.add_argument("--capacity", type=int, default=RECORD_CAPACITY, help="Positions kept while recording")
+    parser.add_argument("--export", metavar="PATH", help="Write the recording here on exit (.csv, otherwise binary)")
+    return parser.parse_args(argv)
+
 def main():
+    args = parse_args()
+    source = FakeSource(args.fake) if args.fake else PynputSource()
+    stream = CursorStream(source, recorder=RingRecorder(args.capacity))
+    stream.recording = args.record
+
     root = tk.Tk()
-    app = MouseTrackerApp(root)
+    app = MouseTrackerApp(root, stream)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        stream.stop()
+        if args.export and len(stream.recorder):
+            stream.recorder.export(args.export)
+            print(f"Saved {len(stream.recorder)} positions to {args.export}")
 
 if __name__ == "__main__":
     main()
@@ -2,52 +2,317 @@
 Main entry point for the bookmark clicker application.
 """
 import argparse
+import os
 import sys
-import time
-from src.clicker import Clicker
-from src.hotkey import HotkeyListener
-from src.ui import ClickerUI
 
-def main():
-    """Main entry point for the application."""
-    # Parse command line arguments
-    parser = argparse.ArgumentParser(description="Bookmark Clicker")
+from src.config import MATCH_BACKENDS
+
+def run_app(argv):
+    """Run the clicker itself; the hotkeys pause, resume and quit it.
+
+    Args:
+        argv: Options for bookmark_clicker, such as ``--config`` and ``--set``
+    """
+    # The clicker is the top-level script, which keeps its heavy imports to itself
+    import bookmark_clicker
+
+    bookmark_clicker.main(argv)
+
+def run_bench(args):
+    """Benchmark the detection path against a frame source."""
+    from src.bench import default_template, format_report, run_benchmark, write_report
+    from src.frames import open_source
+
+    template = args.template or default_template()
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    with open_source(args.source, loop=args.loop, template_path=template, size=(width, height),
+                     scene_length=args.scene_length) as source:
+        report = run_benchmark(
+            source,
+            frames=args.frames,
+            warmup=args.warmup,
+            template_path=template,
+            extra_templates=args.extra_template,
+            backend=args.backend,
+            downscale=args.downscale,
+            grayscale=not args.color,
+            incremental=args.incremental,
+            coarse_to_fine=args.coarse_to_fine,
+            coarse_downscale=args.coarse_downscale,
+            workers=args.workers,
+            reuse_buffers=args.reuse_buffers,
+            track_allocations=args.track_allocations,
+            tracking=args.track,
+            redetect_every=args.redetect_every,
+        )
+    print(format_report(report))
+    if args.output:
+        write_report(report, args.output)
+        print(f"Report written to {args.output}")
+
+def run_detect(args):
+    """Detect icons offline in a directory or archive of screenshots."""
+    import json
+
+    from src.batch import detect_options, format_summary, iter_images, load_batch_labels, run_batch
+
+    options = detect_options(
+        args.template,
+        args.extra_template,
+        backend=args.backend,
+        downscale=args.downscale,
+        grayscale=not args.color,
+        confidence=args.confidence,
+        coarse_to_fine=args.coarse_to_fine,
+        coarse_downscale=args.coarse_downscale,
+    )
+    labels = None if args.no_labels else load_batch_labels(args.path, args.labels)
+    workers = (os.cpu_count() or 1) if args.workers is None else args.workers
+    # Detections go to stdout with "-", so the summary goes to stderr
+    out = sys.stdout if args.output == "-" else open(args.output, "w") if args.output else None
+    report = sys.stderr if out is sys.stdout else sys.stdout
+    try:
+        summary = run_batch(
+            iter_images(args.path),
+            options,
+            out=out,
+            labels=labels,
+            workers=workers,
+            limit=args.limit,
+            progress_every=args.progress,
+            progress=sys.stderr,
+        )
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
+    print(format_summary(summary), file=report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary written to {args.report}", file=report)
+
+def run_startup(args):
+    """Measure interpreter startup and import cost of the entry points."""
+    import shlex
+
+    from src.bench import STARTUP_COMMANDS, format_startup_report, run_startup_benchmark, write_report
+
+    commands = {command: shlex.split(command) for command in args.commands} or STARTUP_COMMANDS
+    report = run_startup_benchmark(commands, runs=args.runs, top=args.top)
+    print(format_startup_report(report))
+    if args.output:
+        write_report(report, args.output)
+        print(f"Report written to {args.output}")
+
+def run_clicks(args):
+    """Benchmark the click executor against a mock input backend."""
+    from src.bench import format_click_report, run_click_benchmark, write_report
+
+    report = run_click_benchmark(
+        batches=args.batches,
+        targets=args.targets,
+        interval=args.interval,
+        click_cost=args.click_cost,
+        cancel_trials=args.cancel_trials,
+        cancel_interval=args.cancel_interval,
+    )
+    print(format_click_report(report))
+    if args.output:
+        write_report(report, args.output)
+        print(f"Report written to {args.output}")
+
+def run_soak(args):
+    """Run the automation loop for a long time and check it for leaks and drift."""
+    from src.bench import write_report
+    from src.soak import SoakLimits, format_soak_report, run_soak, write_series_csv
+
+    limits = SoakLimits(
+        max_rss_growth_mb=args.max_rss_growth,
+        max_traced_growth_mb=args.max_traced_growth,
+        max_p99_drift=args.max_p99_drift,
+        max_thread_growth=args.max_thread_growth,
+        max_errors=args.max_errors,
+    )
+    report = run_soak(
+        duration=args.duration,
+        speed=args.speed,
+        sample_interval=args.sample_interval,
+        source=args.source,
+        scene_length=args.scene_length,
+        trace_allocations=not args.no_tracemalloc,
+        limits=limits,
+        log_path=args.log,
+        config_path=args.config,
+        progress=sys.stderr,
+    )
+    print(format_soak_report(report))
+    if args.output:
+        write_report(report, args.output)
+        print(f"Report written to {args.output}")
+    if args.csv:
+        write_series_csv(report, args.csv)
+        print(f"Time series written to {args.csv}")
+    if not report["passed"]:
+        sys.exit(1)
+
+def build_parser():
+    """The command-line parser and its subcommand registry.
+
+    Returns:
+        (parser, subparsers)
+    """
+    parser = argparse.ArgumentParser(
+        description="Bookmark Clicker. Without a command, runs the clicker with any options given "
+                    "(see bookmark_clicker.py --help)."
+    )
     parser.add_argument(
         "--headless",
         action="store_true",
-        help="Run in headless mode (no UI)"
-    )
-    args = parser.parse_args()
-    
-    # Create and start the clicker thread
-    clicker = Clicker()
-    
-    # Set up the hotkey listener
-    hotkey_listener = HotkeyListener(clicker)
-    hotkey_listener.start()
-    
-    if args.headless:
-        # Headless mode - start clicker immediately
-        print("Starting bookmark clicker in headless mode")
-        print("Press Cmd+Shift+S to toggle or Ctrl+C to exit")
-        clicker.start()
-        
+        help="Accepted for compatibility; the clicker always runs without a UI"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    bench = subparsers.add_parser("bench", help="Benchmark detection against a frame source")
+    bench.add_argument(
+        "--source",
+        default="synthetic",
+        help="screen, dir:PATH, video:PATH or synthetic[:COUNT] (default: synthetic)"
+    )
+    bench.add_argument("--frames", type=int, default=200, help="Frames to measure")
+    bench.add_argument("--warmup", type=int, default=5, help="Frames to run before measuring")
+    bench.add_argument("--loop", action="store_true", help="Loop replay sources until --frames is reached")
+    bench.add_argument("--template", help="Template image (default: configured image_path)")
+    bench.add_argument(
+        "--extra-template",
+        action="append",
+        default=[],
+        help="Additional template matched in the same batch (repeatable)"
+    )
+    bench.add_argument("--backend", choices=MATCH_BACKENDS, default=None, help="Match engine backend")
+    bench.add_argument("--downscale", type=float, default=None, help="Override the downscale factor")
+    bench.add_argument("--color", action="store_true", help="Match in color instead of grayscale")
+    bench.add_argument("--incremental", action="store_true", help="Only re-match tiles that changed between frames")
+    bench.add_argument("--coarse-to-fine", action=argparse.BooleanOptionalAction, default=None,
+                       help="Propose at low resolution, verify at native (default: configured coarse_to_fine)")
+    bench.add_argument("--coarse-downscale", type=float, default=None, help="Downscale of the coarse pass")
+    bench.add_argument("--workers", type=int, default=0, help="Match tiles in this many processes (0: in-process)")
+    bench.add_argument("--reuse-buffers", action="store_true", help="Convert, resize and match into preallocated buffers")
+    bench.add_argument("--track-allocations", action="store_true",
+                       help="Report per-frame transient allocations (slows timings)")
+    bench.add_argument("--track", action="store_true", help="Follow icons between full detections")
+    bench.add_argument("--redetect-every", type=int, help="Frames between full detections when tracking")
+    bench.add_argument("--size", default="1280x80", help="Synthetic frame size as WIDTHxHEIGHT")
+    bench.add_argument("--scene-length", type=int, default=1,
+                       help="Frames each synthetic layout lasts, with icons drifting between them")
+    bench.add_argument("--output", help="Write the JSON report to this path")
+    bench.add_argument("--config", help="Settings file the defaults are read from (default: config.json)")
+
+    detect = subparsers.add_parser("detect", help="Detect icons in a directory or archive of screenshots")
+    detect.add_argument("path", help="Directory of images (searched recursively) or a zip/tar archive")
+    detect.add_argument("--output", "-o", help="Write detections as JSON lines to this path, or - for stdout")
+    detect.add_argument("--labels", help="Ground-truth JSON mapping image names to [x, y, w, h] boxes "
+                                         "(default: labels.json in the input)")
+    detect.add_argument("--no-labels", action="store_true", help="Skip scoring even if labels are present")
+    detect.add_argument("--workers", type=int, help="Worker processes (default: one per CPU; 0: in-process)")
+    detect.add_argument("--limit", type=int, help="Stop after this many images")
+    detect.add_argument("--progress", type=int, default=0, metavar="N", help="Report progress every N images")
+    detect.add_argument("--report", help="Write the JSON summary to this path")
+    detect.add_argument("--template", help="Template image (default: configured image_path)")
+    detect.add_argument("--extra-template", action="append", default=[], help="Additional template (repeatable)")
+    detect.add_argument("--backend", choices=MATCH_BACKENDS, default=None, help="Match engine backend")
+    detect.add_argument("--downscale", type=float, default=None, help="Override the downscale factor")
+    detect.add_argument("--confidence", type=float, default=None, help="Override the match threshold")
+    detect.add_argument("--color", action="store_true", help="Match in color instead of grayscale")
+    detect.add_argument("--coarse-to-fine", action=argparse.BooleanOptionalAction, default=None,
+                        help="Propose at low resolution, verify at native (default: configured coarse_to_fine)")
+    detect.add_argument("--coarse-downscale", type=float, default=None, help="Downscale of the coarse pass")
+    detect.add_argument("--config", help="Settings file the defaults are read from (default: config.json)")
+
+    startup = subparsers.add_parser("startup", help="Benchmark startup time with -X importtime")
+    startup.add_argument("--runs", type=int, default=5, help="Fresh interpreters per command")
+    startup.add_argument("--top", type=int, default=10, help="Slowest imports listed per command")
+    startup.add_argument(
+        "--command",
+        dest="commands",
+        action="append",
+        default=[],
+        help="Python arguments to time instead of the defaults, e.g. '-m src --help' (repeatable)"
+    )
+    startup.add_argument("--output", help="Write the JSON report to this path")
+
+    clicks = subparsers.add_parser("clicks", help="Benchmark click throughput and stop latency with a mock backend")
+    clicks.add_argument("--batches", type=int, default=200, help="Batches to click")
+    clicks.add_argument("--targets", type=int, default=8, help="Points per batch")
+    clicks.add_argument("--interval", type=float, default=0.0, help="Seconds between clicks")
+    clicks.add_argument("--click-cost", type=float, default=0.0, help="Seconds each mock click takes")
+    clicks.add_argument("--cancel-trials", type=int, default=50, help="Batches cancelled to measure stop latency")
+    clicks.add_argument("--cancel-interval", type=float, default=0.05,
+                        help="Click interval of the batches that are cancelled")
+    clicks.add_argument("--output", help="Write the JSON report to this path")
+
+    soak = subparsers.add_parser("soak", help="Run the automation loop against replayed frames and check for leaks")
+    soak.add_argument("--duration", type=float, default=600.0, help="Real seconds to run")
+    soak.add_argument("--speed", type=float, default=10.0, help="Divide every scan and click interval by this")
+    soak.add_argument("--sample-interval", type=float, default=5.0, help="Real seconds between samples")
+    soak.add_argument("--source", default="synthetic", help="dir:PATH, video:PATH or synthetic (replays loop)")
+    soak.add_argument("--scene-length", type=int, default=20, help="Frames each synthetic layout lasts")
+    soak.add_argument("--no-tracemalloc", action="store_true", help="Skip Python allocation tracking (faster)")
+    soak.add_argument("--max-rss-growth", type=float, default=50.0, help="Allowed RSS growth in MiB")
+    soak.add_argument("--max-traced-growth", type=float, default=10.0, help="Allowed traced Python memory growth in MiB")
+    soak.add_argument("--max-p99-drift", type=float, default=2.0, help="Allowed ratio of late to early p99 latency")
+    soak.add_argument("--max-thread-growth", type=int, default=0, help="Allowed increase in thread count")
+    soak.add_argument("--max-errors", type=int, default=0, help="Allowed capture, match and click errors")
+    soak.add_argument("--log", help="Log file for the run (default: bookmark_clicker_soak.log in the temp directory)")
+    soak.add_argument("--output", help="Write the JSON report, including every sample, to this path")
+    soak.add_argument("--csv", help="Write the samples as CSV to this path")
+    soak.add_argument("--config", help="Settings file the run starts from (default: config.json)")
+    return parser, subparsers
+
+def apply_config_defaults(args, settings):
+    """Fill the bench and detect options left unset on the command line from ``settings``."""
+    if args.backend is None:
+        args.backend = settings.match_backend
+    if args.downscale is None:
+        args.downscale = settings.downscale_factor
+    if args.coarse_downscale is None:
+        args.coarse_downscale = settings.coarse_downscale_factor
+    if args.coarse_to_fine is None:
+        args.coarse_to_fine = settings.coarse_to_fine
+    if args.template is None and os.path.exists(settings.image_path):
+        args.template = settings.image_path
+    if args.command == "bench" and args.redetect_every is None:
+        args.redetect_every = settings.track_redetect_interval
+    if args.command == "detect" and args.confidence is None:
+        args.confidence = settings.confidence
+
+def main():
+    """Main entry point for the application."""
+    parser, subparsers = build_parser()
+
+    # Without a subcommand every option goes to the clicker (--config, --set, --check-config)
+    argv = [arg for arg in sys.argv[1:] if arg != "--headless"]
+    if not argv or (argv[0] not in subparsers.choices and argv[0] not in ("-h", "--help")):
+        run_app(argv)
+        return
+    args = parser.parse_args(argv)
+
+    if args.command in ("bench", "detect"):
+        from src.settings import load_settings
         try:
-            # Keep the main thread alive
-            while True:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            print("\nExiting...")
-        finally:
-            clicker.stop()
-            hotkey_listener.stop()
-    else:
-        # UI mode
-        ui = ClickerUI(clicker)
-        ui.run()  # This blocks until the UI is closed
-        
-        # Clean up when UI exits
-        hotkey_listener.stop()
+            settings = load_settings(args.config)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        apply_config_defaults(args, settings)
+    if args.command == "bench":
+        run_bench(args)
+    elif args.command == "detect":
+        run_detect(args)
+    elif args.command == "startup":
+        run_startup(args)
+    elif args.command == "clicks":
+        run_clicks(args)
+    elif args.command == "soak":
+        run_soak(args)
 
 if __name__ == "__main__":
     main()
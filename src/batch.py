@@ -0,0 +1,331 @@
+"""
+Offline batch detection over captured screenshots.
+
+Images are streamed from a directory or a zip/tar archive through a pool of
+worker processes, each holding its own warm template cache. Detections are
+written as JSON lines in input order as soon as they are ready. Memory stays
+constant however many frames are processed: only a bounded number of images are
+in flight, latencies go into a fixed-size histogram and accuracy is kept as
+running counts.
+"""
+from __future__ import annotations
+
+import json
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+from collections import deque
+from typing import IO, Any, Deque, Dict, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+from src.bench import accuracy_report, default_template, score_detections
+from src.config import (
+    COARSE_CONFIDENCE, COARSE_DOWNSCALE_FACTOR, CONFIDENCE, DOWNSCALE_FACTOR, MATCH_BACKEND, USE_GRAYSCALE
+)
+from src.frames import IMAGE_EXTENSIONS, LABELS_FILE, Box
+from src.lazy import lazy_import
+from src.metrics import Histogram
+from src.transform import frame_transform, image_size
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+
+class BatchItem(NamedTuple):
+    """One image to process: its name in the input, and a file path or the encoded bytes."""
+    name: str
+    data: Union[str, bytes]
+
+
+class DetectOptions(NamedTuple):
+    """Detector settings shared by every worker."""
+    templates: Dict[str, str]
+    backend: str = MATCH_BACKEND
+    downscale: float = DOWNSCALE_FACTOR
+    grayscale: bool = USE_GRAYSCALE
+    confidence: float = CONFIDENCE
+    coarse_to_fine: bool = False
+    coarse_downscale: float = COARSE_DOWNSCALE_FACTOR
+    coarse_confidence: float = COARSE_CONFIDENCE
+
+
+def _is_image(name: str) -> bool:
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_images(path: str) -> Iterator[BatchItem]:
+    """Stream images from a directory (recursively, in name order) or a zip/tar archive.
+
+    Directory images are passed by path so workers read them directly; archive
+    members are read one at a time, and tar archives (also compressed) are read
+    as a stream.
+
+    Raises:
+        ValueError: If ``path`` is neither a directory nor a supported archive
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                if _is_image(filename):
+                    full = os.path.join(root, filename)
+                    yield BatchItem(os.path.relpath(full, path).replace(os.sep, "/"), full)
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_image(info.filename):
+                    yield BatchItem(posixpath.normpath(info.filename), archive.read(info))
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and _is_image(member.name):
+                    yield BatchItem(posixpath.normpath(member.name), archive.extractfile(member).read())
+    else:
+        raise ValueError(f"{path} is not a directory or a zip/tar archive")
+
+
+def load_batch_labels(path: str, labels_path: Optional[str] = None) -> Optional[Dict[str, List[Box]]]:
+    """Ground truth as a mapping of image name to ``[x, y, w, h]`` boxes.
+
+    Uses ``labels_path`` if given, otherwise a ``labels.json`` inside the
+    directory or archive. Names may be relative paths or bare file names.
+    """
+    if labels_path is not None:
+        with open(labels_path) as f:
+            return json.load(f)
+    if os.path.isdir(path):
+        candidate = os.path.join(path, LABELS_FILE)
+        if os.path.exists(candidate):
+            with open(candidate) as f:
+                return json.load(f)
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if os.path.basename(name) == LABELS_FILE:
+                    return json.loads(archive.read(name))
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and os.path.basename(member.name) == LABELS_FILE:
+                    return json.loads(archive.extractfile(member).read())
+    return None
+
+
+def _truth_for(labels: Dict[str, List[Box]], name: str) -> Optional[List[Box]]:
+    boxes = labels.get(name)
+    if boxes is None:
+        boxes = labels.get(os.path.basename(name))
+    return [tuple(box) for box in boxes] if boxes is not None else None
+
+
+# Per-process detector state, built once by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(options: DetectOptions) -> None:
+    from src.engine import MatchEngine
+
+    engine = MatchEngine(options.templates, backend=options.backend)
+    downscale = min(options.coarse_downscale if options.coarse_to_fine else options.downscale, 1.0)
+    _worker.update(
+        options=options,
+        engine=engine,
+        downscale=downscale,
+        variants=engine.variants(options.grayscale, downscale),
+        fine=engine.variants(options.grayscale, 1.0),
+    )
+
+
+def _decode(data: Union[str, bytes], grayscale: bool) -> Optional[np.ndarray]:
+    # Straight to the matching colour space: no PIL round trip and no RGB copy
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    if isinstance(data, str):
+        return cv2.imread(data, flags)
+    return cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+
+
+def detect_item(item: BatchItem) -> Dict[str, Any]:
+    """Detect icons in one image with the worker's detector.
+
+    Returns:
+        A JSON-serialisable record with full-resolution ``[x, y, w, h, score, label]``
+        detections, or an ``error``
+    """
+    from src.matcher import detect_from_responses, downscale_frame, refine_candidates
+
+    options: DetectOptions = _worker["options"]
+    start = time.perf_counter()
+    try:
+        image = _decode(item.data, options.grayscale)
+    except cv2.error as e:
+        return {"file": item.name, "error": str(e).strip()}
+    if image is None:
+        return {"file": item.name, "error": "could not decode image"}
+    if not options.grayscale:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    downscale = _worker["downscale"]
+    variants, labels = _worker["variants"]
+    small = downscale_frame(image, downscale)
+    responses = _worker["engine"].responses(small, variants)
+    if options.coarse_to_fine:
+        fine_variants, fine_labels = _worker["fine"]
+        candidates = detect_from_responses(responses, variants, options.coarse_confidence)
+        found = refine_candidates(
+            image, candidates, fine_variants, downscale, options.confidence, labels=fine_labels
+        )
+        matched = image
+    else:
+        found = detect_from_responses(responses, variants, options.confidence, labels=labels)
+        matched = small
+    width, height = image_size(image)
+    # The whole image is the region, so this only undoes the downscale
+    transform = frame_transform((0, 0, width, height), (width, height), image_size(matched))
+    boxes = transform.boxes(found).round().astype(int).tolist() if found else []
+    return {
+        "file": item.name,
+        "width": width,
+        "height": height,
+        "detections": [[*box, round(d.score, 4), d.label] for box, d in zip(boxes, found)],
+        "ms": round((time.perf_counter() - start) * 1000.0, 3),
+    }
+
+
+def run_batch(
+    items: Iterator[BatchItem],
+    options: DetectOptions,
+    out: Optional[IO[str]] = None,
+    labels: Optional[Dict[str, List[Box]]] = None,
+    workers: int = 0,
+    in_flight: int = 4,
+    limit: Optional[int] = None,
+    progress_every: int = 0,
+    progress: Optional[IO[str]] = None
+) -> Dict[str, Any]:
+    """Detect icons in every image from ``items``.
+
+    Args:
+        items: Images to process, e.g. from ``iter_images``
+        options: Detector settings
+        out: Where to write one JSON line per image, in input order; None for nowhere
+        labels: Ground truth; enables precision, recall and FPR
+        workers: Worker processes; 0 runs in this process
+        in_flight: Images queued per worker; bounds memory
+        limit: Stop after this many images
+        progress_every: Report progress every this many images; 0 disables
+        progress: Stream for progress lines
+
+    Returns:
+        A JSON-serialisable summary with throughput, latency and accuracy
+    """
+    pending: Deque = deque()
+    latency = Histogram()
+    counts = {"images": 0, "errors": 0, "detections": 0, "unlabelled": 0}
+    tp = fp = fn = labelled = negatives = fp_frames = 0
+    started = time.perf_counter()
+
+    def finish(record: Dict[str, Any]) -> None:
+        nonlocal tp, fp, fn, labelled, negatives, fp_frames
+        counts["images"] += 1
+        if out is not None:
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+        if "error" in record:
+            counts["errors"] += 1
+            return
+        latency.record(record["ms"] / 1000.0)
+        detections = record["detections"]
+        counts["detections"] += len(detections)
+        if labels is not None:
+            truth = _truth_for(labels, record["file"])
+            if truth is None:
+                counts["unlabelled"] += 1
+            else:
+                f_tp, f_fp, f_fn = score_detections(detections, truth, 1.0)
+                tp, fp, fn = tp + f_tp, fp + f_fp, fn + f_fn
+                labelled += 1
+                if not truth:
+                    negatives += 1
+                    fp_frames += 1 if detections else 0
+        if progress is not None and progress_every and counts["images"] % progress_every == 0:
+            elapsed = time.perf_counter() - started
+            progress.write(f"{counts['images']} images, {counts['images'] / elapsed:.1f}/s\n")
+            progress.flush()
+
+    pool = None
+    if workers > 0:
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(options,))
+    else:
+        _init_worker(options)
+    try:
+        for index, item in enumerate(items):
+            if limit is not None and index >= limit:
+                break
+            if pool is None:
+                finish(detect_item(item))
+                continue
+            pending.append(pool.submit(detect_item, item))
+            # Results are written in order; waiting on the oldest keeps the rest of the pool busy
+            if len(pending) >= workers * in_flight:
+                finish(pending.popleft().result())
+        while pending:
+            finish(pending.popleft().result())
+    finally:
+        for future in pending:
+            future.cancel()
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    elapsed = time.perf_counter() - started
+    summary: Dict[str, Any] = {
+        **counts,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "images_per_second": round(counts["images"] / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": latency.summary(),
+        "config": {
+            "templates": list(options.templates.values()),
+            "backend": options.backend,
+            "downscale": options.downscale,
+            "grayscale": options.grayscale,
+            "confidence": options.confidence,
+            "coarse_to_fine": options.coarse_to_fine,
+        },
+    }
+    if labelled:
+        summary["accuracy"] = accuracy_report(tp, fp, fn, labelled, negatives, fp_frames)
+    return summary
+
+
+def detect_options(
+    template: Optional[str] = None,
+    extra_templates: Sequence[str] = (),
+    **kwargs: Any
+) -> DetectOptions:
+    """DetectOptions for the configured (or given) template plus any extras."""
+    templates = {"bookmark": template or default_template()}
+    templates.update({f"extra{i}": path for i, path in enumerate(extra_templates, 1)})
+    return DetectOptions(templates, **kwargs)
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    """Human-readable summary of a batch run."""
+    latency = summary["latency_ms"]
+    lines = [
+        f"{summary['images']} images ({summary['errors']} unreadable) in {summary['seconds']:.1f} s "
+        f"with {summary['workers'] or 'no'} workers: {summary['images_per_second']} images/s, "
+        f"{summary['detections']} detections"
+    ]
+    if latency.get("count"):
+        lines.append(
+            f"per-image latency p50 {latency['p50']:.2f} ms, p99 {latency['p99']:.2f} ms, max {latency['max']:.2f} ms"
+        )
+    accuracy = summary.get("accuracy")
+    if accuracy:
+        lines.append(
+            f"precision {accuracy['precision']:.3f}  recall {accuracy['recall']:.3f}  "
+            f"FPR {accuracy['false_positive_rate']:.3f}  over {accuracy['labelled_frames']} labelled frames"
+            + (f" ({summary['unlabelled']} without labels)" if summary["unlabelled"] else "")
+        )
+    return "\n".join(lines)
@@ -0,0 +1,517 @@
+"""
+Deterministic benchmark harness for the detection path.
+
+Runs capture -> convert -> resize -> match -> group (peak extraction and NMS)
+against any FrameSource and reports per-stage latency percentiles, throughput
+and, for labelled sources, detection accuracy.
+"""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from functools import partial
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.config import (
+    CONFIDENCE, COARSE_CONFIDENCE, COARSE_DOWNSCALE_FACTOR, DOWNSCALE_FACTOR, IMAGE_PATH, PROJECT_ROOT,
+    TRACK_REDETECT_INTERVAL, USE_GRAYSCALE
+)
+from src.buffers import FrameBuffers
+from src.clicker import ClickExecutor, MockBackend, nearest_neighbour_order, path_length
+from src.frames import Box, FrameSource
+from src.engine import MatchEngine
+from src.incremental import IncrementalMatcher
+from src.parallel import ParallelMatcher
+from src.tracker import IconTracker
+from src.matcher import detect_from_responses, downscale_frame, refine_candidates
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+STAGES = ("capture", "convert", "resize", "match", "group")
+
+BUNDLED_TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images", "bookmark.png")
+
+
+def default_template() -> str:
+    """The configured template, or the bundled one when that path does not exist here."""
+    return IMAGE_PATH if os.path.exists(IMAGE_PATH) else BUNDLED_TEMPLATE
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {
+        "count": int(ms.size),
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p90": round(float(p90), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+
+def score_detections(
+    detections: List[Box],
+    truth: List[Box],
+    downscale: float
+) -> Tuple[int, int, int]:
+    """Count true positives, false positives and misses for one frame.
+
+    A detection (in downscaled coordinates) is a true positive when its centre,
+    mapped back to full resolution, falls inside an unclaimed truth box.
+
+    Returns:
+        (true_positives, false_positives, false_negatives)
+    """
+    claimed = [False] * len(truth)
+    tp = fp = 0
+    for x, y, w, h, *_ in detections:
+        cx = (x + w / 2) / downscale
+        cy = (y + h / 2) / downscale
+        for i, (tx, ty, tw, th) in enumerate(truth):
+            if not claimed[i] and tx <= cx <= tx + tw and ty <= cy <= ty + th:
+                claimed[i] = True
+                tp += 1
+                break
+        else:
+            fp += 1
+    return tp, fp, claimed.count(False)
+
+
+def accuracy_report(tp: int, fp: int, fn: int, frames: int, negative_frames: int, fp_frames: int) -> Dict[str, float]:
+    """Precision, recall and false-positive rate from summed counts.
+
+    The false-positive rate is the share of icon-free frames with any detection,
+    which is how the PRD's labelled-frame suite defines it.
+    """
+    return {
+        "true_positives": tp,
+        "false_positives": fp,
+        "false_negatives": fn,
+        "precision": round(tp / (tp + fp), 4) if tp + fp else 1.0,
+        "recall": round(tp / (tp + fn), 4) if tp + fn else 1.0,
+        "false_positive_rate": round(fp_frames / negative_frames, 4) if negative_frames else 0.0,
+        "labelled_frames": frames,
+    }
+
+
+def run_benchmark(
+    source: FrameSource,
+    frames: int = 200,
+    warmup: int = 5,
+    template_path: Optional[str] = None,
+    extra_templates: Sequence[str] = (),
+    backend: str = "opencv",
+    downscale: float = DOWNSCALE_FACTOR,
+    grayscale: bool = USE_GRAYSCALE,
+    incremental: bool = False,
+    coarse_to_fine: bool = False,
+    coarse_downscale: float = COARSE_DOWNSCALE_FACTOR,
+    workers: int = 0,
+    reuse_buffers: bool = False,
+    track_allocations: bool = False,
+    tracking: bool = False,
+    redetect_every: int = TRACK_REDETECT_INTERVAL,
+    clock: Callable[[], float] = time.perf_counter
+) -> Dict:
+    """Run the detection path over ``frames`` frames from ``source``.
+
+    Args:
+        source: Where frames come from
+        frames: Number of measured frames (stops early if the source runs out)
+        warmup: Frames processed before measuring, to warm caches
+        template_path: Template to search for
+        extra_templates: Further templates matched in the same batch
+        backend: Match engine backend, ``opencv`` or ``fft``
+        downscale: Downscale factor applied before matching
+        grayscale: Whether to match in grayscale
+        incremental: Use the dirty-tile IncrementalMatcher instead of full rescans
+        coarse_to_fine: Propose candidates at ``coarse_downscale`` and verify them
+            at native resolution; ``downscale`` is ignored
+        coarse_downscale: Downscale factor of the proposal pass
+        workers: Match tiles in a pool of this many processes; the ``match``
+            stage then includes peak extraction and NMS, and ``group`` is empty
+        reuse_buffers: Convert, resize and match into preallocated FrameBuffers
+        track_allocations: Record the peak bytes allocated between capture and
+            group on each frame with tracemalloc; this slows every stage down
+        tracking: Follow icons with the IconTracker, running full detection
+            only every ``redetect_every`` frames or when a track is lost; the
+            ``match`` stage then covers the whole detection
+        redetect_every: Frames between full detections when tracking
+        clock: Timer used for measurements
+
+    Returns:
+        A JSON-serialisable report
+    """
+    template_path = template_path or default_template()
+    paths = {"bookmark": template_path}
+    paths.update({f"extra{i}": path for i, path in enumerate(extra_templates, 1)})
+    engine = MatchEngine(paths, backend=backend)
+    downscale = min(coarse_downscale if coarse_to_fine else downscale, 1.0)
+    variants, labels = engine.variants(grayscale, downscale)
+    fine_variants, fine_labels = engine.variants(grayscale, 1.0)
+    match = partial(IncrementalMatcher().responses, compute=engine.responses) if incremental else engine.responses
+    parallel = ParallelMatcher(workers) if workers > 0 else None
+    buffers = FrameBuffers() if reuse_buffers else None
+    if buffers is not None and not incremental:
+        match = partial(engine.responses, buffers=buffers)
+    # Proposals of the coarse pass use the looser threshold
+    threshold = COARSE_CONFIDENCE if coarse_to_fine else CONFIDENCE
+    tracker = IconTracker(redetect_every) if tracking else None
+    transient: List[int] = []
+
+    def detect_all(image: np.ndarray, small: np.ndarray) -> list:
+        if parallel is not None:
+            found = parallel.detect(small, variants, labels, confidence=threshold)
+        else:
+            found = detect_from_responses(match(small, variants), variants, threshold, labels=labels)
+        if coarse_to_fine:
+            return refine_candidates(image, found, fine_variants, downscale, labels=fine_labels)
+        return found
+
+    if track_allocations:
+        tracemalloc.start()
+
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    cycles: List[float] = []
+    tp = fp = fn = labelled = negatives = fp_frames = 0
+    measured = 0
+    started = None
+
+    for index in range(warmup + frames):
+        t0 = clock()
+        captured = source.read()
+        if captured is None:
+            break
+        _, image = captured
+        if track_allocations:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        t1 = clock()
+        if grayscale:
+            image = buffers.to_gray(image) if buffers is not None else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        t2 = clock()
+        small = buffers.downscale(image, downscale) if buffers is not None else downscale_frame(image, downscale)
+        t3 = clock()
+        if tracker is not None:
+            if coarse_to_fine:
+                rects = tracker.update(image, fine_variants, fine_labels, partial(detect_all, image, small))
+            else:
+                rects = tracker.update(small, variants, labels, partial(detect_all, image, small))
+            t4 = t5 = clock()
+        elif parallel is not None:
+            # The pool's tiles both match and group; coarse-to-fine verification counts as grouping
+            rects = parallel.detect(small, variants, labels, confidence=threshold)
+            t4 = clock()
+            if coarse_to_fine:
+                rects = refine_candidates(image, rects, fine_variants, downscale, labels=fine_labels)
+            t5 = clock()
+        else:
+            responses = match(small, variants)
+            t4 = clock()
+            if coarse_to_fine:
+                candidates = detect_from_responses(responses, variants, threshold)
+                rects = refine_candidates(image, candidates, fine_variants, downscale, labels=fine_labels)
+            else:
+                rects = detect_from_responses(responses, variants, labels=labels)
+            t5 = clock()
+        if track_allocations:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+
+        if index < warmup:
+            continue
+        if started is None:
+            started = t0
+        measured += 1
+        for stage, elapsed in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+            timings[stage].append(elapsed)
+        cycles.append(t5 - t0)
+        if track_allocations:
+            transient.append(peak)
+
+        if source.truth is not None:
+            f_tp, f_fp, f_fn = score_detections(rects, source.truth, 1.0 if coarse_to_fine else downscale)
+            tp, fp, fn = tp + f_tp, fp + f_fp, fn + f_fn
+            labelled += 1
+            if not source.truth:
+                negatives += 1
+                fp_frames += 1 if rects else 0
+
+    elapsed = (clock() - started) if started is not None else 0.0
+    if parallel is not None:
+        parallel.close()
+    if track_allocations:
+        tracemalloc.stop()
+    report = {
+        "source": source.name,
+        "frames": measured,
+        "config": {
+            "templates": list(paths.values()),
+            "variants": len(variants),
+            "backend": backend,
+            "downscale": downscale,
+            "grayscale": grayscale,
+            "incremental": incremental,
+            "coarse_to_fine": coarse_to_fine,
+            "workers": workers,
+            "reuse_buffers": reuse_buffers,
+            "tracking": tracking,
+            "confidence": CONFIDENCE,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+        },
+        "stages": {stage: summarize(samples) for stage, samples in timings.items()},
+        "cycle": summarize(cycles),
+        "fps": round(measured / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    if tracker is not None:
+        report["tracking"] = tracker.stats()
+    if transient:
+        report["allocations"] = {
+            "peak_bytes_per_frame": int(np.median(transient)),
+            "max_bytes_per_frame": int(max(transient)),
+            "buffer_reallocations": buffers.allocations if buffers is not None else None,
+        }
+    if labelled:
+        report["accuracy"] = accuracy_report(tp, fp, fn, labelled, negatives, fp_frames)
+    return report
+
+
+def format_report(report: Dict) -> str:
+    """Human-readable table for a benchmark report."""
+    lines = [f"{report['frames']} frames from {report['source']} at {report['fps']} fps"]
+    lines.append(f"{'stage':<10}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+    for stage, stats in list(report["stages"].items()) + [("cycle", report["cycle"])]:
+        if not stats.get("count"):
+            continue
+        lines.append(
+            f"{stage:<10}" + "".join(f"{stats[k]:>10.2f}" for k in ("mean", "p50", "p90", "p99", "max"))
+        )
+    allocations = report.get("allocations")
+    if allocations:
+        lines.append(
+            f"transient allocations: {allocations['peak_bytes_per_frame'] / 1024:.1f} KiB/frame median, "
+            f"{allocations['max_bytes_per_frame'] / 1024:.1f} KiB max"
+        )
+    accuracy = report.get("accuracy")
+    if accuracy:
+        lines.append(
+            f"precision {accuracy['precision']:.3f}  recall {accuracy['recall']:.3f}  "
+            f"FPR {accuracy['false_positive_rate']:.3f}  over {accuracy['labelled_frames']} labelled frames"
+        )
+    return "\n".join(lines)
+
+
+# Commands timed by the startup benchmark, relative to the project root
+STARTUP_COMMANDS = {
+    "clicker --help": ["bookmark_clicker.py", "--help"],
+    "clicker --check-config": ["bookmark_clicker.py", "--check-config"],
+    "cli --help": ["-m", "src", "--help"],
+    "first scan": ["-m", "src", "bench", "--frames", "1", "--warmup", "0"],
+}
+
+# Dependencies whose presence in a fast path means an import is not deferred
+HEAVY_MODULES = ("cv2", "numpy", "PIL", "pyautogui", "pynput", "tkinter", "Quartz", "AppKit", "multiprocessing")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Parse ``python -X importtime`` output.
+
+    Returns:
+        (module, self us, cumulative us, nesting depth) per imported module
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(parts[0]), int(parts[1]), depth))
+    return entries
+
+
+def measure_startup(argv: Sequence[str], runs: int = 5, top: int = 10, cwd: Optional[str] = None) -> Dict:
+    """Time a fresh interpreter running ``argv`` and break down its imports.
+
+    Args:
+        argv: Arguments after ``python -X importtime``
+        runs: Fresh processes to time; import details come from the fastest
+        top: Slowest top-level imports to list
+        cwd: Working directory; defaults to the project root
+
+    Returns:
+        Wall-clock summary, total import time, heavy modules loaded and the slowest imports
+    """
+    cwd = cwd or PROJECT_ROOT
+    samples, best = [], None
+    returncode = 0
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", *argv], cwd=cwd, capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        returncode = completed.returncode
+        if best is None or elapsed < best[0]:
+            best = (elapsed, completed.stderr)
+    entries = parse_importtime(best[1])
+    top_level = [entry for entry in entries if entry[3] == 0]
+    # Packages are matched by prefix: cv2 re-imports itself, so only its submodules are reported
+    imported = {name.split(".")[0] for name, _, _, _ in entries}
+    return {
+        "command": " ".join(argv),
+        "returncode": returncode,
+        "wall_ms": {**summarize(samples), "min": round(min(samples) * 1000.0, 3)},
+        "import_ms": round(sum(entry[2] for entry in top_level) / 1000.0, 2),
+        "modules": len(entries),
+        "heavy": [name for name in HEAVY_MODULES if name in imported],
+        "slowest": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000.0, 2)}
+            for name, _, cumulative, _ in sorted(top_level, key=lambda entry: -entry[2])[:top]
+        ],
+    }
+
+
+def run_startup_benchmark(commands: Optional[Dict[str, Sequence[str]]] = None, runs: int = 5, top: int = 10) -> Dict:
+    """``measure_startup`` for each named command (``STARTUP_COMMANDS`` by default)."""
+    commands = commands or STARTUP_COMMANDS
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": runs,
+        "commands": {label: measure_startup(argv, runs, top) for label, argv in commands.items()},
+    }
+
+
+def format_startup_report(report: Dict) -> str:
+    """Human-readable table for a startup benchmark report."""
+    lines = [f"{'command':<24}{'wall p50':>10}{'min':>10}{'imports':>10}{'modules':>9}  heavy modules (ms)"]
+    for label, result in report["commands"].items():
+        wall = result["wall_ms"]
+        status = "" if result["returncode"] == 0 else f"  [exit {result['returncode']}]"
+        lines.append(
+            f"{label:<24}{wall['p50']:>10.1f}{wall['min']:>10.1f}{result['import_ms']:>10.1f}{result['modules']:>9}  "
+            f"{', '.join(result['heavy']) or '-'}{status}"
+        )
+    for label, result in report["commands"].items():
+        slowest = ", ".join(f"{s['module']} {s['cumulative_ms']:.1f}" for s in result["slowest"][:5])
+        lines.append(f"slowest imports, {label}: {slowest}")
+    return "\n".join(lines)
+
+
+def run_click_benchmark(
+    batches: int = 200,
+    targets: int = 8,
+    interval: float = 0.0,
+    click_cost: float = 0.0,
+    cancel_trials: int = 50,
+    cancel_interval: float = 0.05,
+    size: Tuple[int, int] = (1920, 1080),
+    seed: int = 0
+) -> Dict:
+    """Measure the click executor against a MockBackend.
+
+    Throughput clicks ``batches`` random batches of ``targets`` points at
+    ``interval``; each backend click costs ``click_cost`` seconds. Stop latency
+    cancels a batch paced at ``cancel_interval`` from another thread at a random
+    moment and times how long the batch takes to return. Travel compares the
+    cursor path in detection order with nearest-neighbour order.
+
+    Returns:
+        Clicks per second, pacing error, stop latency and travel per batch
+    """
+    rng = random.Random(seed)
+
+    def batch() -> List[Tuple[int, int]]:
+        return [(rng.randrange(size[0]), rng.randrange(size[1])) for _ in range(targets)]
+
+    points = [batch() for _ in range(batches)]
+    backend = MockBackend(size, click_cost)
+    executor = ClickExecutor(backend, interval, geometry_ttl=60.0)
+    start = time.perf_counter()
+    for targets_ in points:
+        executor.run(targets_)
+    elapsed = time.perf_counter() - start
+    stamps = [stamp for stamp, _, _ in backend.clicks]
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+
+    given = nearest = 0.0
+    cursor = (0, 0)
+    for targets_ in points:
+        given += path_length(targets_, cursor)
+        ordered = [targets_[i] for i in nearest_neighbour_order(targets_, cursor)]
+        nearest += path_length(ordered, cursor)
+        cursor = ordered[-1]
+
+    stops = []
+    for _ in range(cancel_trials):
+        executor = ClickExecutor(MockBackend(size, click_cost), cancel_interval)
+        worker = threading.Thread(target=executor.run, args=(batch() * 4,))
+        worker.start()
+        time.sleep(rng.uniform(0.0, cancel_interval * 3))
+        cancelled = time.perf_counter()
+        executor.cancel()
+        worker.join()
+        stops.append(time.perf_counter() - cancelled)
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "batches": batches,
+            "targets": targets,
+            "interval": interval,
+            "click_cost": click_cost,
+            "cancel_interval": cancel_interval,
+        },
+        "clicks": len(backend.clicks),
+        "clicks_per_second": round(len(backend.clicks) / elapsed, 1) if elapsed > 0 else 0.0,
+        "interval_ms": summarize(gaps),
+        "screen_size_queries": backend.size_queries,
+        "stop_ms": summarize(stops),
+        "travel_px": {
+            "given": round(given / batches, 1),
+            "nearest": round(nearest / batches, 1),
+        },
+    }
+
+
+def format_click_report(report: Dict) -> str:
+    """Human-readable summary of a click benchmark."""
+    config = report["config"]
+    interval, stop, travel = report["interval_ms"], report["stop_ms"], report["travel_px"]
+    lines = [
+        f"{report['clicks']} clicks in {config['batches']} batches of {config['targets']}: "
+        f"{report['clicks_per_second']} clicks/s at interval {config['interval'] * 1000:.0f} ms "
+        f"({report['screen_size_queries']} screen size queries)",
+        f"click spacing p50 {interval['p50']:.3f} ms, p99 {interval['p99']:.3f} ms, max {interval['max']:.3f} ms",
+        f"stop latency p50 {stop['p50']:.3f} ms, p99 {stop['p99']:.3f} ms, max {stop['max']:.3f} ms",
+        f"travel per batch {travel['given']:.0f} px in detection order, {travel['nearest']:.0f} px nearest-neighbour "
+        f"({1 - travel['nearest'] / travel['given']:.0%} shorter)" if travel["given"] else "travel per batch 0 px",
+    ]
+    return "\n".join(lines)
+
+
+def write_report(report: Dict, path: str) -> None:
+    """Write a report as JSON so runs can be diffed."""
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
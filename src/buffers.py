@@ -0,0 +1,91 @@
+"""
+Preallocated, region-sized working arrays reused across frames.
+
+Converting, downscaling and matching each used to allocate a new frame-sized
+array per scan. FrameBuffers hands out the same arrays every time, writing
+results through OpenCV's ``dst=`` outputs, and only reallocates when the
+region size changes.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.templates import TemplateVariant
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+
+class FrameBuffers:
+    """Named arrays that persist across frames of the same size.
+
+    Not thread-safe: give each matcher thread its own instance (see
+    ``thread_buffers``).
+    """
+
+    def __init__(self):
+        self._arrays: Dict[str, np.ndarray] = {}
+        self.allocations = 0
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype="uint8") -> np.ndarray:
+        """Return the buffer called ``name``, reallocating only if its shape or dtype changed."""
+        array = self._arrays.get(name)
+        if array is None or array.shape != shape or array.dtype != dtype:
+            array = np.empty(shape, dtype=dtype)
+            self._arrays[name] = array
+            self.allocations += 1
+        return array
+
+    def to_gray(self, image: np.ndarray) -> np.ndarray:
+        """Convert an RGB capture to grayscale into the ``gray`` buffer."""
+        if image.ndim == 2:
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=self.get("gray", image.shape[:2]))
+
+    def downscale(self, image: np.ndarray, factor: float, name: str = "small") -> np.ndarray:
+        """Resize ``image`` by ``factor`` into a reusable buffer; same sizing as ``downscale_frame``."""
+        if factor >= 1.0:
+            return image
+        h, w = image.shape[:2]
+        new_h = int(h * factor)
+        new_w = int(w * factor)
+        dst = self.get(name, (new_h, new_w) + image.shape[2:], image.dtype)
+        return cv2.resize(image, (new_w, new_h), dst=dst)
+
+    def responses(self, image: np.ndarray, variants: List[TemplateVariant]) -> List[Optional[np.ndarray]]:
+        """Like ``compute_responses`` but writing into one reusable map per variant.
+
+        The maps are overwritten by the next call.
+        """
+        height, width = image.shape[:2]
+        responses: List[Optional[np.ndarray]] = []
+        for index, (_, template) in enumerate(variants):
+            th, tw = template.shape[:2]
+            if th > height or tw > width:
+                responses.append(None)
+                continue
+            out = self.get(f"response{index}", (height - th + 1, width - tw + 1), np.float32)
+            responses.append(cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, result=out))
+        return responses
+
+    def clear(self) -> None:
+        """Release every buffer."""
+        self._arrays.clear()
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of all buffers."""
+        return sum(array.nbytes for array in self._arrays.values())
+
+
+_local = threading.local()
+
+
+def thread_buffers() -> FrameBuffers:
+    """The calling thread's FrameBuffers, created on first use."""
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None:
+        buffers = _local.buffers = FrameBuffers()
+    return buffers
@@ -0,0 +1,283 @@
+"""
+Batched click execution.
+
+A ClickExecutor takes every target of a scan at once, visits them in an order
+that keeps cursor travel short, paces clicks explicitly and can be cancelled
+between or during waits within milliseconds. Input goes through a small backend
+interface: PyAutoGUI without its implicit per-call ``PAUSE`` sleep for real
+use, or a MockBackend that only records timestamps, so throughput and stop
+latency can be measured anywhere.
+"""
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Deque, List, NamedTuple, Optional, Sequence, Tuple
+
+from src.config import CLICK_DELAY, CLICK_GEOMETRY_TTL, CLICK_ORDER, CLICK_ORDERS
+from src.lazy import lazy_import
+from src.metrics import Metrics, get_metrics
+
+pyautogui = lazy_import("pyautogui")
+
+Point = Tuple[int, int]
+
+
+class InputBackend(ABC):
+    """Low-level mouse input used by the ClickExecutor."""
+
+    name = "input"
+
+    @abstractmethod
+    def screen_size(self) -> Tuple[int, int]:
+        """Width and height of the primary screen in input coordinates."""
+
+    @abstractmethod
+    def position(self) -> Point:
+        """Current cursor position."""
+
+    @abstractmethod
+    def click(self, x: int, y: int) -> None:
+        """Move to (x, y) and left-click, without any added delay."""
+
+
+class PyAutoGUIBackend(InputBackend):
+    """PyAutoGUI input with its implicit ``PAUSE`` sleep skipped on every call.
+
+    The fail-safe (moving the mouse into a screen corner) still applies and
+    raises ``pyautogui.FailSafeException``.
+    """
+
+    name = "pyautogui"
+
+    def screen_size(self) -> Tuple[int, int]:
+        width, height = pyautogui.size()
+        return int(width), int(height)
+
+    def position(self) -> Point:
+        x, y = pyautogui.position()
+        return int(x), int(y)
+
+    def click(self, x: int, y: int) -> None:
+        pyautogui.click(x, y, _pause=False)
+
+
+class MockBackend(InputBackend):
+    """Records clicks with timestamps instead of sending input.
+
+    Args:
+        size: Reported screen size
+        click_cost: Seconds each click takes, to model a real backend
+        clock: Timestamp source
+        keep: Most recent clicks kept in ``clicks``; None keeps all
+    """
+
+    name = "mock"
+
+    def __init__(
+        self,
+        size: Tuple[int, int] = (1920, 1080),
+        click_cost: float = 0.0,
+        clock: Callable[[], float] = time.perf_counter,
+        keep: Optional[int] = None
+    ):
+        self.size = size
+        self.click_cost = click_cost
+        self.clock = clock
+        self.cursor: Point = (0, 0)
+        # (timestamp, x, y) per click
+        self.clicks: Deque[Tuple[float, int, int]] = deque(maxlen=keep)
+        self.total_clicks = 0
+        self.size_queries = 0
+
+    def screen_size(self) -> Tuple[int, int]:
+        self.size_queries += 1
+        return self.size
+
+    def position(self) -> Point:
+        return self.cursor
+
+    def click(self, x: int, y: int) -> None:
+        if self.click_cost:
+            time.sleep(self.click_cost)
+        self.cursor = (x, y)
+        self.clicks.append((self.clock(), x, y))
+        self.total_clicks += 1
+
+
+def nearest_neighbour_order(points: Sequence[Point], start: Point) -> List[int]:
+    """Indices of ``points`` in greedy nearest-neighbour order from ``start``.
+
+    O(n^2), which is negligible for the handful of targets in one scan, and
+    usually within 25% of the shortest possible path.
+    """
+    remaining = list(range(len(points)))
+    order = []
+    x, y = start
+    while remaining:
+        best = min(remaining, key=lambda i: (points[i][0] - x) ** 2 + (points[i][1] - y) ** 2)
+        remaining.remove(best)
+        order.append(best)
+        x, y = points[best]
+    return order
+
+
+def path_length(points: Sequence[Point], start: Point) -> float:
+    """Cursor travel, in pixels, to visit ``points`` in order from ``start``."""
+    total = 0.0
+    x, y = start
+    for px, py in points:
+        total += math.hypot(px - x, py - y)
+        x, y = px, py
+    return total
+
+
+class ClickResult(NamedTuple):
+    """Outcome of one batch: indices clicked in order, whether it was cut short, and travel."""
+    clicked: List[int]
+    cancelled: bool
+    travel: float
+    skipped: int
+
+
+class ClickExecutor:
+    """Clicks a batch of screen points in travel-optimised order with explicit pacing.
+
+    Consecutive clicks, including across batches, are at least ``interval``
+    seconds apart. ``cancel()`` from any thread interrupts a pacing wait at
+    once and stops the batch before its next click; called between batches,
+    it stops the next batch before its first click.
+
+    Args:
+        backend: Where input goes
+        interval: Minimum seconds between clicks
+        order: ``"nearest"`` for nearest-neighbour order from the cursor, or
+            ``"given"`` to keep the caller's order
+        geometry_ttl: Seconds the screen size is cached for
+        clock: Time source for pacing
+        metrics: Registry for click timings and stop latency
+    """
+
+    def __init__(
+        self,
+        backend: Optional[InputBackend] = None,
+        interval: float = CLICK_DELAY,
+        order: str = CLICK_ORDER,
+        geometry_ttl: float = CLICK_GEOMETRY_TTL,
+        clock: Callable[[], float] = time.monotonic,
+        metrics: Optional[Metrics] = None
+    ):
+        if order not in CLICK_ORDERS:
+            raise ValueError(f"Unknown click order {order!r}")
+        self.backend = backend or PyAutoGUIBackend()
+        self.interval = interval
+        self.order = order
+        self.geometry_ttl = geometry_ttl
+        self.clock = clock
+        self.metrics = metrics or get_metrics()
+        self._cancel = threading.Event()
+        self._cancelled_at: Optional[float] = None
+        self._size: Optional[Tuple[int, int]] = None
+        self._size_at = -math.inf
+        self._last_click: Optional[float] = None
+        self.clicks = 0
+        self.cancellations = 0
+
+    def screen_size(self) -> Tuple[int, int]:
+        """The screen size, queried at most once per ``geometry_ttl`` seconds."""
+        now = self.clock()
+        if self._size is None or now - self._size_at >= self.geometry_ttl:
+            self._size = self.backend.screen_size()
+            self._size_at = now
+        return self._size
+
+    def refresh_geometry(self) -> None:
+        """Forget the cached screen size, e.g. after a display change."""
+        self._size = None
+
+    def on_screen(self, point: Point) -> bool:
+        width, height = self.screen_size()
+        return 0 <= point[0] < width and 0 <= point[1] < height
+
+    def cancel(self) -> None:
+        """Stop the running batch, or the next one if none is running; a wait returns immediately."""
+        if not self._cancel.is_set():
+            self._cancelled_at = time.perf_counter()
+            self._cancel.set()
+
+    def clear_cancel(self) -> None:
+        """Withdraw a cancel no batch has consumed yet, e.g. when automation resumes."""
+        self._cancel.clear()
+        self._cancelled_at = None
+
+    def pause_before_click(self) -> float:
+        """Seconds until the next click is allowed by ``interval``."""
+        if self._last_click is None:
+            return 0.0
+        return max(0.0, self._last_click + self.interval - self.clock())
+
+    def run(
+        self,
+        points: Sequence[Point],
+        should_stop: Optional[Callable[[], bool]] = None,
+        on_click: Optional[Callable[[int, Point], None]] = None
+    ) -> ClickResult:
+        """Click every on-screen point in ``points``.
+
+        Args:
+            points: Screen coordinates
+            should_stop: Polled before every click; True ends the batch
+            on_click: Called with (index into ``points``, point) after each click
+
+        Returns:
+            What was clicked, in order
+        """
+        try:
+            return self._run(points, should_stop, on_click)
+        finally:
+            # A cancel that arrives between batches stops the next one; it is spent once a batch ends
+            self.clear_cancel()
+
+    def _run(
+        self,
+        points: Sequence[Point],
+        should_stop: Optional[Callable[[], bool]],
+        on_click: Optional[Callable[[int, Point], None]]
+    ) -> ClickResult:
+        targets = [i for i, point in enumerate(points) if self.on_screen(point)]
+        skipped = len(points) - len(targets)
+        clicked: List[int] = []
+        travel = 0.0
+        cancelled = False
+        if not targets:
+            return ClickResult(clicked, cancelled, travel, skipped)
+        # The user may have moved the mouse since the last batch
+        cursor = self.backend.position()
+        if self.order == "nearest" and len(targets) > 1:
+            targets = [targets[i] for i in nearest_neighbour_order([points[i] for i in targets], cursor)]
+
+        for index in targets:
+            if should_stop is not None and should_stop():
+                cancelled = True
+                break
+            if self._cancel.wait(self.pause_before_click()) or (should_stop is not None and should_stop()):
+                cancelled = True
+                break
+            x, y = points[index]
+            with self.metrics.timer("click"):
+                self.backend.click(x, y)
+            self._last_click = self.clock()
+            travel += math.hypot(x - cursor[0], y - cursor[1])
+            cursor = (x, y)
+            self.clicks += 1
+            clicked.append(index)
+            if on_click is not None:
+                on_click(index, (x, y))
+        if cancelled:
+            self.cancellations += 1
+            self.metrics.inc("click_batches_cancelled")
+            if self._cancel.is_set() and self._cancelled_at is not None:
+                # From cancel() to the batch giving up its thread
+                self.metrics.observe("click_stop", time.perf_counter() - self._cancelled_at)
+        return ClickResult(clicked, cancelled, travel, skipped)
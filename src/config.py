@@ -1,24 +1,77 @@
 """
 Configuration settings for the bookmark clicker application.
+
+These are the defaults; src.settings layers config.json (or a TOML file),
+environment variables and command-line overrides on top of them.
 """
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Config file settings
+CONFIG_PATH = os.path.join(PROJECT_ROOT, "config.json")  # JSON or TOML; BOOKMARK_CLICKER_CONFIG overrides
+CONFIG_ENV_PREFIX = "BOOKMARK_CLICKER_"  # e.g. BOOKMARK_CLICKER_CONFIDENCE=0.85
+CONFIG_WATCH_INTERVAL = 1.0  # Seconds between checks of the config file for changes (0: off)
 
 # Image matching settings
-IMAGE_PATH = "/Users/chiusean/Downloads/bookmark-clicker/images/bookmark.png"
+IMAGE_PATH = os.path.join(PROJECT_ROOT, "images", "bookmark.png")
+EXTRA_TEMPLATES = {}  # label -> path of further icon variants to match alongside IMAGE_PATH
 CONFIDENCE = 0.90
+NMS_IOU_THRESHOLD = 0.3  # Detections overlapping more than this are treated as one icon
 
 # Timing settings
 CLICK_DELAY = 0.5
-SCAN_DELAY = 1.0
+CLICK_ORDERS = ("nearest", "given")
+CLICK_ORDER = "nearest"  # "nearest": shortest cursor path from the pointer; "given": detection order
+CLICK_GEOMETRY_TTL = 5.0  # Seconds the screen size is cached between clicks
+SCAN_DELAY = 1.0  # Interval before the first scan is scheduled adaptively
+SCAN_MIN_INTERVAL = 0.2  # Right after clicks or new detections
+SCAN_MAX_INTERVAL = 4.0  # Ceiling while the screen stays static and empty
+SCAN_BACKOFF = 2.0  # Interval grows (idle) or shrinks (changes) by this factor per scan
 
 # Operation settings
 WATCHDOG_LIMIT = 100
-DOWNSCALE_FACTOR = 0.5  # Less aggressive downscaling
+DOWNSCALE_FACTOR = 0.3  # Match at 30% of native resolution when COARSE_TO_FINE is off
+COARSE_TO_FINE = True  # Propose at COARSE_DOWNSCALE_FACTOR, verify at native resolution
+COARSE_DOWNSCALE_FACTOR = 0.25
+COARSE_CONFIDENCE = 0.70  # Relaxed threshold for coarse proposals
 USE_GRAYSCALE = True
 BLACKLIST_DURATION = 5  # Extended blacklist duration
+CLICK_TOLERANCE = 6  # Pixels a detection may drift and still count as the same click target
+HISTORY_CAPACITY = 1024  # Most points kept in the click history and blacklist
+MATCH_WORKERS = 1  # Matcher threads in the capture -> match -> click pipeline
+INCREMENTAL_MATCHING = True  # Only re-match tiles that changed since the previous scan
+MATCH_BACKENDS = ("opencv", "fft")
+MATCH_BACKEND = "opencv"  # "opencv" or "fft" (one frame transform shared by all templates)
+PARALLEL_MATCHING = False  # Split large frames (e.g. full-screen fallback) across processes
+PARALLEL_WORKERS = 4
+PARALLEL_TILE_SIZE = 512  # Tile edge in pixels; frames smaller than one tile stay in-process
+TRACKING = False  # Follow known icons between full detections instead of re-detecting every scan
+TRACK_REDETECT_INTERVAL = 10  # Scans between full detections while tracking
+TRACK_SEARCH_MARGIN = 8  # Pixels searched around each icon's last position
+TRACK_MAX_MISSES = 0  # Scans an icon may go unverified before a full detection is forced
 
 # Region settings
 TOOLBAR_HEIGHT = 80  # Height of browser toolbar in pixels
+REGION_REFRESH_INTERVAL = 2.0  # Seconds between background browser-bounds queries
+
+# Logging settings
+LOG_PATH = "bookmark_clicker.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024  # Rotate the text log at this size
+LOG_BACKUP_COUNT = 3
+LOG_ROTATE_WHEN = None  # e.g. "midnight" to rotate by time instead of size
+LOG_JSON_PATH = None  # e.g. "bookmark_clicker.jsonl" for JSON-lines scan/click events
+LOG_REPEAT_INTERVAL = 30.0  # Seconds before an identical throttled message is logged again
+LOG_SAMPLE_EVERY = 0  # Also let every Nth suppressed repeat through (0: off)
+LOG_QUEUE_SIZE = 10000  # Records buffered for the writer thread before new ones are dropped
+LOG_BATCH_SIZE = 256  # Records written per flush
+
+# Metrics settings
+METRICS_BUCKETS_PER_DECADE = 10  # Latency histogram resolution (about 26% per bucket)
+METRICS_REPORT_INTERVAL = 300.0  # Seconds between metrics summaries in the log (0: off)
+METRICS_PORT = None  # e.g. 9464 to serve Prometheus text at http://127.0.0.1:PORT/metrics
 
 # Hotkey settings
 TOGGLE_HOTKEY = "<cmd>+<shift>+s"
 EXIT_HOTKEY = "<cmd>+<shift>+q"
+METRICS_HOTKEY = "<cmd>+<shift>+m"  # Log a metrics summary
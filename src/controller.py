@@ -0,0 +1,153 @@
+"""
+Run/pause/stop control shared by the hotkeys, the UI and the automation threads.
+
+State lives behind one condition variable, so a transition wakes every waiting
+thread immediately: pause and stop take effect within milliseconds, and a
+paused or idle loop sleeps without polling.
+"""
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+RUNNING = "running"
+PAUSED = "paused"
+STOPPED = "stopped"
+
+Observer = Callable[[str, str], None]
+
+
+class Controller:
+    """Thread-safe automation state with interruptible waits.
+
+    ``stop`` is final; ``pause``, ``resume`` and ``toggle`` have no effect
+    afterwards. Observers are called as ``callback(old_state, new_state)`` on
+    the thread that made the transition, after the lock is released.
+
+    Args:
+        paused: Whether to start paused (the hotkey then starts automation)
+        clock: Time source for waits
+    """
+
+    def __init__(self, paused: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._state = PAUSED if paused else RUNNING
+        self._cond = threading.Condition()
+        self._observers: List[Observer] = []
+        self._stopped = threading.Event()
+        self.transitions = 0
+        self.changed_at = clock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def is_running(self) -> bool:
+        """Whether automation has not been stopped (it may be paused)."""
+        return self._state != STOPPED
+
+    def is_paused(self) -> bool:
+        return self._state == PAUSED
+
+    def is_active(self) -> bool:
+        """Whether automation is running and not paused."""
+        return self._state == RUNNING
+
+    def add_observer(self, callback: Observer) -> None:
+        """Call ``callback(old, new)`` after every state change."""
+        with self._cond:
+            self._observers.append(callback)
+
+    def remove_observer(self, callback: Observer) -> None:
+        with self._cond:
+            if callback in self._observers:
+                self._observers.remove(callback)
+
+    def pause(self) -> str:
+        """Pause automation; returns the resulting state."""
+        return self._transition(lambda state: PAUSED if state == RUNNING else state)
+
+    def resume(self) -> str:
+        """Resume automation; returns the resulting state."""
+        return self._transition(lambda state: RUNNING if state == PAUSED else state)
+
+    def toggle(self) -> str:
+        """Switch between running and paused atomically; returns the resulting state."""
+        return self._transition(lambda state: {RUNNING: PAUSED, PAUSED: RUNNING}.get(state, state))
+
+    def stop(self) -> str:
+        """Stop automation for good."""
+        return self._transition(lambda state: STOPPED)
+
+    def notify(self) -> None:
+        """Wake sleepers so they re-evaluate deadlines (e.g. after a schedule change)."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep for ``seconds`` unless paused or stopped first.
+
+        Returns:
+            True if the full delay elapsed while running, False if interrupted
+        """
+        deadline = self.clock() + seconds
+        with self._cond:
+            while self._state == RUNNING:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return True
+                self._cond.wait(remaining)
+            return False
+
+    def sleep_until(self, remaining: Callable[[], float]) -> bool:
+        """Sleep until ``remaining()`` reaches zero, re-reading it after every ``notify``.
+
+        Returns:
+            True once it reaches zero while running, False if paused or stopped first
+        """
+        with self._cond:
+            while self._state == RUNNING:
+                seconds = remaining()
+                if seconds <= 0:
+                    return True
+                self._cond.wait(seconds)
+            return False
+
+    def wait_until_active(self, timeout: Optional[float] = None) -> bool:
+        """Block while paused.
+
+        Returns:
+            True once running, False if stopped or ``timeout`` expired
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while self._state == PAUSED:
+                remaining = None if deadline is None else deadline - self.clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return self._state == RUNNING
+
+    def wait_for_stop(self, timeout: Optional[float] = None) -> bool:
+        """Block until stopped or ``timeout`` expires; returns whether stopped."""
+        return self._stopped.wait(timeout)
+
+    def _transition(self, choose: Callable[[str], str]) -> str:
+        with self._cond:
+            old = self._state
+            new = choose(old)
+            if new == old:
+                return old
+            self._state = new
+            self.transitions += 1
+            self.changed_at = self.clock()
+            if new == STOPPED:
+                self._stopped.set()
+            self._cond.notify_all()
+            observers = list(self._observers)
+        for callback in observers:
+            try:
+                callback(old, new)
+            except Exception as e:
+                logging.error(f"Controller observer failed: {e}")
+        return new
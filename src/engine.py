@@ -0,0 +1,233 @@
+"""
+Multi-template matching engine.
+
+Several icon variants (bookmark states, light/dark theme, Retina assets) are
+matched against each frame in one batch. With the ``fft`` backend the frame is
+transformed once and that spectrum, along with the frame's integral images, is
+shared by every template and scale, so each extra template costs one spectrum
+product and one inverse transform instead of a full correlation.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from src.config import CONFIDENCE, MATCH_BACKEND, MATCH_BACKENDS, NMS_IOU_THRESHOLD
+from src.buffers import FrameBuffers
+from src.matcher import Detection, compute_responses, detect_from_responses
+from src.templates import DEFAULT_SCALES, TemplateStore, TemplateVariant, get_template_store
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+BACKENDS = MATCH_BACKENDS
+
+# Windows whose variance falls below this are flat and cannot match anything
+_FLAT_EPSILON = 1e-6
+
+
+def _box_sums(integral: np.ndarray, h: int, w: int) -> np.ndarray:
+    """Sums over every h x w window from an integral image (one row/column larger than the image)."""
+    return integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+
+
+class FFTMatcher:
+    """Batched TM_CCOEFF_NORMED via the FFT, equivalent to ``cv2.matchTemplate``.
+
+    Because a zero-mean template sums to zero, the numerator of CCOEFF_NORMED
+    is the plain cross-correlation of the zero-mean template with the frame.
+    That is computed in the frequency domain against the shared frame spectrum.
+    The denominator comes from integral images of the frame, which are also
+    shared. Template spectra are cached per transform size, for the
+    ``max_shapes`` most recently used sizes (e.g. the toolbar strip and the
+    full-screen fallback), and only for the templates last matched at each.
+
+    Args:
+        max_shapes: Transform sizes whose template spectra are kept
+    """
+
+    def __init__(self, max_shapes: int = 2):
+        if max_shapes < 1:
+            raise ValueError("max_shapes must be at least 1")
+        self.max_shapes = max_shapes
+        # Transform size -> id(template) -> (spectrum, template, squared norm), least recent size first
+        self._spectra: "OrderedDict[Tuple[int, int], Dict[int, tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def responses(self, frame: np.ndarray, variants: List[TemplateVariant]) -> List[Optional[np.ndarray]]:
+        """Response maps for every variant; same output as ``compute_responses``."""
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        shape = (cv2.getOptimalDFTSize(height), cv2.getOptimalDFTSize(width))
+
+        # Shared per frame: one forward transform and one pair of integral images
+        image = frame.astype(np.float32)
+        if channels == 1:
+            image = image[:, :, None] if image.ndim == 2 else image
+        spectrum = np.fft.rfft2(image, s=shape, axes=(0, 1))
+        sums, sq_sums = cv2.integral2(frame, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        if sums.ndim == 2:
+            sums, sq_sums = sums[:, :, None], sq_sums[:, :, None]
+        inv_stds: Dict[Tuple[int, int], np.ndarray] = {}
+
+        responses: List[Optional[np.ndarray]] = []
+        for _, template in variants:
+            th, tw = template.shape[:2]
+            if th > height or tw > width:
+                responses.append(None)
+                continue
+            t_spectrum, _, t_norm = self._template_spectrum(template, shape, channels)
+
+            # Summing channels in the frequency domain leaves a single inverse transform
+            if channels == 1:
+                product = spectrum[:, :, 0] * t_spectrum[:, :, 0]
+            else:
+                product = (spectrum * t_spectrum).sum(axis=2)
+            numerator = np.fft.irfft2(product, s=shape)[:height - th + 1, :width - tw + 1]
+
+            # Templates of the same size share the frame's window statistics
+            inv_std = inv_stds.get((th, tw))
+            if inv_std is None:
+                box = _box_sums(sums, th, tw)
+                window_var = (_box_sums(sq_sums, th, tw) - box * box / (th * tw)).sum(axis=2)
+                valid = window_var > _FLAT_EPSILON
+                inv_std = np.zeros(window_var.shape, np.float32)
+                inv_std[valid] = 1.0 / np.sqrt(window_var[valid])
+                inv_stds[(th, tw)] = inv_std
+
+            result = (numerator * inv_std).astype(np.float32, copy=False)
+            result *= 1.0 / np.sqrt(t_norm) if t_norm > 0 else 0.0
+            responses.append(np.clip(result, -1.0, 1.0, out=result))
+        self._forget_others(shape, variants)
+        return responses
+
+    def _template_spectrum(
+        self,
+        template: np.ndarray,
+        shape: Tuple[int, int],
+        channels: int
+    ) -> Tuple[np.ndarray, np.ndarray, float]:
+        with self._lock:
+            spectra = self._spectra.get(shape)
+            if spectra is not None:
+                self._spectra.move_to_end(shape)
+                cached = spectra.get(id(template))
+                if cached is not None and cached[1] is template:
+                    return cached
+
+        t = template.astype(np.float64)
+        if t.ndim == 2:
+            t = t[:, :, None]
+        if t.shape[2] != channels:
+            raise ValueError("Template and frame must have the same number of channels")
+        t = t - t.mean(axis=(0, 1))
+        # Correlation is convolution with the flipped template; conj of the spectrum does the flip
+        t_spectrum = np.conj(np.fft.rfft2(t.astype(np.float32), s=shape, axes=(0, 1)))
+        entry = (t_spectrum, template, float((t * t).sum()))
+        with self._lock:
+            spectra = self._spectra.setdefault(shape, {})
+            self._spectra.move_to_end(shape)
+            spectra[id(template)] = entry
+            while len(self._spectra) > self.max_shapes:
+                self._spectra.popitem(last=False)
+        return entry
+
+    def _forget_others(self, shape: Tuple[int, int], variants: List[TemplateVariant]) -> None:
+        # Spectra of replaced variants (a template or scale change) would otherwise stay cached
+        with self._lock:
+            spectra = self._spectra.get(shape)
+            if spectra is None or len(spectra) <= len(variants):
+                return
+            live = {id(template) for _, template in variants}
+            for key in [key for key in spectra if key not in live]:
+                del spectra[key]
+
+    def clear(self) -> None:
+        """Drop all cached template spectra."""
+        with self._lock:
+            self._spectra.clear()
+
+
+class MatchEngine:
+    """Matches a labelled set of templates against frames in one batch.
+
+    Args:
+        templates: Mapping of label to template image path
+        backend: ``opencv`` (one ``matchTemplate`` per variant) or ``fft``
+        scales: Template scales to search at
+        store: Template store to load from
+    """
+
+    def __init__(
+        self,
+        templates: Dict[str, str],
+        backend: str = MATCH_BACKEND,
+        scales: Tuple[float, ...] = DEFAULT_SCALES,
+        store: Optional[TemplateStore] = None
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown match backend {backend!r}; expected one of {BACKENDS}")
+        if not templates:
+            raise ValueError("At least one template is required")
+        self.templates = dict(templates)
+        self.backend = backend
+        self.scales = tuple(scales)
+        self.store = store or get_template_store()
+        self._fft = FFTMatcher()
+        self._flat: Dict[Tuple[bool, float], Tuple[tuple, List[TemplateVariant], List[str]]] = {}
+
+    def variants(self, grayscale: bool = True, downscale: float = 1.0) -> Tuple[List[TemplateVariant], List[str]]:
+        """All variants of all templates, flattened, with a parallel list of labels.
+
+        The same list object is returned until a template changes on disk, so
+        identity-based caches such as IncrementalMatcher stay warm.
+        """
+        per_template = [
+            (label, self.store.variants(path, grayscale, downscale, self.scales))
+            for label, path in self.templates.items()
+        ]
+        fingerprint = tuple(id(v) for _, v in per_template)
+        key = (bool(grayscale), round(float(downscale), 4))
+        cached = self._flat.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1], cached[2]
+
+        variants: List[TemplateVariant] = []
+        labels: List[str] = []
+        for label, template_variants in per_template:
+            variants.extend(template_variants)
+            labels.extend([label] * len(template_variants))
+        self._flat[key] = (fingerprint, variants, labels)
+        if self.backend == "fft":
+            self._fft.clear()
+        return variants, labels
+
+    def responses(
+        self,
+        frame: np.ndarray,
+        variants: List[TemplateVariant],
+        buffers: Optional[FrameBuffers] = None
+    ) -> List[Optional[np.ndarray]]:
+        """Response maps for ``variants`` using the configured backend.
+
+        With ``buffers``, the opencv backend writes into reusable maps.
+        """
+        if self.backend == "fft":
+            return self._fft.responses(frame, variants)
+        if buffers is not None:
+            return buffers.responses(frame, variants)
+        return compute_responses(frame, variants)
+
+    def detect(
+        self,
+        frame: np.ndarray,
+        grayscale: bool = True,
+        downscale: float = 1.0,
+        confidence: float = CONFIDENCE,
+        iou_threshold: float = NMS_IOU_THRESHOLD
+    ) -> List[Detection]:
+        """Labelled detections for every template, suppressed jointly across templates and scales."""
+        variants, labels = self.variants(grayscale, downscale)
+        return detect_from_responses(self.responses(frame, variants), variants, confidence, iou_threshold, labels)
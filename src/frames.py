@@ -0,0 +1,278 @@
+"""
+Frame sources: the live screen plus offline backends for replay and benchmarking.
+
+Every source returns frames as ``(region, image)`` tuples where ``image`` is an
+RGB ``np.ndarray``, the same shape a live screenshot converts to, so the rest of
+the detection path cannot tell them apart.
+"""
+from __future__ import annotations
+
+import glob
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from src.config import IMAGE_PATH, TOOLBAR_HEIGHT
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# (x, y, width, height)
+Region = Tuple[int, int, int, int]
+Box = Tuple[int, int, int, int]
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+LABELS_FILE = "labels.json"
+
+
+class FrameSource(ABC):
+    """Base class for anything that produces frames.
+
+    ``truth`` holds the ground-truth boxes (full-resolution, frame-relative) for
+    the last frame read, or None when the source has no labels.
+    """
+
+    truth: Optional[List[Box]] = None
+    name = "frames"
+
+    @abstractmethod
+    def read(self) -> Optional[Tuple[Region, np.ndarray]]:
+        """Return the next (region, RGB image) tuple, or None when exhausted."""
+
+    def close(self) -> None:
+        """Release any resources held by the source."""
+
+    def __iter__(self) -> Iterator[Tuple[Region, np.ndarray]]:
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+    def __enter__(self) -> "FrameSource":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ScreenSource(FrameSource):
+    """Captures the live screen with PyAutoGUI.
+
+    Args:
+        region: A fixed region, or a callable returning the current one
+    """
+
+    name = "screen"
+
+    def __init__(self, region: Union[None, Region, Callable[[], Optional[Region]]] = None):
+        self._region = region
+
+    def read(self) -> Optional[Tuple[Region, np.ndarray]]:
+        import pyautogui
+
+        region = self._region() if callable(self._region) else self._region
+        if region is None:
+            region = (0, 0, *pyautogui.size())
+        return region, np.asarray(pyautogui.screenshot(region=region))
+
+
+class DirectorySource(FrameSource):
+    """Replays image files from a directory in name order.
+
+    If the directory contains a ``labels.json`` mapping file names to lists of
+    ``[x, y, w, h]`` boxes, those become the ground truth for each frame.
+    """
+
+    name = "dir"
+
+    def __init__(self, path: str, loop: bool = False):
+        self.path = path
+        self.loop = loop
+        self.files = sorted(
+            f for f in glob.glob(os.path.join(path, "*"))
+            if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        if not self.files:
+            raise ValueError(f"No images found in {path}")
+        self.labels = load_labels(path)
+        self._index = 0
+
+    def read(self) -> Optional[Tuple[Region, np.ndarray]]:
+        if self._index >= len(self.files):
+            if not self.loop:
+                return None
+            self._index = 0
+        filename = self.files[self._index]
+        self._index += 1
+
+        image = cv2.imread(filename, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Failed to read frame {filename}")
+        if self.labels is not None:
+            self.truth = [tuple(box) for box in self.labels.get(os.path.basename(filename), [])]
+        h, w = image.shape[:2]
+        return (0, 0, w, h), cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class VideoSource(FrameSource):
+    """Replays frames from a video file."""
+
+    name = "video"
+
+    def __init__(self, path: str, loop: bool = False):
+        self.path = path
+        self.loop = loop
+        self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            raise ValueError(f"Failed to open video {path}")
+
+    def read(self) -> Optional[Tuple[Region, np.ndarray]]:
+        ok, image = self._capture.read()
+        if not ok and self.loop:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, image = self._capture.read()
+        if not ok:
+            return None
+        h, w = image.shape[:2]
+        return (0, 0, w, h), cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def close(self) -> None:
+        self._capture.release()
+
+
+class SyntheticSource(FrameSource):
+    """Generates toolbar-like frames with the bookmark icon composited at random positions.
+
+    Frames are deterministic for a given seed, and ``truth`` always holds the
+    boxes of the icons that were drawn.
+
+    Args:
+        count: Number of frames to produce, or None for an endless source
+        size: (width, height) of each frame
+        max_icons: Upper bound on icons per frame
+        template_path: Icon to composite; its alpha channel is honoured
+        seed: Random seed
+        scene_length: Frames each layout is kept for; within a scene the icons
+            drift by up to ``drift`` pixels per frame, like a page reflowing
+        drift: Largest horizontal step per frame within a scene
+    """
+
+    name = "synthetic"
+
+    def __init__(
+        self,
+        count: Optional[int] = 100,
+        size: Tuple[int, int] = (1280, TOOLBAR_HEIGHT),
+        max_icons: int = 6,
+        template_path: str = IMAGE_PATH,
+        seed: int = 0,
+        scene_length: int = 1,
+        drift: int = 2
+    ):
+        icon = cv2.imread(template_path, cv2.IMREAD_UNCHANGED)
+        if icon is None:
+            raise ValueError(f"Failed to load template image from {template_path}")
+        if icon.ndim == 2:
+            icon = cv2.cvtColor(icon, cv2.COLOR_GRAY2BGRA)
+        elif icon.shape[2] == 3:
+            icon = cv2.cvtColor(icon, cv2.COLOR_BGR2BGRA)
+        self._icon_rgb = cv2.cvtColor(icon[:, :, :3], cv2.COLOR_BGR2RGB).astype(np.float32)
+        self._alpha = (icon[:, :, 3:4].astype(np.float32) / 255.0)
+
+        self.count = count
+        self.size = size
+        self.max_icons = max_icons
+        self.scene_length = max(1, scene_length)
+        self.drift = drift
+        self._rng = np.random.default_rng(seed)
+        self._produced = 0
+        self._scene: Optional[np.ndarray] = None
+        self._icons: List[List[int]] = []
+
+    def read(self) -> Optional[Tuple[Region, np.ndarray]]:
+        if self.count is not None and self._produced >= self.count:
+            return None
+        new_scene = self._produced % self.scene_length == 0
+        self._produced += 1
+
+        width, height = self.size
+        ih, iw = self._alpha.shape[:2]
+        if new_scene:
+            self._scene = self._background(width, height)
+            # Icons sit in non-overlapping horizontal slots, like a bookmarks bar
+            slots = max(1, width // (iw * 2))
+            n_icons = int(self._rng.integers(0, min(self.max_icons, slots) + 1))
+            chosen = np.sort(self._rng.choice(slots, size=n_icons, replace=False))
+            self._icons = [
+                [int(slot * iw * 2), int(self._rng.integers(0, iw)), int(self._rng.integers(0, max(1, height - ih + 1)))]
+                for slot in chosen
+            ]
+        else:
+            # Drift within each icon's slot so icons never overlap
+            for icon in self._icons:
+                icon[1] = int(np.clip(icon[1] + self._rng.integers(-self.drift, self.drift + 1), 0, iw - 1))
+        frame = self._scene if self.scene_length == 1 else self._scene.copy()
+
+        truth = []
+        for slot_x, offset, y in self._icons:
+            x = slot_x + offset
+            roi = frame[y:y + ih, x:x + iw]
+            if roi.shape[:2] != (ih, iw):
+                continue
+            roi[:] = roi * (1.0 - self._alpha) + self._icon_rgb * self._alpha
+            truth.append((x, y, iw, ih))
+
+        self.truth = truth
+        return (0, 0, width, height), np.clip(frame, 0, 255).astype(np.uint8)
+
+    def _background(self, width: int, height: int) -> np.ndarray:
+        base = float(self._rng.integers(200, 250))
+        gradient = np.linspace(base, base - 20, height, dtype=np.float32)[:, None, None]
+        frame = np.repeat(np.repeat(gradient, width, axis=1), 3, axis=2)
+        frame += self._rng.normal(0, 3, frame.shape).astype(np.float32)
+        # A few darker blocks stand in for tab titles and other toolbar clutter
+        for _ in range(int(self._rng.integers(0, 6))):
+            x = int(self._rng.integers(0, width))
+            y = int(self._rng.integers(0, height))
+            frame[y:y + 12, x:x + int(self._rng.integers(20, 120))] -= float(self._rng.integers(40, 120))
+        return frame
+
+
+def load_labels(path: str) -> Optional[Dict[str, List[List[int]]]]:
+    """Load ``labels.json`` from a frame directory, if present."""
+    labels_path = os.path.join(path, LABELS_FILE)
+    if not os.path.exists(labels_path):
+        return None
+    with open(labels_path) as f:
+        return json.load(f)
+
+
+def open_source(
+    spec: str,
+    loop: bool = False,
+    template_path: str = IMAGE_PATH,
+    size: Tuple[int, int] = (1280, TOOLBAR_HEIGHT),
+    scene_length: int = 1
+) -> FrameSource:
+    """Build a frame source from a command-line spec.
+
+    Accepted specs are ``screen``, ``dir:PATH``, ``video:PATH`` and
+    ``synthetic[:COUNT]``; without a count the synthetic source never ends.
+    ``size`` is the (width, height) of synthetic frames and ``scene_length``
+    how many frames each synthetic layout lasts.
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "screen":
+        return ScreenSource()
+    if kind == "dir":
+        return DirectorySource(arg, loop=loop)
+    if kind == "video":
+        return VideoSource(arg, loop=loop)
+    if kind == "synthetic":
+        return SyntheticSource(
+            count=int(arg) if arg else None, size=size, template_path=template_path, scene_length=scene_length
+        )
+    raise ValueError(f"Unknown frame source: {spec}")
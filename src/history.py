@@ -0,0 +1,296 @@
+"""
+Click history and blacklist with spatial tolerance.
+
+Clicked points are stored in a uniform grid whose cells are as wide as the
+match tolerance, so "was anything clicked near (x, y)?" checks at most nine
+cells regardless of how many points are stored. Entries expire after a number
+of rounds or seconds; expiry times live in min-heaps, so each round only
+touches entries that actually expire.
+"""
+import heapq
+import math
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.config import BLACKLIST_DURATION, CLICK_TOLERANCE, HISTORY_CAPACITY
+
+Point = Tuple[int, int]
+Cell = Tuple[int, int]
+
+
+class _Entry:
+    __slots__ = ("x", "y", "cell", "expires_round", "expires_at", "alive")
+
+    def __init__(self, x: int, y: int, cell: Cell, expires_round: float, expires_at: float):
+        self.x = x
+        self.y = y
+        self.cell = cell
+        self.expires_round = expires_round
+        self.expires_at = expires_at
+        self.alive = True
+
+
+class SpatialIndex:
+    """Points that match within ``radius`` pixels and expire by round or time.
+
+    Args:
+        radius: Points within this distance of a stored point match it
+        capacity: Most entries kept; the soonest-expiring ones are evicted beyond it
+        clock: Time source for time-based expiry
+    """
+
+    def __init__(
+        self,
+        radius: float = CLICK_TOLERANCE,
+        capacity: int = HISTORY_CAPACITY,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if radius <= 0:
+            raise ValueError("radius must be positive")
+        self.radius = radius
+        self.capacity = capacity
+        self.clock = clock
+        self.round = 0
+        self._cell = float(radius)
+        self._grid: Dict[Cell, List[_Entry]] = {}
+        self._by_round: List[Tuple[float, int, _Entry]] = []
+        self._by_time: List[Tuple[float, int, _Entry]] = []
+        self._seq = 0
+        self._size = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, point: Point) -> bool:
+        return self.find(point) is not None
+
+    def __iter__(self) -> Iterator[Point]:
+        for entries in self._grid.values():
+            for entry in entries:
+                yield entry.x, entry.y
+
+    def find(self, point: Point) -> Optional[Point]:
+        """The stored point nearest to ``point`` within ``radius``, if any."""
+        x, y = point
+        cx, cy = self._cell_of(x, y)
+        best, best_d2 = None, self.radius * self.radius
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for entry in self._grid.get((gx, gy), ()):
+                    d2 = (entry.x - x) ** 2 + (entry.y - y) ** 2
+                    if d2 <= best_d2:
+                        best, best_d2 = entry, d2
+        return (best.x, best.y) if best is not None else None
+
+    def add(self, point: Point, rounds: Optional[int] = None, seconds: Optional[float] = None) -> None:
+        """Store ``point`` until ``rounds`` more rounds or ``seconds`` have passed.
+
+        An existing point within ``radius`` is replaced, so a jittering icon
+        occupies one entry.
+        """
+        self.discard(point)
+        x, y = point
+        entry = _Entry(
+            x, y, self._cell_of(x, y),
+            self.round + rounds if rounds is not None else math.inf,
+            self.clock() + seconds if seconds is not None else math.inf,
+        )
+        self._grid.setdefault(entry.cell, []).append(entry)
+        self._size += 1
+        self._seq += 1
+        if rounds is not None:
+            heapq.heappush(self._by_round, (entry.expires_round, self._seq, entry))
+        if seconds is not None:
+            heapq.heappush(self._by_time, (entry.expires_at, self._seq, entry))
+        while self._size > self.capacity:
+            self._evict()
+        self._compact()
+
+    def discard(self, point: Point) -> bool:
+        """Remove the stored point matching ``point``, if any."""
+        x, y = point
+        cx, cy = self._cell_of(x, y)
+        r2 = self.radius * self.radius
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for entry in self._grid.get((gx, gy), ()):
+                    if (entry.x - x) ** 2 + (entry.y - y) ** 2 <= r2:
+                        self._remove(entry)
+                        return True
+        return False
+
+    def advance(self, rounds: int = 1) -> int:
+        """Start a new round and drop everything that has expired.
+
+        Returns:
+            The number of entries that expired
+        """
+        self.round += rounds
+        return self.expire()
+
+    def expire(self) -> int:
+        """Drop entries whose round or time has passed; O(expired) amortised."""
+        count = self._pop_expired(self._by_round, self.round)
+        count += self._pop_expired(self._by_time, self.clock())
+        self.expired += count
+        return count
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        self._grid.clear()
+        self._by_round.clear()
+        self._by_time.clear()
+        self._size = 0
+
+    def _cell_of(self, x: float, y: float) -> Cell:
+        return int(x // self._cell), int(y // self._cell)
+
+    def _remove(self, entry: _Entry) -> None:
+        # Heap slots are deleted lazily; the entry is only unlinked from the grid
+        entry.alive = False
+        entries = self._grid[entry.cell]
+        entries.remove(entry)
+        if not entries:
+            del self._grid[entry.cell]
+        self._size -= 1
+
+    def _pop_expired(self, heap: List[Tuple[float, int, _Entry]], now: float) -> int:
+        count = 0
+        while heap and heap[0][0] <= now:
+            _, _, entry = heapq.heappop(heap)
+            if entry.alive:
+                self._remove(entry)
+                count += 1
+        return count
+
+    def _evict(self) -> None:
+        # The entry closest to expiring goes first; entries without expiry go last
+        for heap in (self._by_round, self._by_time):
+            while heap:
+                _, _, entry = heapq.heappop(heap)
+                if entry.alive:
+                    self._remove(entry)
+                    self.evicted += 1
+                    return
+        entry = next(iter(self._grid.values()))[0]
+        self._remove(entry)
+        self.evicted += 1
+
+    def _compact(self) -> None:
+        # Replaced and evicted entries leave dead heap slots; rebuild when they dominate
+        for heap in (self._by_round, self._by_time):
+            if len(heap) > 2 * self._size + 64:
+                heap[:] = [item for item in heap if item[2].alive]
+                heapq.heapify(heap)
+
+
+class ClickHistory:
+    """Tracks recent clicks and blacklists points that are clicked repeatedly.
+
+    A point clicked in one round and detected again in the next is assumed to
+    be a bookmark that did not respond, so it is blacklisted for
+    ``blacklist_rounds`` rounds (and, if given, at most ``blacklist_seconds``).
+
+    When detections come from the IconTracker, their track IDs are recorded
+    too, so an icon that moves further than ``radius`` (e.g. while the page
+    scrolls) keeps its history.
+
+    Args:
+        radius: Pixel tolerance when comparing points between rounds
+        blacklist_rounds: Rounds a point stays blacklisted
+        blacklist_seconds: Optional time limit on blacklisting
+        capacity: Most points kept in each index
+        clock: Time source for time-based expiry
+    """
+
+    def __init__(
+        self,
+        radius: float = CLICK_TOLERANCE,
+        blacklist_rounds: int = BLACKLIST_DURATION,
+        blacklist_seconds: Optional[float] = None,
+        capacity: int = HISTORY_CAPACITY,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.blacklist_rounds = blacklist_rounds
+        self.blacklist_seconds = blacklist_seconds
+        self.blacklist = SpatialIndex(radius, capacity, clock)
+        self.recent = SpatialIndex(radius, capacity, clock)
+        self.capacity = capacity
+        self.clock = clock
+        # track ID -> (expiry round, expiry time)
+        self._banned_tracks: Dict[int, Tuple[float, float]] = {}
+        self._recent_tracks: Dict[int, Tuple[float, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def next_round(self) -> None:
+        """Advance both indexes by one round, expiring old entries."""
+        self.blacklist.advance()
+        self.recent.advance()
+
+    def is_blacklisted(self, point: Point, track_id: Optional[int] = None) -> bool:
+        """Whether ``point``, or the track it belongs to, is blacklisted."""
+        found = point in self.blacklist or self._track_live(self._banned_tracks, track_id)
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def clicked_last_round(self, point: Point, track_id: Optional[int] = None) -> bool:
+        """Whether ``point``, or its track, was clicked in the previous round."""
+        return self.recent.find(point) is not None or self._track_live(self._recent_tracks, track_id)
+
+    def ban(self, point: Point, track_id: Optional[int] = None) -> None:
+        """Blacklist ``point`` (and its track) and forget that it was clicked."""
+        self.recent.discard(point)
+        self.blacklist.add(point, self.blacklist_rounds, self.blacklist_seconds)
+        if track_id is not None:
+            self._recent_tracks.pop(track_id, None)
+            self._set_track(self._banned_tracks, track_id, self.blacklist_rounds, self.blacklist_seconds)
+
+    def record_click(self, point: Point, track_id: Optional[int] = None) -> None:
+        """Remember a click until the end of the next round."""
+        self.recent.add(point, rounds=2)
+        if track_id is not None:
+            self._set_track(self._recent_tracks, track_id, 2, None)
+
+    def _track_live(self, tracks: Dict[int, Tuple[float, float]], track_id: Optional[int]) -> bool:
+        expiry = tracks.get(track_id) if track_id is not None else None
+        if expiry is None:
+            return False
+        if self.blacklist.round >= expiry[0] or self.clock() >= expiry[1]:
+            del tracks[track_id]
+            return False
+        return True
+
+    def _set_track(
+        self,
+        tracks: Dict[int, Tuple[float, float]],
+        track_id: int,
+        rounds: int,
+        seconds: Optional[float]
+    ) -> None:
+        tracks[track_id] = (
+            self.blacklist.round + rounds,
+            self.clock() + seconds if seconds is not None else math.inf,
+        )
+        # Tracks that were never looked up again would otherwise accumulate
+        if len(tracks) > self.capacity:
+            for stale in [key for key in tracks if key != track_id and not self._track_live(tracks, key)]:
+                tracks.pop(stale, None)
+            while len(tracks) > self.capacity:
+                del tracks[next(iter(tracks))]
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup and size counters."""
+        return {
+            "blacklisted": len(self.blacklist) + len(self._banned_tracks),
+            "recent": len(self.recent),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.blacklist.expired,
+            "evicted": self.blacklist.evicted + self.recent.evicted,
+        }
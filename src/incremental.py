@@ -0,0 +1,162 @@
+"""
+Incremental template matching that only re-matches the parts of a frame that changed.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from src.config import CONFIDENCE
+from src.matcher import compute_responses, result_to_matches
+from src.templates import TemplateVariant
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# (x, y, width, height) in frame pixels
+Rect = Tuple[int, int, int, int]
+
+# Computes fresh response maps, e.g. ``compute_responses`` or ``MatchEngine.responses``
+ResponseFn = Callable[["np.ndarray", List[TemplateVariant]], List[Optional["np.ndarray"]]]
+
+
+def changed_tiles(
+    frame: np.ndarray,
+    previous: np.ndarray,
+    tile_size: int,
+    threshold: int = 0,
+    scratch: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Boolean grid with one cell per tile, True where any pixel differs by more than ``threshold``.
+
+    ``scratch``, if given, must match ``frame`` and is used for the difference image.
+    """
+    diff = cv2.absdiff(frame, previous, dst=scratch)
+    if diff.ndim == 3:
+        diff = diff.max(axis=2)
+    mask = cv2.compare(diff, threshold, cv2.CMP_GT, dst=diff)
+    rows = np.arange(0, mask.shape[0], tile_size)
+    cols = np.arange(0, mask.shape[1], tile_size)
+    return np.maximum.reduceat(np.maximum.reduceat(mask, rows, axis=0), cols, axis=1) > 0
+
+
+def dirty_rects(tiles: np.ndarray, tile_size: int, frame_shape: Tuple[int, ...]) -> List[Rect]:
+    """Bounding rects, in pixels, of each connected group of changed tiles."""
+    count, _, stats, _ = cv2.connectedComponentsWithStats(tiles.astype(np.uint8), connectivity=8)
+    height, width = frame_shape[:2]
+    rects = []
+    for tx, ty, tw, th, _ in stats[1:count]:
+        x, y = tx * tile_size, ty * tile_size
+        rects.append((x, y, min((tx + tw) * tile_size, width) - x, min((ty + th) * tile_size, height) - y))
+    return rects
+
+
+class IncrementalMatcher:
+    """Keeps the previous frame and response maps and re-matches only dirty tiles.
+
+    A window at result position (px, py) only reads pixels inside
+    ``[px, px + tw) x [py, py + th)``, so every response affected by a changed
+    tile lies in that tile padded by the template size. Those slices of the
+    cached response maps are recomputed; everything else carries over, so the
+    output is the same as a full rescan.
+
+    Full scans go through the caller's ``compute`` function, so a configured
+    backend such as ``fft`` is still used. Dirty tiles are re-matched with
+    ``cv2.matchTemplate`` directly: their windows are too small for a
+    transform to pay off, and both give the same TM_CCOEFF_NORMED values.
+
+    Args:
+        tile_size: Tile edge length in pixels
+        confidence: Match threshold
+        diff_threshold: Per-pixel difference a tile must exceed to count as changed;
+            0 keeps results identical to a full rescan
+    """
+
+    def __init__(self, tile_size: int = 32, confidence: float = CONFIDENCE, diff_threshold: int = 0):
+        self.tile_size = tile_size
+        self.confidence = confidence
+        self.diff_threshold = diff_threshold
+        self._previous: Optional[np.ndarray] = None
+        self._diff: Optional[np.ndarray] = None
+        self._variants: Optional[List[TemplateVariant]] = None
+        self._results: List[Optional[np.ndarray]] = []
+        self._lock = threading.Lock()
+        self.full_scans = 0
+        self.partial_scans = 0
+        self.skipped_scans = 0
+        self.tiles_rematched = 0
+
+    def reset(self) -> None:
+        """Forget the previous frame so the next call does a full scan."""
+        with self._lock:
+            self._previous = None
+
+    def match(
+        self,
+        frame: np.ndarray,
+        variants: List[TemplateVariant],
+        compute: ResponseFn = compute_responses
+    ) -> List[Tuple[int, int, int, int]]:
+        """Match ``variants`` against ``frame``; same output as ``match_template_variants``."""
+        with self._lock:
+            self._update(frame, variants, compute)
+            matches = []
+            for (scale, template), result in zip(variants, self._results):
+                if result is not None:
+                    matches.extend(result_to_matches(result, scale, template.shape, self.confidence))
+            return matches
+
+    def responses(
+        self,
+        frame: np.ndarray,
+        variants: List[TemplateVariant],
+        compute: ResponseFn = compute_responses
+    ) -> List[Optional[np.ndarray]]:
+        """Bring the response maps up to date with ``frame``; same output as ``compute``.
+
+        The cached maps are patched in place by the next call, possibly from
+        another matcher thread, so the caller gets its own copies.
+        """
+        with self._lock:
+            self._update(frame, variants, compute)
+            return [None if result is None else result.copy() for result in self._results]
+
+    def _update(self, frame: np.ndarray, variants: List[TemplateVariant], compute: ResponseFn) -> None:
+        if (self._previous is None or self._previous.shape != frame.shape
+                or variants is not self._variants):
+            self._full_scan(frame, variants, compute)
+        else:
+            tiles = changed_tiles(frame, self._previous, self.tile_size, self.diff_threshold, self._diff)
+            if tiles.any():
+                self.partial_scans += 1
+                self.tiles_rematched += int(tiles.sum())
+                for rect in dirty_rects(tiles, self.tile_size, frame.shape):
+                    self._rematch(frame, rect)
+            else:
+                self.skipped_scans += 1
+        # Frame-sized state is reused until the region size changes
+        if self._previous is None or self._previous.shape != frame.shape:
+            self._previous = frame.copy()
+            self._diff = np.empty_like(frame)
+        else:
+            np.copyto(self._previous, frame)
+
+    def _full_scan(self, frame: np.ndarray, variants: List[TemplateVariant], compute: ResponseFn) -> None:
+        self.full_scans += 1
+        self._variants = variants
+        self._results = compute(frame, variants)
+
+    def _rematch(self, frame: np.ndarray, rect: Rect) -> None:
+        x, y, w, h = rect
+        for (_, template), result in zip(self._variants, self._results):
+            if result is None:
+                continue
+            th, tw = template.shape[:2]
+            # Result positions whose windows overlap the dirty rect
+            px0, py0 = max(0, x - tw + 1), max(0, y - th + 1)
+            px1, py1 = min(result.shape[1], x + w), min(result.shape[0], y + h)
+            if px0 >= px1 or py0 >= py1:
+                continue
+            roi = frame[py0:py1 + th - 1, px0:px1 + tw - 1]
+            result[py0:py1, px0:px1] = cv2.matchTemplate(roi, template, cv2.TM_CCOEFF_NORMED)
@@ -0,0 +1,69 @@
+"""
+Deferred imports for heavy dependencies.
+
+OpenCV, NumPy and the GUI automation libraries take most of the startup time.
+Modules bind them with ``lazy_import`` instead of ``import``, so they are only
+loaded when something first uses them: ``--help`` and config checks never
+load them, and the clicker can load them in the background while it waits for
+the browser.
+"""
+import importlib
+import sys
+import types
+from typing import Any, Dict, Iterable, List
+
+
+class LazyModule(types.ModuleType):
+    """Stands in for a module and imports it on first attribute access.
+
+    Importing goes through ``importlib``, so concurrent first uses from several
+    threads are safe and the module is executed once.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._load(), attr, value)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+    def _load(self) -> types.ModuleType:
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_module"] = module
+        return module
+
+
+_lazy: Dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """``name`` as a module, imported on first use unless it already is.
+
+    Args:
+        name: Absolute module name, e.g. ``"cv2"``
+
+    Returns:
+        The module itself if already imported, otherwise a shared LazyModule
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return _lazy.setdefault(name, LazyModule(name))
+
+
+def preload(names: Iterable[str]) -> None:
+    """Import ``names`` now, e.g. from a background thread before they are needed."""
+    for name in names:
+        importlib.import_module(name)
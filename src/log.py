@@ -0,0 +1,300 @@
+"""
+Asynchronous logging setup.
+
+Callers only put records on a bounded in-memory queue; a listener thread
+formats them and writes them to rotating files and the console in batches,
+flushing once per batch. Messages logged with ``extra=THROTTLE`` are rate
+limited before they are queued, and structured events can be written as JSON
+lines.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.config import (
+    LOG_BACKUP_COUNT, LOG_BATCH_SIZE, LOG_JSON_PATH, LOG_MAX_BYTES, LOG_PATH, LOG_QUEUE_SIZE,
+    LOG_REPEAT_INTERVAL, LOG_ROTATE_WHEN, LOG_SAMPLE_EVERY
+)
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] - %(message)s"
+
+# Structured events go to this logger; only the JSON-lines handler writes them
+EVENT_LOGGER = "bookmark_clicker.events"
+
+# Pass as ``extra`` to rate limit a message that repeats every scan, e.g.
+# logging.info("No bookmarks found in this scan.", extra=THROTTLE)
+THROTTLE = {"throttle": True}
+
+
+class _DeferredFlushMixin:
+    """Lets the listener suppress the per-record flush of stream handlers."""
+
+    deferred = False
+
+    def flush(self) -> None:
+        if not self.deferred:
+            super().flush()
+
+
+class BatchStreamHandler(_DeferredFlushMixin, logging.StreamHandler):
+    """StreamHandler whose flushes can be deferred to the end of a batch."""
+
+
+class BatchRotatingFileHandler(_DeferredFlushMixin, logging.handlers.RotatingFileHandler):
+    """Size-rotated file handler whose flushes can be deferred to the end of a batch."""
+
+
+class BatchTimedRotatingFileHandler(_DeferredFlushMixin, logging.handlers.TimedRotatingFileHandler):
+    """Time-rotated file handler whose flushes can be deferred to the end of a batch."""
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record: time, level, message and any event fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {"ts": round(record.created, 3), "level": record.levelname}
+        event = getattr(record, "event", None)
+        if event is not None:
+            entry["event"] = event
+            entry.update(getattr(record, "fields", {}))
+        else:
+            entry["msg"] = record.getMessage()
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+class RepeatFilter(logging.Filter):
+    """Rate limits and samples identical messages that opted in with ``extra=THROTTLE``.
+
+    Other records always pass, so one-off messages such as pause and resume
+    are never held back. A message already seen is let through again once
+    ``interval`` seconds have
+    passed since it was last emitted, or, with ``sample_every``, on every Nth
+    repeat. The next emitted copy notes how many were suppressed.
+
+    Args:
+        interval: Minimum seconds between two copies of the same message; 0 disables
+        sample_every: Also pass every Nth repeat; 0 disables sampling
+        max_keys: Most distinct messages remembered
+        clock: Time source
+    """
+
+    def __init__(
+        self,
+        interval: float = LOG_REPEAT_INTERVAL,
+        sample_every: int = LOG_SAMPLE_EVERY,
+        max_keys: int = 1024,
+        clock=time.monotonic
+    ):
+        super().__init__()
+        self.interval = interval
+        self.sample_every = sample_every
+        self.max_keys = max_keys
+        self.clock = clock
+        # message -> [last emitted, repeats suppressed since]
+        self._seen: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.interval <= 0 or not getattr(record, "throttle", False):
+            return True
+        key = record.msg if isinstance(record.msg, str) else repr(record.msg)
+        now = self.clock()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is None:
+                if len(self._seen) >= self.max_keys:
+                    self._seen.clear()
+                self._seen[key] = [now, 0]
+                return True
+            last, skipped = seen
+            sampled = self.sample_every > 0 and (skipped + 1) % self.sample_every == 0
+            if now - last < self.interval and not sampled:
+                seen[1] += 1
+                self.suppressed += 1
+                return False
+            seen[0], seen[1] = now, 0
+        if skipped:
+            record.msg = f"{record.msg} (repeated {skipped} more times)"
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener is a thread in this process, so records need no pickling
+        # and formatting happens there rather than on the caller's thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingHandler(logging.Handler):
+    """Forwards records to ``handlers`` and flushes them once per batch instead of per record.
+
+    Sits behind a QueueListener; a batch ends when ``batch_size`` records have
+    been written or the queue has run dry, so a burst costs one flush and a
+    lone record is still written straight away.
+
+    Args:
+        log_queue: The queue the listener drains
+        handlers: Handlers with deferrable flushes, e.g. BatchRotatingFileHandler
+        batch_size: Most records written between two flushes
+    """
+
+    def __init__(self, log_queue: queue.Queue, handlers: List[logging.Handler], batch_size: int = LOG_BATCH_SIZE):
+        super().__init__()
+        self.queue = log_queue
+        self.handlers = list(handlers)
+        self.batch_size = batch_size
+        self._pending = 0
+        for handler in self.handlers:
+            handler.deferred = True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        self._pending += 1
+        if self._pending >= self.batch_size or self.queue.empty():
+            self.flush()
+
+    def flush(self) -> None:
+        self._pending = 0
+        for handler in self.handlers:
+            handler.deferred = False
+            try:
+                handler.flush()
+            finally:
+                handler.deferred = True
+
+    def close(self) -> None:
+        self.flush()
+        for handler in self.handlers:
+            handler.deferred = False
+            handler.close()
+        super().close()
+
+
+class _NotEvent(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not hasattr(record, "event")
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+_events_enabled = False
+
+
+def setup_logging(
+    path: Optional[str] = LOG_PATH,
+    level: int = logging.INFO,
+    max_bytes: int = LOG_MAX_BYTES,
+    backup_count: int = LOG_BACKUP_COUNT,
+    when: Optional[str] = LOG_ROTATE_WHEN,
+    json_path: Optional[str] = LOG_JSON_PATH,
+    repeat_interval: float = LOG_REPEAT_INTERVAL,
+    sample_every: int = LOG_SAMPLE_EVERY,
+    queue_size: int = LOG_QUEUE_SIZE,
+    console: bool = True
+) -> logging.handlers.QueueListener:
+    """Route the root logger through a queue to a background writer thread.
+
+    Args:
+        path: Text log file, rotated by size (or by time with ``when``); None for none
+        level: Minimum level logged
+        max_bytes: Size at which the text log rotates
+        backup_count: Rotated files kept
+        when: ``TimedRotatingFileHandler`` interval such as ``"midnight"``; overrides size rotation
+        json_path: Where to write JSON-lines records and events; None disables them
+        repeat_interval: Seconds before an identical throttled message is logged again
+        sample_every: Also log every Nth repeat of a suppressed throttled message
+        queue_size: Records buffered before new ones are dropped
+        console: Also log to stdout
+
+    Returns:
+        The running listener; ``shutdown_logging`` stops it
+    """
+    global _listener, _queue_handler, _events_enabled
+    shutdown_logging()
+
+    text = logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = []
+    if path:
+        if when:
+            handler = BatchTimedRotatingFileHandler(path, when=when, backupCount=backup_count)
+        else:
+            handler = BatchRotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        handlers.append(handler)
+    if console:
+        handlers.append(BatchStreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(text)
+        handler.addFilter(_NotEvent())
+    if json_path:
+        handler = BatchRotatingFileHandler(json_path, maxBytes=max_bytes, backupCount=backup_count)
+        handler.setFormatter(JsonFormatter())
+        handlers.append(handler)
+
+    log_queue: queue.Queue = queue.Queue(queue_size)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(RepeatFilter(repeat_interval, sample_every))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _events_enabled = bool(json_path)
+
+    _listener = logging.handlers.QueueListener(log_queue, BatchingHandler(log_queue, handlers))
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Write out everything queued so far and stop the writer thread."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    # Nothing new is queued now; once the backlog is written the stop marker always fits
+    _listener.queue.join()
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
+
+
+def log_event(event: str, **fields: Any) -> None:
+    """Record a structured event (scan, click, ...) as one JSON line.
+
+    A no-op unless ``setup_logging`` was given a ``json_path``.
+    """
+    if _events_enabled:
+        logging.getLogger(EVENT_LOGGER).info(event, extra={"event": event, "fields": fields})
+
+
+def dropped_records() -> int:
+    """Records discarded because the queue was full."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+atexit.register(shutdown_logging)
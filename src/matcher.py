@@ -1,14 +1,38 @@
 """
 Image matching functionality using OpenCV for improved performance and accuracy.
 """
-import cv2
-import numpy as np
-import pyautogui
-from typing import List, Tuple, Optional
-from config import (
+from __future__ import annotations
+
+from typing import List, NamedTuple, Tuple, Optional
+from src.config import (
     IMAGE_PATH, CONFIDENCE, USE_GRAYSCALE,
-    DOWNSCALE_FACTOR
+    DOWNSCALE_FACTOR, NMS_IOU_THRESHOLD, COARSE_CONFIDENCE
 )
+from src.frames import ScreenSource
+from src.templates import TemplateVariant, get_template_store
+from src.transform import frame_transform, image_size
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+class Detection(NamedTuple):
+    """One icon found in a matched image, in that image's pixel coordinates."""
+    x: int
+    y: int
+    w: int
+    h: int
+    score: float
+    label: str = ""
+
+def downscale_frame(image: np.ndarray, factor: float) -> np.ndarray:
+    """Resize a frame by ``factor``; factors of 1.0 or more return it unchanged."""
+    if factor >= 1.0:
+        return image
+    h, w = image.shape[:2]
+    new_h = int(h * factor)
+    new_w = int(w * factor)
+    return cv2.resize(image, (new_w, new_h))
 
 def match_template_at_scales(
     screenshot: np.ndarray,
@@ -22,20 +46,265 @@ def match_template_at_scales(
         template: The template to search for
         scales: List of scales to try
 
+    Returns:
+        List of (x, y, w, h) tuples for each match
+    """
+    variants = [
+        (scale, cv2.resize(template, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+        for scale in scales
+    ]
+    return match_template_variants(screenshot, variants)
+
+def match_template_variants(
+    screenshot: np.ndarray,
+    variants: List[TemplateVariant]
+) -> List[Tuple[int, int, int, int]]:
+    """Perform template matching with templates that were already scaled.
+
+    Args:
+        screenshot: The screenshot to search in
+        variants: List of (scale, scaled_template) tuples, e.g. from the template store
+
     Returns:
         List of (x, y, w, h) tuples for each match
     """
     matches = []
-    for scale in scales:
-        scaled_template = cv2.resize(template, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    for scale, scaled_template in variants:
         result = cv2.matchTemplate(screenshot, scaled_template, cv2.TM_CCOEFF_NORMED)
-        locations = np.where(result >= CONFIDENCE)
-        for pt in zip(*locations[::-1]):
-            matches.append((int(pt[0] / scale), int(pt[1] / scale),
-                          int(scaled_template.shape[1] / scale),
-                          int(scaled_template.shape[0] / scale)))
+        matches.extend(result_to_matches(result, scale, scaled_template.shape))
     return matches
 
+def result_to_matches(
+    result: np.ndarray,
+    scale: float,
+    template_shape: Tuple[int, ...],
+    confidence: float = CONFIDENCE
+) -> List[Tuple[int, int, int, int]]:
+    """Turn a matchTemplate response map into (x, y, w, h) tuples above ``confidence``.
+
+    Positions are in the coordinates of the matched image whatever the
+    template ``scale``; boxes are the size of the scaled template. Mapping to
+    the screen is left to ``src.transform``.
+    """
+    ys, xs = np.nonzero(result >= confidence)
+    th, tw = template_shape[:2]
+    return [(x, y, tw, th) for x, y in zip(xs.tolist(), ys.tolist())]
+
+def compute_responses(screenshot: np.ndarray, variants: List[TemplateVariant]) -> List[Optional[np.ndarray]]:
+    """Run TM_CCOEFF_NORMED for every variant; None where the template exceeds the image."""
+    responses = []
+    for _, template in variants:
+        if template.shape[0] > screenshot.shape[0] or template.shape[1] > screenshot.shape[1]:
+            responses.append(None)
+        else:
+            responses.append(cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED))
+    return responses
+
+def extract_peaks(
+    result: np.ndarray,
+    confidence: float = CONFIDENCE,
+    neighbourhood: int = 3
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find local maxima of a response map that reach ``confidence``.
+
+    A pixel is a peak when it equals the maximum of its ``neighbourhood`` x
+    ``neighbourhood`` window, so a blob of above-threshold responses around one
+    icon collapses to (usually) a single point.
+
+    Returns:
+        (xs, ys, scores) arrays
+    """
+    # minMaxLoc allocates nothing, so frames without a match stay allocation-free
+    if cv2.minMaxLoc(result)[1] < confidence:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    kernel = np.ones((neighbourhood, neighbourhood), np.uint8)
+    peaks = (result >= confidence) & (result >= cv2.dilate(result, kernel))
+    ys, xs = np.nonzero(peaks)
+    return xs, ys, result[ys, xs]
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = NMS_IOU_THRESHOLD) -> np.ndarray:
+    """Greedy IoU-based non-maximum suppression.
+
+    Args:
+        boxes: (N, 4) array of x, y, w, h
+        scores: (N,) array of scores
+        iou_threshold: Boxes overlapping a kept box by more than this are dropped
+
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp)
+    boxes = boxes.astype(np.float64)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        inter_w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[best] + areas[rest] - inter)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.intp)
+
+def detect_from_responses(
+    responses: List[Optional[np.ndarray]],
+    variants: List[TemplateVariant],
+    confidence: float = CONFIDENCE,
+    iou_threshold: float = NMS_IOU_THRESHOLD,
+    labels: Optional[List[str]] = None
+) -> List[Detection]:
+    """Collapse response maps from every scale into one scored box per icon.
+
+    Boxes are in the coordinates of the matched image, sized to the template
+    variant that produced them, so boxes from different scales line up for NMS.
+    ``labels``, parallel to ``variants``, names the template each box came from.
+    """
+    all_boxes, all_scores, all_labels = [], [], []
+    for index, ((_, template), result) in enumerate(zip(variants, responses)):
+        if result is None:
+            continue
+        th, tw = template.shape[:2]
+        xs, ys, scores = extract_peaks(result, confidence, max(3, min(tw, th) // 2 | 1))
+        if not len(xs):
+            continue
+        all_boxes.append(np.column_stack((xs, ys, np.full_like(xs, tw), np.full_like(xs, th))))
+        all_scores.append(scores)
+        all_labels.append(np.full(len(xs), index))
+    if not all_boxes:
+        return []
+
+    boxes = np.concatenate(all_boxes)
+    scores = np.concatenate(all_scores)
+    sources = np.concatenate(all_labels)
+    keep = non_max_suppression(boxes, scores, iou_threshold)
+    # Report left-to-right, top-to-bottom so clicks sweep across the toolbar
+    keep = keep[np.lexsort((boxes[keep, 1], boxes[keep, 0]))]
+    return [Detection(int(x), int(y), int(w), int(h), float(score), labels[source] if labels else "")
+            for (x, y, w, h), score, source in zip(boxes[keep], scores[keep], sources[keep])]
+
+def detect_icons(
+    screenshot: np.ndarray,
+    variants: List[TemplateVariant],
+    confidence: float = CONFIDENCE,
+    iou_threshold: float = NMS_IOU_THRESHOLD
+) -> List[Detection]:
+    """Match every variant and return one scored box per icon."""
+    return detect_from_responses(compute_responses(screenshot, variants), variants, confidence, iou_threshold)
+
+def refine_candidates(
+    image: np.ndarray,
+    candidates: List[Detection],
+    variants: List[TemplateVariant],
+    coarse_factor: float,
+    confidence: float = CONFIDENCE,
+    iou_threshold: float = NMS_IOU_THRESHOLD,
+    labels: Optional[List[str]] = None
+) -> List[Detection]:
+    """Verify coarse candidates at full resolution.
+
+    Each candidate box (in coordinates of ``image`` downscaled by
+    ``coarse_factor``) is mapped back to ``image``, padded by the rounding
+    error of the coarse pass, and every variant is matched only inside that
+    small window with the real ``confidence``. ``labels`` is parallel to
+    ``variants``, as for ``detect_from_responses``.
+
+    Returns:
+        Detections in ``image`` coordinates
+    """
+    if not candidates:
+        return []
+    height, width = image.shape[:2]
+    # One coarse pixel covers 1 / coarse_factor fine pixels; allow a couple either side
+    pad = int(np.ceil(2.0 / coarse_factor))
+
+    all_boxes, all_scores, all_labels = [], [], []
+    for candidate in candidates:
+        x0 = max(0, int(candidate.x / coarse_factor) - pad)
+        y0 = max(0, int(candidate.y / coarse_factor) - pad)
+        for index, (_, template) in enumerate(variants):
+            th, tw = template.shape[:2]
+            x1 = min(width, x0 + tw + 2 * pad)
+            y1 = min(height, y0 + th + 2 * pad)
+            if x1 - x0 < tw or y1 - y0 < th:
+                continue
+            result = cv2.matchTemplate(image[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (px, py) = cv2.minMaxLoc(result)
+            if score >= confidence:
+                all_boxes.append((x0 + px, y0 + py, tw, th))
+                all_scores.append(score)
+                all_labels.append(labels[index] if labels else "")
+    if not all_boxes:
+        return []
+
+    boxes = np.asarray(all_boxes)
+    scores = np.asarray(all_scores)
+    keep = non_max_suppression(boxes, scores, iou_threshold)
+    keep = keep[np.lexsort((boxes[keep, 1], boxes[keep, 0]))]
+    return [Detection(int(x), int(y), int(w), int(h), float(scores[i]), all_labels[i])
+            for i, (x, y, w, h) in zip(keep, boxes[keep])]
+
+def detect_coarse_to_fine(
+    image: np.ndarray,
+    coarse_variants: List[TemplateVariant],
+    fine_variants: List[TemplateVariant],
+    coarse_factor: float,
+    confidence: float = CONFIDENCE,
+    coarse_confidence: float = COARSE_CONFIDENCE,
+    iou_threshold: float = NMS_IOU_THRESHOLD
+) -> List[Detection]:
+    """Two-stage detection: a cheap low-resolution pass proposes, full resolution verifies.
+
+    Args:
+        image: Frame at the resolution the final detections should be in
+        coarse_variants: Template variants prepared at ``coarse_factor``
+        fine_variants: Template variants at the resolution of ``image``
+        coarse_factor: Downscale applied to ``image`` for the proposal pass
+        confidence: Threshold enforced at full resolution
+        coarse_confidence: Relaxed threshold for proposals
+
+    Returns:
+        Detections in ``image`` coordinates
+    """
+    coarse = downscale_frame(image, coarse_factor)
+    candidates = detect_icons(coarse, coarse_variants, coarse_confidence, iou_threshold)
+    return refine_candidates(image, candidates, fine_variants, coarse_factor, confidence, iou_threshold)
+
+def group_rectangles(rects: List[Tuple[int, int, int, int]], threshold: int = 10) -> List[Tuple[int, int, int, int]]:
+    """Groups overlapping rectangles to avoid multiple clicks on the same item."""
+    if not rects:
+        return []
+
+    # Sort rectangles by their x-coordinate
+    rects.sort(key=lambda r: r[0])
+    
+    grouped = []
+    current_group = list(rects[0])
+
+    for i in range(1, len(rects)):
+        rect = rects[i]
+        # Check for overlap or proximity
+        if rect[0] < current_group[0] + current_group[2] + threshold:
+            # Merge rectangles
+            new_x2 = max(current_group[0] + current_group[2], rect[0] + rect[2])
+            new_y2 = max(current_group[1] + current_group[3], rect[1] + rect[3])
+            current_group[0] = min(current_group[0], rect[0])
+            current_group[1] = min(current_group[1], rect[1])
+            current_group[2] = new_x2 - current_group[0]
+            current_group[3] = new_y2 - current_group[1]
+        else:
+            grouped.append(tuple(current_group))
+            current_group = list(rect)
+    
+    grouped.append(tuple(current_group))
+    return grouped
+
 def find_icon(region: Optional[Tuple[int, int, int, int]] = None) -> List[Tuple[int, int, int, int]]:
     """Find all instances of the bookmark icon in the specified region.
 
@@ -43,35 +312,27 @@ def find_icon(region: Optional[Tuple[int, int, int, int]] = None) -> List[Tuple[
         region: Optional (x, y, width, height) tuple to search within
 
     Returns:
-        List of (x, y, width, height) tuples for each match found
+        List of (x, y, width, height) screen boxes for each match found
     """
     try:
         # Take screenshot
-        screenshot = pyautogui.screenshot(region=region)
-        screenshot_cv = np.array(screenshot)
+        region, screenshot_cv = ScreenSource(region).read()
+        capture_size = image_size(screenshot_cv)
 
-        # Load template
         if USE_GRAYSCALE:
             screenshot_cv = cv2.cvtColor(screenshot_cv, cv2.COLOR_RGB2GRAY)
-            template = cv2.imread(IMAGE_PATH, cv2.IMREAD_GRAYSCALE)
-        else:
-            template = cv2.imread(IMAGE_PATH, cv2.IMREAD_COLOR)
-
-        if template is None:
-            raise ValueError(f"Failed to load template image from {IMAGE_PATH}")
 
         # Apply downscaling if configured
-        if DOWNSCALE_FACTOR < 1.0:
-            h, w = screenshot_cv.shape[:2]
-            new_h = int(h * DOWNSCALE_FACTOR)
-            new_w = int(w * DOWNSCALE_FACTOR)
-            screenshot_cv = cv2.resize(screenshot_cv, (new_w, new_h))
-            template = cv2.resize(template, (0, 0),
-                                fx=DOWNSCALE_FACTOR,
-                                fy=DOWNSCALE_FACTOR)
-
-        # Perform multi-scale matching
-        return match_template_at_scales(screenshot_cv, template)
+        downscale = min(DOWNSCALE_FACTOR, 1.0)
+        screenshot_cv = downscale_frame(screenshot_cv, downscale)
+
+        # Templates come pre-scaled from the cache; raises ValueError if unreadable
+        variants = get_template_store().variants(IMAGE_PATH, USE_GRAYSCALE, downscale)
+
+        # Perform multi-scale matching, then map back to screen coordinates
+        found = detect_icons(screenshot_cv, variants)
+        transform = frame_transform(tuple(region), capture_size, image_size(screenshot_cv))
+        return [tuple(box) for box in np.floor(transform.boxes(found) + 0.5).astype(int).tolist()]
 
     except Exception as e:
         print(f"Error finding icon: {e}")
@@ -0,0 +1,269 @@
+"""
+Latency histograms, counters and ways to read them while the clicker runs.
+
+Histograms use fixed logarithmic buckets, so memory stays constant however long
+the process runs. Metrics can be logged periodically, dumped on SIGUSR1 or a
+hotkey, or scraped from an optional localhost endpoint in the Prometheus text
+format.
+"""
+import bisect
+import logging
+import math
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from src.config import METRICS_BUCKETS_PER_DECADE
+
+# Bucket bounds span 10 us to 100 s
+_MIN_EXPONENT = -5
+_MAX_EXPONENT = 2
+
+
+def _bucket_bounds(per_decade: int) -> List[float]:
+    steps = (_MAX_EXPONENT - _MIN_EXPONENT) * per_decade
+    return [10 ** (_MIN_EXPONENT + i / per_decade) for i in range(steps + 1)]
+
+
+class Histogram:
+    """Fixed-memory latency histogram with logarithmic buckets.
+
+    Percentiles are accurate to one bucket, about 26% of the value with the
+    default 10 buckets per decade.
+
+    Args:
+        per_decade: Buckets per power of ten
+    """
+
+    def __init__(self, per_decade: int = METRICS_BUCKETS_PER_DECADE):
+        self.bounds = _bucket_bounds(per_decade)
+        # One extra bucket for values beyond the last bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Add one observation, in seconds."""
+        index = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.min = min(self.min, seconds)
+            self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q``-th percentile (0-100), in seconds."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(self.count * q / 100.0))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+            return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean, p50/p90/p99 and max in milliseconds."""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count * 1000, 3),
+            "p50": round(self.percentile(50) * 1000, 3),
+            "p90": round(self.percentile(90) * 1000, 3),
+            "p99": round(self.percentile(99) * 1000, 3),
+            "max": round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    """Named histograms and counters shared by every stage."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def histogram(self, name: str) -> Histogram:
+        """The histogram called ``name``, created on first use."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record a duration."""
+        self.histogram(name).record(seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Time the enclosed block into the histogram called ``name``."""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start)
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        """Increment a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def mark(self, name: str) -> None:
+        """Remember that ``name`` was requested (e.g. a hotkey press), to time its effect."""
+        with self._lock:
+            self._marks[name] = self.clock()
+
+    def acknowledge(self, name: str) -> None:
+        """Record the time since the pending ``mark(name)`` into ``<name>_latency``."""
+        with self._lock:
+            marked = self._marks.pop(name, None)
+        if marked is not None:
+            self.observe(f"{name}_latency", self.clock() - marked)
+
+    def snapshot(self) -> Dict:
+        """All counters and histogram summaries."""
+        return {
+            "uptime_s": round(time.monotonic() - self.started, 1),
+            "counters": dict(self.counters),
+            "latency_ms": {name: h.summary() for name, h in sorted(self.histograms.items())},
+        }
+
+    def format_summary(self) -> str:
+        """Compact human-readable summary for the log."""
+        parts = [
+            f"{name} p50={s['p50']:.1f} p99={s['p99']:.1f} max={s['max']:.1f}ms n={s['count']}"
+            for name, s in self.snapshot()["latency_ms"].items() if s.get("count")
+        ]
+        parts += [f"{name}={value}" for name, value in sorted(self.counters.items())]
+        return "; ".join(parts) if parts else "no metrics yet"
+
+    def prometheus(self, prefix: str = "bookmark_clicker") -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            with histogram._lock:
+                counts = list(histogram.counts)
+                total, count = histogram.total, histogram.count
+            cumulative = 0
+            for bound, bucket in zip(histogram.bounds, counts):
+                cumulative += bucket
+                # Empty leading buckets add nothing but noise
+                if cumulative:
+                    lines.append(f'{metric}_bucket{{le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{metric}_sum {total:.6f}")
+            lines.append(f"{metric}_count {count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves ``/metrics`` in Prometheus text format from a background thread.
+
+    Args:
+        metrics: Registry to expose
+        port: TCP port; 0 picks a free one
+        host: Interface to bind; localhost by default so nothing is exposed remotely
+    """
+
+    def __init__(self, metrics: "Metrics", port: int, host: str = "127.0.0.1"):
+        # Only loaded when the endpoint is enabled
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start serving in a daemon thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class PeriodicReporter:
+    """Logs a metrics summary every ``interval`` seconds from a daemon thread."""
+
+    def __init__(self, metrics: "Metrics", interval: float):
+        self.metrics = metrics
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-report", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            dump_metrics(self.metrics)
+
+
+def dump_metrics(metrics: Optional["Metrics"] = None) -> None:
+    """Log the current metrics summary."""
+    logging.info(f"Metrics: {(metrics or get_metrics()).format_summary()}")
+
+
+def install_dump_signal(metrics: Optional["Metrics"] = None) -> bool:
+    """Dump metrics to the log on SIGUSR1. Must be called from the main thread.
+
+    Returns:
+        False where the platform has no SIGUSR1
+    """
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: dump_metrics(metrics))
+    return True
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """The process-wide metrics registry."""
+    return _metrics
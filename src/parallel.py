@@ -0,0 +1,212 @@
+"""
+Process-pool template matching across overlapping tiles of a large frame.
+
+Used for full-screen fallbacks, where one ``matchTemplate`` over the whole
+display is slow on a single core. With coarse-to-fine it runs the proposal
+pass over the downscaled frame; verification stays local to each candidate. The frame is copied once into shared memory;
+workers attach to it by name and each matches only its own tile, so no image
+data is pickled.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from src.config import CONFIDENCE, NMS_IOU_THRESHOLD, PARALLEL_TILE_SIZE, PARALLEL_WORKERS
+from src.matcher import Detection, extract_peaks, non_max_suppression
+from src.templates import TemplateVariant
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+# Process pools and shared memory are only loaded once parallel matching is used
+shared_memory = lazy_import("multiprocessing.shared_memory")
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+# (x0, y0, x1, y1): the window positions a tile is responsible for
+TileRect = Tuple[int, int, int, int]
+
+_worker_variants: List[TemplateVariant] = []
+_worker_buffers: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Only the owning process may unlink the block, so workers attach untracked where supported
+    kwargs = {"track": False} if sys.version_info >= (3, 13) else {}
+    return shared_memory.SharedMemory(name=name, **kwargs)
+
+
+def _init_worker(variants: List[TemplateVariant]) -> None:
+    global _worker_variants
+    _worker_variants = variants
+
+
+def match_tile(
+    frame: np.ndarray,
+    tile: TileRect,
+    variants: List[TemplateVariant],
+    confidence: float
+) -> np.ndarray:
+    """Find peaks for every variant among the window positions owned by ``tile``.
+
+    Returns:
+        (N, 6) array of x, y, w, h, score, variant index in frame coordinates
+    """
+    height, width = frame.shape[:2]
+    x0, y0, x1, y1 = tile
+    rows = []
+    for index, (_, template) in enumerate(variants):
+        th, tw = template.shape[:2]
+        px1, py1 = min(x1, width - tw + 1), min(y1, height - th + 1)
+        if px1 <= x0 or py1 <= y0:
+            continue
+        # The tile is padded by the template size so windows straddling its edge are covered
+        result = cv2.matchTemplate(frame[y0:py1 + th - 1, x0:px1 + tw - 1], template, cv2.TM_CCOEFF_NORMED)
+        xs, ys, scores = extract_peaks(result, confidence, max(3, min(tw, th) // 2 | 1))
+        if len(xs):
+            rows.append(np.column_stack((
+                xs + x0, ys + y0, np.full(len(xs), tw), np.full(len(xs), th), scores, np.full(len(xs), index)
+            )))
+    return np.concatenate(rows) if rows else np.empty((0, 6))
+
+
+def _match_shared_tile(
+    name: str,
+    shape: Tuple[int, ...],
+    dtype: str,
+    tile: TileRect,
+    confidence: float
+) -> np.ndarray:
+    buffer = _worker_buffers.get(name)
+    if buffer is None:
+        # The owner reallocates on size changes; drop handles to blocks it has released
+        for stale in _worker_buffers.values():
+            stale.close()
+        _worker_buffers.clear()
+        buffer = _worker_buffers[name] = _attach(name)
+    frame = np.ndarray(shape, dtype=dtype, buffer=buffer.buf)
+    return match_tile(frame, tile, _worker_variants, confidence)
+
+
+def tile_grid(frame_shape: Tuple[int, ...], tile_size: int) -> List[TileRect]:
+    """Split the window positions of a frame into a grid of tiles."""
+    height, width = frame_shape[:2]
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in range(0, height, tile_size)
+        for x in range(0, width, tile_size)
+    ]
+
+
+class ParallelMatcher:
+    """Matches large frames tile by tile in a process pool.
+
+    Args:
+        workers: Number of worker processes
+        tile_size: Edge length, in window positions, of each tile
+        confidence: Match threshold
+        iou_threshold: NMS threshold used to merge duplicates found at tile seams
+    """
+
+    def __init__(
+        self,
+        workers: int = PARALLEL_WORKERS,
+        tile_size: int = PARALLEL_TILE_SIZE,
+        confidence: float = CONFIDENCE,
+        iou_threshold: float = NMS_IOU_THRESHOLD
+    ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.tile_size = tile_size
+        self.confidence = confidence
+        self.iou_threshold = iou_threshold
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._variants: Optional[List[TemplateVariant]] = None
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._view: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def worthwhile(self, frame: np.ndarray) -> bool:
+        """Whether the frame is big enough to split across workers."""
+        return len(tile_grid(frame.shape, self.tile_size)) > 1
+
+    def detect(
+        self,
+        frame: np.ndarray,
+        variants: List[TemplateVariant],
+        labels: Optional[List[str]] = None,
+        confidence: Optional[float] = None
+    ) -> List[Detection]:
+        """Match ``variants`` across ``frame`` and return one scored box per icon.
+
+        ``confidence`` overrides the matcher's threshold for this call, e.g. the
+        lower one of a coarse-to-fine proposal pass.
+        """
+        confidence = self.confidence if confidence is None else confidence
+        tiles = tile_grid(frame.shape, self.tile_size)
+        if len(tiles) == 1:
+            hits = [match_tile(frame, tiles[0], variants, confidence)]
+        else:
+            # One shared buffer, so concurrent callers take turns
+            with self._lock:
+                pool = self._ensure_pool(variants)
+                view = self._ensure_buffer(frame)
+                np.copyto(view, frame)
+                futures = [
+                    pool.submit(_match_shared_tile, self._shm.name, view.shape, view.dtype.str, tile, confidence)
+                    for tile in tiles
+                ]
+                hits = [future.result() for future in futures]
+
+        hits = np.concatenate(hits)
+        if not len(hits):
+            return []
+        keep = non_max_suppression(hits[:, :4], hits[:, 4], self.iou_threshold)
+        keep = keep[np.lexsort((hits[keep, 1], hits[keep, 0]))]
+        return [
+            Detection(int(x), int(y), int(w), int(h), float(score), labels[int(index)] if labels else "")
+            for x, y, w, h, score, index in hits[keep]
+        ]
+
+    def close(self) -> None:
+        """Shut down the pool and release the shared frame buffer."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+            self._release_buffer()
+
+    def __enter__(self) -> "ParallelMatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _ensure_pool(self, variants: List[TemplateVariant]) -> ProcessPoolExecutor:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Templates are small and change rarely, so they are sent once per worker
+        if self._pool is None or variants is not self._variants:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(variants,))
+            self._variants = variants
+        return self._pool
+
+    def _ensure_buffer(self, frame: np.ndarray) -> np.ndarray:
+        if self._view is None or self._view.shape != frame.shape or self._view.dtype != frame.dtype:
+            self._release_buffer()
+            self._shm = shared_memory.SharedMemory(create=True, size=max(1, frame.nbytes))
+            self._view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._shm.buf)
+        return self._view
+
+    def _release_buffer(self) -> None:
+        if self._shm is not None:
+            self._view = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
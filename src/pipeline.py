@@ -0,0 +1,294 @@
+"""
+Staged capture -> match -> click pipeline connected by bounded queues.
+
+Each stage runs on its own thread so matching frame N+1 overlaps the clicks
+(and click delays) for frame N. Queues drop their oldest item when full, so a
+slow stage always works on the newest data instead of building a backlog.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, List, NamedTuple, Optional, Tuple, Union
+
+from src.controller import Controller
+from src.metrics import Metrics, get_metrics
+from src.scheduler import ScanScheduler
+from src.transform import CoordinateTransform
+
+
+class Frame(NamedTuple):
+    """A captured screenshot and where it came from."""
+    seq: int
+    region: Tuple[int, int, int, int]
+    image: Any
+    captured_at: float
+
+
+class Matches(NamedTuple):
+    """What a match stage found: rects in matched-image pixels, and how to map them to the screen."""
+    rects: List[Tuple[int, int, int, int]]
+    transform: Optional[CoordinateTransform] = None
+
+
+class Detections(NamedTuple):
+    """Match results for one frame.
+
+    ``transform`` maps ``rects`` to screen coordinates; None means they are
+    already in screen points relative to ``region``.
+    """
+    seq: int
+    region: Tuple[int, int, int, int]
+    rects: List[Tuple[int, int, int, int]]
+    captured_at: float = 0.0
+    transform: Optional[CoordinateTransform] = None
+
+    def screen_transform(self) -> CoordinateTransform:
+        """``transform``, or a plain offset by the region origin."""
+        if self.transform is not None:
+            return self.transform
+        return CoordinateTransform(offset_x=float(self.region[0]), offset_y=float(self.region[1]))
+
+
+class QueueClosed(Exception):
+    """Raised by DropOldestQueue.get once the queue is closed and empty."""
+
+
+class DropOldestQueue:
+    """Bounded FIFO queue whose ``put`` never blocks: when full, the oldest item is dropped."""
+
+    def __init__(self, maxsize: int = 1):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self._items: Deque[Any] = deque()
+        self._maxsize = maxsize
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        """Append an item, discarding the oldest one if the queue is full."""
+        with self._cond:
+            if len(self._items) >= self._maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """Pop the oldest item, waiting up to ``timeout`` seconds.
+
+        Returns:
+            The item, or None if the timeout expired
+
+        Raises:
+            QueueClosed: If the queue was closed and has been drained
+        """
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            if self._closed:
+                raise QueueClosed()
+            return None
+
+    def has_items(self) -> bool:
+        """Whether anything is waiting in the queue."""
+        return bool(self._items)
+
+    def close(self) -> None:
+        """Wake all waiting consumers; further gets raise QueueClosed once drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class Pipeline:
+    """Runs capture, match and click stages on separate threads.
+
+    Every wait goes through the controller's condition variable or a queue, so
+    pausing or stopping wakes all stages at once and an idle pipeline uses no
+    CPU.
+
+    Args:
+        capture: Returns a (region, image) tuple, or None to skip this scan
+        match: Turns a Frame into Matches, or a list of (x, y, w, h) rects in
+            screen points relative to the region
+        click: Handles a Detections batch; it should call ``pipeline.wait`` for
+            delays and stop early when ``pipeline.superseded`` returns True
+        controller: Run/pause/stop state; stopping it stops the pipeline
+        scheduler: Decides when each capture happens and paces clicks
+        match_workers: Number of matcher threads
+        queue_size: Capacity of each inter-stage queue
+        metrics: Registry for capture timings, stage errors and the latency
+            from a ``mark("hotkey")`` to the pipeline seeing the state change
+    """
+
+    def __init__(
+        self,
+        capture: Callable[[], Optional[Tuple[Tuple[int, int, int, int], Any]]],
+        match: Callable[[Frame], Union[Matches, List[Tuple[int, int, int, int]]]],
+        click: Callable[[Detections, "Pipeline"], None],
+        controller: Controller,
+        scheduler: Optional[ScanScheduler] = None,
+        match_workers: int = 1,
+        queue_size: int = 1,
+        metrics: Optional[Metrics] = None
+    ):
+        self.capture = capture
+        self.match = match
+        self.click = click
+        self.controller = controller
+        self.scheduler = scheduler or ScanScheduler()
+        self.match_workers = max(1, match_workers)
+        self.metrics = metrics or get_metrics()
+        self.frames = DropOldestQueue(queue_size)
+        self.detections = DropOldestQueue(queue_size)
+        self.stale_batches = 0
+        self._seq = 0
+        self._last_clicked_seq = -1
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Start all stage threads."""
+        self._stop.clear()
+        self.controller.add_observer(self._on_state_change)
+        # A click that tightens the schedule wakes a capture wait already in progress
+        self.scheduler.add_listener(self.controller.notify)
+        self._threads = [threading.Thread(target=self._capture_stage, name="capture", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._match_stage, name=f"match-{i}", daemon=True)
+            for i in range(self.match_workers)
+        ]
+        self._threads.append(threading.Thread(target=self._click_stage, name="click", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        if not self.controller.is_running():
+            self.stop()
+
+    def stop(self) -> None:
+        """Ask every stage to finish and wake any that are waiting."""
+        self._stop.set()
+        self.frames.close()
+        self.detections.close()
+        self.controller.notify()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait for all stage threads to exit."""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run(self) -> None:
+        """Start the pipeline and block until it stops."""
+        self.start()
+        try:
+            self._stop.wait()
+        finally:
+            self.stop()
+            self.join()
+            self.controller.remove_observer(self._on_state_change)
+            self.scheduler.remove_listener(self.controller.notify)
+
+    def active(self) -> bool:
+        """Whether the pipeline should keep running."""
+        return not self._stop.is_set() and self.controller.is_running()
+
+    def interrupted(self) -> bool:
+        """Whether in-flight work should be abandoned (stopped or paused)."""
+        return self._stop.is_set() or not self.controller.is_active()
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep for ``seconds``, returning as soon as automation is paused or stopped.
+
+        Returns:
+            True if the full delay elapsed, False if it was interrupted
+        """
+        return not self._stop.is_set() and self.controller.wait(seconds) and not self._stop.is_set()
+
+    def wait_for_scan(self) -> bool:
+        """Sleep until the scheduler says the next scan is due.
+
+        Returns:
+            True when the scan is due, False if paused or stopped first
+        """
+        return self.controller.sleep_until(self._scan_due_in) and not self._stop.is_set()
+
+    def superseded(self, detections: Detections) -> bool:
+        """Whether a newer batch is waiting, making ``detections`` stale."""
+        return self.detections.has_items() and detections.seq < self._seq
+
+    def _scan_due_in(self) -> float:
+        # A stopped pipeline has nothing left to wait for
+        return 0.0 if self._stop.is_set() else self.scheduler.due_in()
+
+    def _on_state_change(self, old: str, new: str) -> None:
+        if not self.controller.is_running():
+            self.stop()
+
+    def _capture_stage(self) -> None:
+        while self.active():
+            # The hotkey has taken effect once this thread sees the new state
+            if self.controller.is_paused():
+                self.metrics.acknowledge("hotkey")
+            if not self.controller.wait_until_active():
+                break
+            self.metrics.acknowledge("hotkey")
+            if not self.wait_for_scan():
+                continue
+            self.scheduler.scan_started()
+            try:
+                with self.metrics.timer("capture"):
+                    captured = self.capture()
+                if captured is not None:
+                    region, image = captured
+                    self._seq += 1
+                    self.frames.put(Frame(self._seq, region, image, time.monotonic()))
+            except Exception as e:
+                self.metrics.inc("capture_errors")
+                logging.error(f"An error occurred while capturing: {e}")
+
+    def _match_stage(self) -> None:
+        while self.active():
+            try:
+                frame = self.frames.get()
+            except QueueClosed:
+                break
+            if frame is None:
+                continue
+            try:
+                found = self.match(frame)
+            except Exception as e:
+                self.metrics.inc("match_errors")
+                logging.error(f"An error occurred while matching: {e}")
+                continue
+            if not isinstance(found, Matches):
+                found = Matches(found)
+            self.scheduler.record_scan(frame.image, len(found.rects))
+            self.detections.put(Detections(frame.seq, frame.region, found.rects, frame.captured_at, found.transform))
+
+    def _click_stage(self) -> None:
+        while self.active():
+            try:
+                batch = self.detections.get()
+            except QueueClosed:
+                break
+            if batch is None:
+                continue
+            # With several matcher threads, results can arrive out of order
+            if batch.seq <= self._last_clicked_seq:
+                self.stale_batches += 1
+                self.metrics.inc("stale_batches")
+                continue
+            if self.interrupted():
+                continue
+            self._last_clicked_seq = batch.seq
+            try:
+                self.click(batch, self)
+            except Exception as e:
+                self.metrics.inc("click_errors")
+                logging.error(f"An error occurred while clicking: {e}")
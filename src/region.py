@@ -0,0 +1,211 @@
+"""
+Browser region detection with a cached, background-refreshed region tracker.
+"""
+import logging
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from src.config import TOOLBAR_HEIGHT, REGION_REFRESH_INTERVAL
+
+# (x, y, width, height)
+Region = Tuple[int, int, int, int]
+
+SUPPORTED_BROWSERS = ("Google Chrome", "Safari", "Firefox", "Microsoft Edge", "Brave Browser")
+
+BOUNDS_APPLESCRIPT = '''
+tell application "System Events"
+    set frontApp to name of first application process whose frontmost is true
+end tell
+try
+    tell application frontApp
+        if frontApp is in {%s} then
+            get bounds of front window
+        else
+            error "Active window is not a supported browser."
+        end if
+    end tell
+on error
+    return missing value
+end try
+''' % ", ".join(f'"{name}"' for name in SUPPORTED_BROWSERS)
+
+
+class RegionBackend(ABC):
+    """Source of the frontmost browser window bounds."""
+
+    @abstractmethod
+    def query(self) -> Optional[Region]:
+        """Return the full window bounds as (x, y, width, height), or None."""
+
+    def close(self) -> None:
+        """Release any resources held by the backend."""
+
+
+class AppleScriptBackend(RegionBackend):
+    """Queries window bounds by running AppleScript through ``osascript``."""
+
+    def __init__(self, timeout: float = 2.0):
+        self.timeout = timeout
+
+    def query(self) -> Optional[Region]:
+        try:
+            proc = subprocess.run(
+                ['osascript', '-'], input=BOUNDS_APPLESCRIPT,
+                capture_output=True, text=True, timeout=self.timeout
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.error(f"Failed to execute AppleScript: {e}")
+            return None
+
+        if proc.returncode != 0 or "missing value" in proc.stdout:
+            logging.error(f"AppleScript Error: {proc.stderr.strip()}")
+            return None
+
+        try:
+            x, y, x2, y2 = [int(v) for v in proc.stdout.strip().split(', ')]
+        except ValueError:
+            logging.error(f"Unexpected AppleScript output: {proc.stdout.strip()!r}")
+            return None
+        return (x, y, x2 - x, y2 - y)
+
+
+class FakeBackend(RegionBackend):
+    """Replays scripted bounds, one per query, for tests and benchmarks.
+
+    Once the script is exhausted the last value is returned forever.
+    """
+
+    def __init__(self, script: Iterable[Optional[Region]]):
+        self._script = list(script)
+        if not self._script:
+            raise ValueError("script must contain at least one entry")
+        self._index = 0
+        self.calls = 0
+
+    def query(self) -> Optional[Region]:
+        self.calls += 1
+        value = self._script[min(self._index, len(self._script) - 1)]
+        self._index += 1
+        return value
+
+
+def toolbar_region(bounds: Region, toolbar_height: int = TOOLBAR_HEIGHT) -> Region:
+    """Crop full window bounds down to the toolbar strip that holds the bookmarks."""
+    x, y, w, _ = bounds
+    return (x, y, w, toolbar_height)
+
+
+class RegionTracker:
+    """Keeps the current browser region in memory.
+
+    The backend is only queried when the cached value is older than ``ttl`` or
+    after ``invalidate()``. With ``start()``, a background thread does the
+    querying so ``current()`` never blocks on the backend. Listeners are called
+    with the new region (or None) whenever focus or window size changes.
+    """
+
+    def __init__(
+        self,
+        backend: RegionBackend,
+        ttl: float = REGION_REFRESH_INTERVAL,
+        toolbar_height: int = TOOLBAR_HEIGHT,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.toolbar_height = toolbar_height
+        self.clock = clock
+        self.generation = 0
+        self.queries = 0
+        self._region: Optional[Region] = None
+        self._stamp: Optional[float] = None
+        self._listeners: List[Callable[[Optional[Region]], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._active = threading.Event()
+        self._active.set()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_listener(self, callback: Callable[[Optional[Region]], None]) -> None:
+        """Register a callback for region changes."""
+        self._listeners.append(callback)
+
+    def current(self) -> Optional[Region]:
+        """Return the cached region, refreshing synchronously only if stale and not running."""
+        if self._thread is None and self.is_stale():
+            return self.refresh()
+        return self._region
+
+    def is_stale(self) -> bool:
+        """Whether the cached region has expired."""
+        return self._stamp is None or self.clock() - self._stamp >= self.ttl
+
+    def invalidate(self) -> None:
+        """Force the next read (or the background thread) to query the backend."""
+        self._stamp = None
+        self._wake.set()
+
+    def refresh(self) -> Optional[Region]:
+        """Query the backend now and update the cached region."""
+        bounds = self.backend.query()
+        region = toolbar_region(bounds, self.toolbar_height) if bounds else None
+        with self._lock:
+            self.queries += 1
+            self._stamp = self.clock()
+            changed = region != self._region
+            self._region = region
+            if changed:
+                self.generation += 1
+        if changed:
+            if region:
+                logging.info(f"Detected browser region: {region}")
+            for callback in list(self._listeners):
+                callback(region)
+        return region
+
+    def start(self) -> None:
+        """Start refreshing the region on a background thread."""
+        if self._thread is not None:
+            return
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="region-tracker", daemon=True)
+        self._thread.start()
+
+    def suspend(self) -> None:
+        """Stop querying in the background until ``resume``, e.g. while automation is paused."""
+        self._active.clear()
+
+    def resume(self) -> None:
+        """Resume background querying, starting with an immediate refresh."""
+        self._stamp = None
+        self._active.set()
+        self._wake.set()
+
+    def stop(self) -> None:
+        """Stop the background thread and close the backend."""
+        self._stop.set()
+        self._active.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.backend.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._active.wait()
+            self._wake.wait(self.ttl)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if not self._active.is_set():
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Region refresh failed: {e}")
@@ -0,0 +1,259 @@
+"""
+Adaptive scan scheduling.
+
+Instead of sleeping a fixed ``scan_delay`` after every scan, the scheduler
+backs off exponentially while the screen is static and empty, and tightens the
+interval as soon as something changes or a bookmark is clicked.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Sequence
+
+from src.config import CLICK_DELAY, SCAN_BACKOFF, SCAN_DELAY, SCAN_MAX_INTERVAL, SCAN_MIN_INTERVAL
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# Decision reasons, in the order they are checked
+CLICKED = "clicked"
+ACTIVE = "active"
+CHANGED = "changed"
+IDLE = "idle"
+
+
+class Decision(NamedTuple):
+    """One scheduling decision: when it was made, the interval chosen and why."""
+    at: float
+    interval: float
+    reason: str
+
+
+class FakeClock:
+    """Manually advanced clock for driving the scheduler in tests and replays."""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += max(0.0, seconds)
+
+
+class ScanScheduler:
+    """Chooses how long to wait before the next scan from recent activity.
+
+    After each scan:
+
+    - a click since the previous scan, or a changed frame with detections,
+      resets the interval to ``min_interval``
+    - a changed frame without detections divides the interval by ``backoff``
+    - an unchanged frame multiplies it by ``backoff``, up to ``max_interval``
+
+    Clicks are paced at least ``click_interval`` apart, and the next scan is
+    never due before ``click_interval`` has passed since the last click, so
+    the page has time to react.
+
+    Args:
+        min_interval: Shortest time between scans
+        max_interval: Longest time between scans
+        initial_interval: Interval used until the first scan is recorded
+        backoff: Factor the interval grows or shrinks by
+        click_interval: Minimum time between clicks
+        diff_threshold: Largest per-pixel difference still treated as unchanged
+        clock: Time source, in seconds
+        history: Number of recent decisions kept for inspection
+    """
+
+    def __init__(
+        self,
+        min_interval: float = SCAN_MIN_INTERVAL,
+        max_interval: float = SCAN_MAX_INTERVAL,
+        initial_interval: float = SCAN_DELAY,
+        backoff: float = SCAN_BACKOFF,
+        click_interval: float = CLICK_DELAY,
+        diff_threshold: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+        history: int = 256
+    ):
+        if min_interval < 0 or max_interval < min_interval:
+            raise ValueError("Need 0 <= min_interval <= max_interval")
+        if backoff < 1.0:
+            raise ValueError("backoff must be at least 1")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.click_interval = click_interval
+        self.diff_threshold = diff_threshold
+        self.clock = clock
+        self.interval = self._clamp(initial_interval)
+        self.decisions: Deque[Decision] = deque(maxlen=history)
+        self.reasons: Counter = Counter()
+        self.scans = 0
+        self.clicks = 0
+        self._last_scan: Optional[float] = None
+        self._last_click: Optional[float] = None
+        self._clicked_since_scan = False
+        self._previous: Optional[np.ndarray] = None
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fixed(cls, interval: float, click_interval: float = CLICK_DELAY, **kwargs) -> "ScanScheduler":
+        """A scheduler that always waits ``interval``, like the old fixed ``scan_delay``."""
+        return cls(interval, interval, interval, 1.0, click_interval, **kwargs)
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Call ``callback()`` whenever a click or ``retune`` may bring the next scan forward."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def due_in(self) -> float:
+        """Seconds until the next scan should start (0 if it is due now)."""
+        with self._lock:
+            if self._last_scan is None:
+                return 0.0
+            due = self._last_scan + self.interval
+            if self._last_click is not None:
+                due = max(due, self._last_click + self.click_interval)
+            return max(0.0, due - self.clock())
+
+    def scan_started(self) -> None:
+        """Mark the start of a scan; the next one is due an interval later."""
+        with self._lock:
+            self._last_scan = self.clock()
+
+    def frame_changed(self, image: np.ndarray) -> bool:
+        """Whether ``image`` differs from the previously observed frame."""
+        previous = self._previous
+        if previous is None or previous.shape != image.shape or previous.dtype != image.dtype:
+            self._previous = image.copy()
+            return True
+        # NORM_INF is the largest absolute pixel difference, computed without a temporary
+        changed = cv2.norm(image, previous, cv2.NORM_INF) > self.diff_threshold
+        if changed:
+            np.copyto(previous, image)
+        return changed
+
+    def record_scan(self, image: np.ndarray, detections: int) -> Decision:
+        """Update the interval after a frame was matched.
+
+        Args:
+            image: The captured frame
+            detections: Number of bookmarks found in it
+
+        Returns:
+            The decision that was made
+        """
+        with self._lock:
+            changed = self.frame_changed(image)
+            if self._clicked_since_scan:
+                reason, interval = CLICKED, self.min_interval
+            elif changed and detections:
+                reason, interval = ACTIVE, self.min_interval
+            elif changed:
+                reason, interval = CHANGED, self.interval / self.backoff
+            else:
+                reason, interval = IDLE, self.interval * self.backoff
+            self._clicked_since_scan = False
+            return self._decide(interval, reason)
+
+    def click_pause(self) -> float:
+        """Seconds to wait before the next click to respect ``click_interval``."""
+        with self._lock:
+            if self._last_click is None:
+                return 0.0
+            return max(0.0, self._last_click + self.click_interval - self.clock())
+
+    def record_click(self) -> None:
+        """Note that a click happened; the next scan comes sooner."""
+        with self._lock:
+            self.clicks += 1
+            self._last_click = self.clock()
+            self._clicked_since_scan = True
+            # Takes effect for a scan already waiting; the decision is logged at the next scan
+            self.interval = self.min_interval
+        for callback in list(self._listeners):
+            callback()
+
+    def retune(
+        self,
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        backoff: Optional[float] = None,
+        click_interval: Optional[float] = None
+    ) -> None:
+        """Change the bounds while running; a waiting scan re-reads its deadline."""
+        with self._lock:
+            if min_interval is not None:
+                self.min_interval = min_interval
+            if max_interval is not None:
+                self.max_interval = max_interval
+            if backoff is not None:
+                self.backoff = backoff
+            if click_interval is not None:
+                self.click_interval = click_interval
+            self.interval = self._clamp(self.interval)
+        for callback in list(self._listeners):
+            callback()
+
+    def metrics(self) -> Dict[str, float]:
+        """Counters and recent interval statistics."""
+        with self._lock:
+            recent = [d.interval for d in self.decisions]
+            return {
+                "interval": round(self.interval, 4),
+                "scans": self.scans,
+                "clicks": self.clicks,
+                "mean_interval": round(float(np.mean(recent)), 4) if recent else 0.0,
+                "at_min": sum(1 for i in recent if i <= self.min_interval),
+                "at_max": sum(1 for i in recent if i >= self.max_interval),
+                **{f"decisions_{reason}": self.reasons[reason] for reason in (CLICKED, ACTIVE, CHANGED, IDLE)},
+            }
+
+    def _decide(self, interval: float, reason: str) -> Decision:
+        self.scans += 1
+        self.interval = self._clamp(interval)
+        self.reasons[reason] += 1
+        decision = Decision(self.clock(), self.interval, reason)
+        self.decisions.append(decision)
+        return decision
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+
+
+def replay(
+    scheduler: ScanScheduler,
+    frames: Sequence[np.ndarray],
+    detect: Callable[[np.ndarray], Sequence],
+    clock: FakeClock
+) -> Dict[str, float]:
+    """Drive ``scheduler`` over recorded frames on a fake clock.
+
+    Each frame is treated as the screen at the time its scan runs; every
+    detection is clicked, with click pacing applied.
+
+    Returns:
+        The scheduler metrics, plus ``elapsed`` simulated seconds
+    """
+    started = clock()
+    for image in frames:
+        clock.advance(scheduler.due_in())
+        scheduler.scan_started()
+        rects = detect(image)
+        scheduler.record_scan(image, len(rects))
+        for _ in rects:
+            clock.advance(scheduler.click_pause())
+            scheduler.record_click()
+    metrics = scheduler.metrics()
+    metrics["elapsed"] = round(clock() - started, 4)
+    return metrics
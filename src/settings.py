@@ -0,0 +1,421 @@
+"""
+Validated, reloadable settings.
+
+Defaults come from src.config. A JSON or TOML file, ``BOOKMARK_CLICKER_*``
+environment variables and command-line overrides are layered on top, in that
+order, and checked against one schema. The result is an immutable Settings
+object, so a running loop can swap in a new one in a single assignment and each
+scan sees one consistent set of values.
+"""
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from src import config
+
+
+class Field(NamedTuple):
+    """One setting: its type, default and an optional range check."""
+    name: str
+    type: type
+    default: Any
+    optional: bool = False
+    check: Optional[Callable[[Any], bool]] = None
+    expect: str = ""
+
+
+def _fraction(value: float) -> bool:
+    return 0.0 < value <= 1.0
+
+
+def _non_negative(value: float) -> bool:
+    return value >= 0
+
+
+def _positive(value: float) -> bool:
+    return value > 0
+
+
+def _rotation(value: str) -> bool:
+    # The intervals TimedRotatingFileHandler accepts
+    value = value.upper()
+    return value in ("S", "M", "H", "D", "MIDNIGHT") or (len(value) == 2 and value[0] == "W" and value[1] in "0123456")
+
+
+FIELDS: Tuple[Field, ...] = (
+    Field("image_path", str, config.IMAGE_PATH),
+    Field("extra_templates", dict, config.EXTRA_TEMPLATES),
+    Field("confidence", float, config.CONFIDENCE, check=_fraction, expect="in (0, 1]"),
+    Field("nms_iou_threshold", float, config.NMS_IOU_THRESHOLD, check=lambda v: 0.0 <= v <= 1.0, expect="in [0, 1]"),
+    Field("click_delay", float, config.CLICK_DELAY, check=_non_negative, expect=">= 0"),
+    Field("click_order", str, config.CLICK_ORDER, check=lambda v: v in config.CLICK_ORDERS,
+          expect=f"one of {config.CLICK_ORDERS}"),
+    Field("click_geometry_ttl", float, config.CLICK_GEOMETRY_TTL, check=_non_negative, expect=">= 0"),
+    Field("scan_delay", float, config.SCAN_DELAY, check=_non_negative, expect=">= 0"),
+    Field("scan_min_interval", float, config.SCAN_MIN_INTERVAL, check=_positive, expect="> 0"),
+    Field("scan_max_interval", float, config.SCAN_MAX_INTERVAL, check=_positive, expect="> 0"),
+    Field("scan_backoff", float, config.SCAN_BACKOFF, check=lambda v: v >= 1.0, expect=">= 1"),
+    Field("watchdog_limit", int, config.WATCHDOG_LIMIT, check=_positive, expect="> 0"),
+    Field("downscale_factor", float, config.DOWNSCALE_FACTOR, check=_fraction, expect="in (0, 1]"),
+    Field("use_grayscale", bool, config.USE_GRAYSCALE),
+    Field("blacklist_duration", int, config.BLACKLIST_DURATION, check=_non_negative, expect=">= 0"),
+    Field("click_tolerance", float, config.CLICK_TOLERANCE, check=_positive, expect="> 0"),
+    Field("history_capacity", int, config.HISTORY_CAPACITY, check=_positive, expect="> 0"),
+    Field("toolbar_height", int, config.TOOLBAR_HEIGHT, check=_positive, expect="> 0"),
+    Field("region_refresh_interval", float, config.REGION_REFRESH_INTERVAL, check=_positive, expect="> 0"),
+    Field("match_workers", int, config.MATCH_WORKERS, check=_positive, expect="> 0"),
+    Field("incremental_matching", bool, config.INCREMENTAL_MATCHING),
+    Field("match_backend", str, config.MATCH_BACKEND, check=lambda v: v in config.MATCH_BACKENDS,
+          expect=f"one of {config.MATCH_BACKENDS}"),
+    Field("parallel_matching", bool, config.PARALLEL_MATCHING),
+    Field("parallel_workers", int, config.PARALLEL_WORKERS, check=_positive, expect="> 0"),
+    Field("parallel_tile_size", int, config.PARALLEL_TILE_SIZE, check=_positive, expect="> 0"),
+    Field("coarse_to_fine", bool, config.COARSE_TO_FINE),
+    Field("coarse_downscale_factor", float, config.COARSE_DOWNSCALE_FACTOR, check=_fraction, expect="in (0, 1]"),
+    Field("coarse_confidence", float, config.COARSE_CONFIDENCE, check=_fraction, expect="in (0, 1]"),
+    Field("tracking", bool, config.TRACKING),
+    Field("track_redetect_interval", int, config.TRACK_REDETECT_INTERVAL, check=_positive, expect="> 0"),
+    Field("track_search_margin", int, config.TRACK_SEARCH_MARGIN, check=_non_negative, expect=">= 0"),
+    Field("track_max_misses", int, config.TRACK_MAX_MISSES, check=_non_negative, expect=">= 0"),
+    Field("log_path", str, config.LOG_PATH, optional=True),
+    Field("log_json_path", str, config.LOG_JSON_PATH, optional=True),
+    Field("log_max_bytes", int, config.LOG_MAX_BYTES, check=_positive, expect="> 0"),
+    Field("log_rotate_when", str, config.LOG_ROTATE_WHEN, optional=True, check=_rotation,
+          expect="S, M, H, D, midnight or W0-W6"),
+    Field("log_repeat_interval", float, config.LOG_REPEAT_INTERVAL, check=_non_negative, expect=">= 0"),
+    Field("log_sample_every", int, config.LOG_SAMPLE_EVERY, check=_non_negative, expect=">= 0"),
+    Field("metrics_report_interval", float, config.METRICS_REPORT_INTERVAL, check=_non_negative, expect=">= 0"),
+    Field("metrics_port", int, config.METRICS_PORT, optional=True,
+          check=lambda v: 0 <= v <= 65535, expect="a TCP port"),
+    Field("hotkey", str, config.TOGGLE_HOTKEY),
+    Field("exit_hotkey", str, config.EXIT_HOTKEY),
+    Field("metrics_hotkey", str, config.METRICS_HOTKEY),
+)
+
+FIELDS_BY_NAME: Dict[str, Field] = {field.name: field for field in FIELDS}
+
+# Read once at startup; a reload that changes these only logs that a restart is needed
+RESTART_REQUIRED: FrozenSet[str] = frozenset({
+    "scan_delay", "click_tolerance", "history_capacity", "match_workers", "parallel_matching", "parallel_workers",
+    "log_path", "log_json_path", "log_max_bytes", "log_rotate_when", "log_repeat_interval", "log_sample_every",
+    "metrics_report_interval", "metrics_port",
+    "hotkey", "exit_hotkey", "metrics_hotkey",
+})
+
+# Values that hold paths; relative ones are resolved against the file they came from
+_PATH_FIELDS = ("image_path", "extra_templates")
+
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off"}
+_NONE = {"", "none", "null"}
+
+
+class Settings:
+    """Immutable, validated application settings.
+
+    Values are read as attributes or, like the old CONFIG dict, by key. Use
+    ``replace`` to derive a changed copy.
+
+    Raises:
+        ValueError: For unknown keys, values of the wrong type or out of range
+    """
+
+    __slots__ = tuple(FIELDS_BY_NAME)
+
+    def __init__(self, **values: Any):
+        errors = [f"unknown setting {name!r}" for name in values if name not in FIELDS_BY_NAME]
+        for field in FIELDS:
+            try:
+                value = _validate(field, values.get(field.name, field.default))
+            except ValueError as e:
+                errors.append(str(e))
+                value = field.default
+            object.__setattr__(self, field.name, value)
+        if not errors and self.scan_min_interval > self.scan_max_interval:
+            errors.append("scan_min_interval must not exceed scan_max_interval")
+        if errors:
+            raise ValueError("Invalid settings: " + "; ".join(errors))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Settings are immutable; use replace()")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Settings are immutable; use replace()")
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in FIELDS_BY_NAME:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Settings) and not self.diff(other)
+
+    def __repr__(self) -> str:
+        return f"Settings({', '.join(f'{k}={v!r}' for k, v in self.as_dict().items())})"
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name) if name in FIELDS_BY_NAME else default
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Plain values, suitable for JSON."""
+        values = {field.name: getattr(self, field.name) for field in FIELDS}
+        values["extra_templates"] = dict(values["extra_templates"])
+        return values
+
+    def replace(self, **changes: Any) -> "Settings":
+        """A validated copy with ``changes`` applied."""
+        return Settings(**{**self.as_dict(), **changes})
+
+    def diff(self, other: "Settings") -> Set[str]:
+        """Names of the settings whose values differ from ``other``."""
+        return {field.name for field in FIELDS if getattr(self, field.name) != getattr(other, field.name)}
+
+
+def _validate(field: Field, value: Any) -> Any:
+    if value is None:
+        if field.optional:
+            return None
+        raise ValueError(f"{field.name} is required")
+    if field.type is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if field.type is dict and isinstance(value, MappingProxyType):
+        # Read back from another Settings, e.g. replace(extra_templates=old.extra_templates)
+        value = dict(value)
+    if not isinstance(value, field.type) or (field.type is int and isinstance(value, bool)):
+        raise ValueError(f"{field.name} must be {field.type.__name__}, got {type(value).__name__} {value!r}")
+    if field.type is dict:
+        if not all(isinstance(k, str) and isinstance(v, str) for k, v in value.items()):
+            raise ValueError(f"{field.name} must map labels to paths")
+        value = MappingProxyType(dict(value))
+    if field.check is not None and not field.check(value):
+        raise ValueError(f"{field.name} must be {field.expect}, got {value!r}")
+    return value
+
+
+def parse_value(name: str, text: str) -> Any:
+    """Convert an environment or command-line string to the type of setting ``name``.
+
+    Raises:
+        ValueError: If ``name`` is unknown or ``text`` cannot be converted
+    """
+    field = FIELDS_BY_NAME.get(name)
+    if field is None:
+        raise ValueError(f"unknown setting {name!r}")
+    lowered = text.strip().lower()
+    if field.optional and lowered in _NONE:
+        return None
+    try:
+        if field.type is bool:
+            if lowered in _TRUE:
+                return True
+            if lowered in _FALSE:
+                return False
+            raise ValueError(text)
+        if field.type is dict:
+            return json.loads(text)
+        return field.type(text)
+    except ValueError:
+        raise ValueError(f"{name} must be {field.type.__name__}, got {text!r}") from None
+
+
+def read_config_file(path: str) -> Dict[str, Any]:
+    """Read a JSON or (by ``.toml`` extension) TOML settings file.
+
+    Relative paths inside the file are resolved against its directory.
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If it cannot be parsed or is not a table of settings
+    """
+    with open(path, "rb") as f:
+        if path.endswith(".toml"):
+            import tomllib
+
+            try:
+                values = tomllib.load(f)
+            except tomllib.TOMLDecodeError as e:
+                raise ValueError(f"Could not parse {path}: {e}") from None
+        else:
+            try:
+                values = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Could not parse {path}: {e}") from None
+    if not isinstance(values, dict):
+        raise ValueError(f"{path} must contain a table of settings")
+    return _resolve_paths(values, os.path.dirname(os.path.abspath(path)))
+
+
+def read_environment(environ: Optional[Mapping[str, str]] = None, prefix: str = config.CONFIG_ENV_PREFIX) -> Dict[str, Any]:
+    """Settings given as ``<prefix><NAME>`` environment variables."""
+    environ = os.environ if environ is None else environ
+    values = {}
+    for key, text in environ.items():
+        name = key[len(prefix):].lower() if key.startswith(prefix) else None
+        if name in FIELDS_BY_NAME:
+            values[name] = parse_value(name, text)
+    return values
+
+
+def parse_overrides(items: List[str]) -> Dict[str, Any]:
+    """Settings given on the command line as ``NAME=VALUE`` strings."""
+    values = {}
+    for item in items:
+        name, sep, text = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected NAME=VALUE, got {item!r}")
+        values[name.strip()] = parse_value(name.strip(), text)
+    return values
+
+
+def config_path(environ: Optional[Mapping[str, str]] = None) -> str:
+    """The settings file: ``BOOKMARK_CLICKER_CONFIG`` if set, else the default."""
+    environ = os.environ if environ is None else environ
+    return environ.get(f"{config.CONFIG_ENV_PREFIX}CONFIG", config.CONFIG_PATH)
+
+
+def load_settings(
+    path: Optional[str] = None,
+    environ: Optional[Mapping[str, str]] = None,
+    overrides: Optional[Mapping[str, Any]] = None
+) -> Settings:
+    """Build settings from the defaults, the file, the environment and ``overrides``.
+
+    Args:
+        path: Settings file; defaults to ``config_path()``. A missing default file is not an error
+        environ: Environment to read ``BOOKMARK_CLICKER_*`` variables from
+        overrides: Highest-priority values, typically from the command line
+
+    Raises:
+        OSError: If an explicitly given file cannot be read
+        ValueError: If any layer holds an invalid setting
+    """
+    explicit = path is not None
+    path = config_path(environ) if path is None else path
+    values: Dict[str, Any] = {}
+    if explicit or os.path.exists(path):
+        values.update(read_config_file(path))
+    values.update(_resolve_paths(read_environment(environ), os.getcwd()))
+    values.update(_resolve_paths(dict(overrides or {}), os.getcwd()))
+    return Settings(**values)
+
+
+def _resolve_paths(values: Dict[str, Any], base: str) -> Dict[str, Any]:
+    def resolve(path: Any) -> Any:
+        if isinstance(path, str) and path and not os.path.isabs(path):
+            return os.path.normpath(os.path.join(base, os.path.expanduser(path)))
+        return path
+
+    for name in _PATH_FIELDS:
+        value = values.get(name)
+        if isinstance(value, dict):
+            values[name] = {label: resolve(p) for label, p in value.items()}
+        elif value is not None:
+            values[name] = resolve(value)
+    return values
+
+
+Listener = Callable[[Settings, Settings, Set[str]], None]
+
+
+class ConfigWatcher:
+    """Reloads the settings file when it changes and reports what changed.
+
+    The file's modification time and size are polled every ``interval`` seconds
+    from a daemon thread; polling works the same on every platform and costs one
+    ``stat`` per interval. Environment and command-line overrides are re-applied
+    on every reload, so they keep precedence over the file. An invalid file is
+    logged and ignored until it changes again.
+
+    Listeners are called as ``callback(old, new, changed_names)``.
+
+    Args:
+        settings: The settings currently in effect
+        path: File to watch; defaults to ``config_path()``
+        interval: Seconds between checks
+        environ: Environment the settings were loaded with
+        overrides: Command-line overrides the settings were loaded with
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        path: Optional[str] = None,
+        interval: float = config.CONFIG_WATCH_INTERVAL,
+        environ: Optional[Mapping[str, str]] = None,
+        overrides: Optional[Mapping[str, Any]] = None
+    ):
+        self.settings = settings
+        self.path = config_path(environ) if path is None else path
+        self.interval = interval
+        self.environ = environ
+        self.overrides = dict(overrides or {})
+        self.reloads = 0
+        self.errors = 0
+        self._listeners: List[Listener] = []
+        self._signature = self._stat()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_listener(self, callback: Listener) -> None:
+        """Call ``callback(old, new, changed)`` after every reload that changes a value."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Listener) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def check(self) -> bool:
+        """Reload now if the file changed since the last check.
+
+        Returns:
+            Whether new settings took effect
+        """
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        if signature is None:
+            # Deleted or mid-replace; keep the current settings until it reappears
+            return False
+        try:
+            new = load_settings(self.path, self.environ, self.overrides)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            logging.error(f"Ignoring changes to {self.path}: {e}")
+            return False
+        old = self.settings
+        changed = old.diff(new)
+        if not changed:
+            return False
+        self.settings = new
+        self.reloads += 1
+        for callback in list(self._listeners):
+            try:
+                callback(old, new, changed)
+            except Exception as e:
+                logging.error(f"Settings listener failed: {e}")
+        return True
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
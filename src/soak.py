@@ -0,0 +1,336 @@
+"""
+Long-run soak test of the automation loop.
+
+Runs the real ``automation_loop`` from bookmark_clicker against a replayed or
+synthetic frame source and a mock input backend, with every configured
+interval divided by ``speed`` so hours of scheduling happen in minutes. Memory,
+threads, error counters and windowed scan/cycle latency are sampled at a fixed
+interval into a time series. The run fails if memory or threads grow, p99
+latency drifts, or any stage error is logged.
+"""
+from __future__ import annotations
+
+import csv
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from src.clicker import MockBackend
+from src.log import dropped_records, setup_logging, shutdown_logging
+from src.metrics import Histogram
+
+# Counters that mean a stage swallowed an exception
+ERROR_COUNTERS = ("capture_errors", "match_errors", "click_errors", "failsafe_stops")
+
+# Histograms whose p99 is checked for drift
+LATENCIES = ("scan", "cycle")
+
+
+class SoakLimits(NamedTuple):
+    """Bounds a soak run must stay within; growth is last quarter against first quarter."""
+    max_rss_growth_mb: float = 50.0
+    max_traced_growth_mb: float = 10.0
+    max_p99_drift: float = 2.0
+    max_thread_growth: int = 0
+    max_errors: int = 0
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where current is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _window_p99(histogram: Histogram, before: Sequence[int], after: Sequence[int]) -> Optional[float]:
+    """p99 in milliseconds of the observations recorded between two ``counts`` copies."""
+    deltas = [b - a for a, b in zip(before, after)]
+    count = sum(deltas)
+    if not count:
+        return None
+    rank = max(1, -(-count * 99 // 100))
+    seen = 0
+    for index, delta in enumerate(deltas):
+        seen += delta
+        if seen >= rank:
+            bound = histogram.bounds[index] if index < len(histogram.bounds) else histogram.max
+            return round(bound * 1000.0, 3)
+    return round(histogram.max * 1000.0, 3)
+
+
+def _counts(histogram: Histogram) -> List[int]:
+    with histogram._lock:
+        return list(histogram.counts)
+
+
+def _mean(values: Sequence[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def quarters(count: int, warmup: int = 1) -> Optional[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    """Sample index ranges [start, end) of the first and last quarter after warm-up; None if too short."""
+    steady = count - warmup
+    if steady < 4:
+        return None
+    quarter = steady // 4
+    return (warmup, warmup + quarter), (count - quarter, count)
+
+
+def check_series(
+    samples: List[Dict],
+    limits: SoakLimits,
+    p99: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+    warmup: int = 1
+) -> List[str]:
+    """Compare the last quarter of a time series with its first quarter.
+
+    Args:
+        samples: Records from ``run_soak``
+        limits: Bounds to enforce
+        p99: Latency name to (first quarter, last quarter) p99 in milliseconds,
+            over every observation in each quarter
+        warmup: Leading samples ignored, while caches and pools fill
+
+    Returns:
+        A description of every bound that was exceeded
+    """
+    failures = []
+    if samples:
+        errors = samples[-1]["errors"]
+        if errors > limits.max_errors:
+            failures.append(f"{errors} stage errors (limit {limits.max_errors})")
+    spans = quarters(len(samples), warmup)
+    if spans is None:
+        failures.append(f"only {max(0, len(samples) - warmup)} samples after warm-up; need 4 to check for drift")
+        return failures
+    first, last = (samples[start:end] for start, end in spans)
+
+    growth = _mean([s["rss_mb"] for s in last]) - _mean([s["rss_mb"] for s in first])
+    if growth > limits.max_rss_growth_mb:
+        failures.append(f"RSS grew {growth:.1f} MiB (limit {limits.max_rss_growth_mb})")
+    if first[0].get("traced_mb") is not None:
+        growth = _mean([s["traced_mb"] for s in last]) - _mean([s["traced_mb"] for s in first])
+        if growth > limits.max_traced_growth_mb:
+            failures.append(f"traced Python memory grew {growth:.1f} MiB (limit {limits.max_traced_growth_mb})")
+    threads = max(s["threads"] for s in last) - max(s["threads"] for s in first)
+    if threads > limits.max_thread_growth:
+        failures.append(f"{threads} more threads (limit {limits.max_thread_growth})")
+    for name, (before, after) in (p99 or {}).items():
+        if before and after is not None and after / before > limits.max_p99_drift:
+            failures.append(
+                f"{name} p99 drifted {before:.1f} -> {after:.1f} ms "
+                f"(x{after / before:.2f}, limit x{limits.max_p99_drift})"
+            )
+    return failures
+
+
+def run_soak(
+    duration: float = 600.0,
+    speed: float = 10.0,
+    sample_interval: float = 5.0,
+    source: str = "synthetic",
+    scene_length: int = 20,
+    trace_allocations: bool = True,
+    limits: SoakLimits = SoakLimits(),
+    log_path: Optional[str] = None,
+    config_path: Optional[str] = None,
+    progress=None
+) -> Dict:
+    """Drive the automation loop for ``duration`` real seconds and sample it.
+
+    Args:
+        duration: Real seconds to run for
+        speed: Factor every scan and click interval is divided by; the loop
+            covers ``duration * speed`` seconds of its normal schedule
+        sample_interval: Real seconds between samples
+        source: Frame source spec, as for the benchmark; replays loop
+        scene_length: Frames each synthetic layout lasts, so icons stay put
+            long enough to be clicked and blacklisted
+        trace_allocations: Track Python allocations with tracemalloc (slower)
+        limits: Bounds checked at the end
+        log_path: Where the loop logs to; a temporary file by default
+        config_path: Settings file the run starts from
+        progress: Stream for one line per sample
+
+    Returns:
+        The samples, a summary and any bound that was exceeded
+    """
+    # The loop lives in the top-level script; imported here so the CLI stays light
+    import bookmark_clicker as clicker
+    from src.frames import open_source
+    from src.settings import load_settings
+
+    log_path = log_path or os.path.join(tempfile.gettempdir(), "bookmark_clicker_soak.log")
+    settings = load_settings(config_path)
+    settings = settings.replace(
+        scan_delay=settings["scan_delay"] / speed,
+        scan_min_interval=settings["scan_min_interval"] / speed,
+        scan_max_interval=settings["scan_max_interval"] / speed,
+        click_delay=settings["click_delay"] / speed,
+        watchdog_limit=10 ** 9,
+        log_path=log_path,
+        log_json_path=None,
+        metrics_report_interval=0.0,
+        metrics_port=None,
+    )
+    clicker.init_runtime(settings)
+    # Thousands of scans an hour; keep them in the file, off the console
+    setup_logging(
+        log_path,
+        max_bytes=settings["log_max_bytes"],
+        when=settings["log_rotate_when"],
+        repeat_interval=settings["log_repeat_interval"],
+        sample_every=settings["log_sample_every"],
+        console=False,
+    )
+    clicker.FRAME_SOURCE = open_source(source, loop=True, template_path=settings["image_path"], scene_length=scene_length)
+    backend = MockBackend(keep=1024)
+    clicker.CLICK_EXECUTOR.backend = backend
+    clicker.CLICK_EXECUTOR.refresh_geometry()
+    metrics = clicker.METRICS
+
+    if trace_allocations:
+        tracemalloc.start()
+    loop = threading.Thread(target=clicker.automation_loop, name="soak-loop", daemon=True)
+    started = time.perf_counter()
+    loop.start()
+    clicker.CONTROLLER.resume()
+
+    samples: List[Dict] = []
+    # Cumulative bucket counts at the start and at every sample, for windowed percentiles
+    history_counts = {name: [_counts(metrics.histogram(name))] for name in LATENCIES}
+    try:
+        while loop.is_alive():
+            elapsed = time.perf_counter() - started
+            if elapsed >= duration:
+                break
+            clicker.CONTROLLER.wait_for_stop(min(sample_interval, duration - elapsed))
+            if not clicker.CONTROLLER.is_running():
+                break
+            elapsed = time.perf_counter() - started
+            counters = dict(metrics.counters)
+            history = clicker.HISTORY.stats()
+            sample = {
+                "t_s": round(elapsed, 2),
+                "simulated_s": round(elapsed * speed, 1),
+                "rss_mb": round(rss_bytes() / 2 ** 20, 2),
+                "traced_mb": round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 3) if trace_allocations else None,
+                "blocks": sys.getallocatedblocks(),
+                "threads": threading.active_count(),
+                "scans": counters.get("scans", 0),
+                "clicks": counters.get("clicks", 0),
+                "errors": sum(counters.get(name, 0) for name in ERROR_COUNTERS),
+                "log_dropped": dropped_records(),
+                "history": history["blacklisted"] + history["recent"],
+            }
+            for name in LATENCIES:
+                counts = history_counts[name]
+                counts.append(_counts(metrics.histogram(name)))
+                sample[f"{name}_p99_ms"] = _window_p99(metrics.histogram(name), counts[-2], counts[-1])
+            samples.append(sample)
+            if progress is not None:
+                progress.write(format_sample(sample) + "\n")
+                progress.flush()
+    finally:
+        clicker.CONTROLLER.stop()
+        loop.join()
+        if trace_allocations:
+            tracemalloc.stop()
+        # Writes out whatever the logging thread still has queued
+        shutdown_logging()
+
+    # Sample i covers counts[i] to counts[i + 1]
+    p99 = {}
+    spans = quarters(len(samples))
+    if spans is not None:
+        for name, counts in history_counts.items():
+            histogram = metrics.histogram(name)
+            p99[name] = tuple(_window_p99(histogram, counts[start], counts[end]) for start, end in spans)
+    failures = check_series(samples, limits, p99)
+    elapsed = time.perf_counter() - started
+    snapshot = metrics.snapshot()
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "duration_s": duration,
+            "speed": speed,
+            "sample_interval_s": sample_interval,
+            "source": source,
+            "trace_allocations": trace_allocations,
+            "limits": limits._asdict(),
+            "log_path": log_path,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "simulated_s": round(elapsed * speed, 1),
+        "scans": snapshot["counters"].get("scans", 0),
+        "clicks": backend.total_clicks,
+        "counters": snapshot["counters"],
+        "latency_ms": {name: snapshot["latency_ms"].get(name, {"count": 0}) for name in LATENCIES},
+        "p99_quarters_ms": p99,
+        "samples": samples,
+        "failures": failures,
+        "passed": not failures,
+    }
+
+
+def format_sample(sample: Dict) -> str:
+    """One progress line for a sample."""
+    traced = f" traced {sample['traced_mb']:.2f} MiB" if sample.get("traced_mb") is not None else ""
+    latency = " ".join(
+        f"{name} p99 {sample[f'{name}_p99_ms']:.1f} ms" for name in LATENCIES
+        if sample.get(f"{name}_p99_ms") is not None
+    )
+    return (
+        f"{sample['t_s']:>8.1f}s (sim {sample['simulated_s']:>9.1f}s) rss {sample['rss_mb']:.1f} MiB{traced} "
+        f"threads {sample['threads']} scans {sample['scans']} clicks {sample['clicks']} "
+        f"errors {sample['errors']} {latency}"
+    )
+
+
+def format_soak_report(report: Dict) -> str:
+    """Human-readable summary of a soak run."""
+    samples = report["samples"]
+    lines = [
+        f"{report['elapsed_s']:.0f} s at x{report['config']['speed']:g} ({report['simulated_s'] / 3600:.2f} h of "
+        f"scheduling): {report['scans']} scans, {report['clicks']} clicks, {len(samples)} samples"
+    ]
+    if samples:
+        first, last = samples[0], samples[-1]
+        lines.append(
+            f"RSS {first['rss_mb']:.1f} -> {last['rss_mb']:.1f} MiB, threads {first['threads']} -> {last['threads']}, "
+            f"allocated blocks {first['blocks']} -> {last['blocks']}"
+        )
+    for name, summary in report["latency_ms"].items():
+        if summary.get("count"):
+            lines.append(f"{name} latency p50 {summary['p50']:.1f} ms, p99 {summary['p99']:.1f} ms, n={summary['count']}")
+    for name, (before, after) in report["p99_quarters_ms"].items():
+        if before is not None and after is not None:
+            lines.append(f"{name} p99 first quarter {before:.1f} ms, last quarter {after:.1f} ms")
+    if report["failures"]:
+        lines.extend(f"FAIL: {failure}" for failure in report["failures"])
+    else:
+        lines.append("PASS")
+    return "\n".join(lines)
+
+
+def write_series_csv(report: Dict, path: str) -> None:
+    """Write the samples as CSV, one row per sample, for plotting."""
+    samples = report["samples"]
+    if not samples:
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(samples[0]))
+        writer.writeheader()
+        writer.writerows(samples)
@@ -0,0 +1,211 @@
+"""
+Template image cache so each template is read and resized once, not on every scan.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config import DOWNSCALE_FACTOR
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+DEFAULT_SCALES = (0.8, 1.0, 1.2)
+
+# A prepared template: (scale, image) where image is already downscaled and scaled
+TemplateVariant = Tuple[float, "np.ndarray"]
+
+
+class TemplatePyramid:
+    """All prepared variants of a single template image.
+
+    Variants are keyed by (grayscale, downscale, scales) and built on first use,
+    so a warm pyramid hands back the same arrays on every scan.
+    """
+
+    def __init__(self, path: str, mtime: float, gray: np.ndarray, color: np.ndarray):
+        self.path = path
+        self.mtime = mtime
+        self.gray = gray
+        self.color = color
+        self._variants: Dict[Tuple[bool, float, Tuple[float, ...]], List[TemplateVariant]] = {}
+        self._lock = threading.Lock()
+
+    def base(self, grayscale: bool = True, downscale: float = 1.0) -> np.ndarray:
+        """Return the template at scale 1.0 after applying the downscale factor."""
+        return self.variants(grayscale, downscale, (1.0,))[0][1]
+
+    def variants(
+        self,
+        grayscale: bool = True,
+        downscale: float = 1.0,
+        scales: Iterable[float] = DEFAULT_SCALES
+    ) -> List[TemplateVariant]:
+        """Return the template resized for every scale at the given downscale.
+
+        Args:
+            grayscale: Whether to use the grayscale or color image
+            downscale: Downscale factor applied to the screenshot
+            scales: Template scales to search at
+
+        Returns:
+            List of (scale, image) tuples in the order of ``scales``
+        """
+        key = (bool(grayscale), round(float(downscale), 4), tuple(float(s) for s in scales))
+        variants = self._variants.get(key)
+        if variants is not None:
+            return variants
+
+        with self._lock:
+            variants = self._variants.get(key)
+            if variants is None:
+                variants = self._build(*key)
+                self._variants[key] = variants
+        return variants
+
+    def _build(self, grayscale: bool, downscale: float, scales: Tuple[float, ...]) -> List[TemplateVariant]:
+        image = self.gray if grayscale else self.color
+        if downscale < 1.0:
+            image = cv2.resize(image, (0, 0), fx=downscale, fy=downscale)
+
+        variants = []
+        for scale in scales:
+            if scale == 1.0:
+                scaled = image
+            else:
+                scaled = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            scaled.setflags(write=False)
+            variants.append((scale, scaled))
+        return variants
+
+
+class TemplateStore:
+    """LRU cache of template pyramids keyed by file path and modification time.
+
+    Editing a template file changes its mtime, which makes the next lookup reload
+    it from disk. Only ``os.stat`` is paid on a warm lookup. Colour templates are
+    kept in RGB, the channel order every frame source produces.
+
+    Args:
+        capacity: Most templates kept
+        downscales: Downscale factors prepared as soon as a template loads; see ``warm``
+        scales: Template scales prepared at each downscale
+    """
+
+    def __init__(
+        self,
+        capacity: int = 8,
+        downscales: Iterable[float] = (DOWNSCALE_FACTOR,),
+        scales: Iterable[float] = DEFAULT_SCALES
+    ):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.downscales = tuple(downscales)
+        self.scales = tuple(scales)
+        self._entries: "OrderedDict[str, TemplatePyramid]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> TemplatePyramid:
+        """Return the pyramid for ``path``, loading it if missing or stale.
+
+        Raises:
+            ValueError: If the image cannot be read
+        """
+        key = os.path.abspath(path)
+        try:
+            mtime = os.stat(key).st_mtime
+        except OSError as e:
+            raise ValueError(f"Failed to load template image from {path}: {e}") from e
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load(key, mtime)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return entry
+
+    def variants(
+        self,
+        path: str,
+        grayscale: bool = True,
+        downscale: float = 1.0,
+        scales: Optional[Iterable[float]] = None
+    ) -> List[TemplateVariant]:
+        """Shortcut for ``get(path).variants(...)`` using the store's default scales."""
+        return self.get(path).variants(grayscale, downscale, self.scales if scales is None else scales)
+
+    def warm(self, downscales: Iterable[float]) -> None:
+        """Prepare variants at ``downscales`` for every template from now on.
+
+        Pass the configured downscale factors (the coarse and native ones with
+        coarse-to-fine) so the first scan does not build them. Templates
+        already loaded are prepared now.
+        """
+        self.downscales = tuple(downscales)
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            self._prepare(entry)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drop one cached template, or all of them when ``path`` is None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self, path: str, mtime: float) -> TemplatePyramid:
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        color = cv2.imread(path, cv2.IMREAD_COLOR)
+        if gray is None or color is None:
+            raise ValueError(f"Failed to load template image from {path}")
+        # OpenCV reads BGR; captures, replays and batch images are all RGB
+        color = cv2.cvtColor(color, cv2.COLOR_BGR2RGB)
+
+        pyramid = TemplatePyramid(path, mtime, gray, color)
+        self._prepare(pyramid)
+        return pyramid
+
+    def _prepare(self, pyramid: TemplatePyramid) -> None:
+        # Warm every (downscale x scale) combination up front so the first scan is cheap too
+        for downscale in self.downscales:
+            for grayscale in (True, False):
+                pyramid.variants(grayscale, downscale, self.scales)
+
+
+_default_store: Optional[TemplateStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_template_store() -> TemplateStore:
+    """Return the process-wide template store, creating it on first use."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = TemplateStore()
+    return _default_store
@@ -0,0 +1,194 @@
+"""
+Frame-to-frame tracking of detected icons.
+
+Between full detections, each known icon is re-verified only in a small window
+around its last position, so per-frame cost grows with the number of icons
+rather than with the size of the region. A full detection runs every
+``redetect_every`` frames, or as soon as a track is lost.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from src.config import CONFIDENCE, TRACK_MAX_MISSES, TRACK_REDETECT_INTERVAL, TRACK_SEARCH_MARGIN
+from src.matcher import Detection
+from src.templates import TemplateVariant
+from src.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+
+class TrackedDetection(NamedTuple):
+    """A Detection with the identity of the track it belongs to."""
+    x: int
+    y: int
+    w: int
+    h: int
+    score: float
+    label: str
+    track_id: int
+
+
+class Track:
+    """An icon followed across frames."""
+
+    __slots__ = ("track_id", "x", "y", "w", "h", "score", "label", "variant", "misses", "age")
+
+    def __init__(self, track_id: int, detection: Detection, variant: int):
+        self.track_id = track_id
+        self.x, self.y, self.w, self.h = detection[:4]
+        self.score = detection.score
+        self.label = detection.label
+        self.variant = variant
+        self.misses = 0
+        self.age = 0
+
+    def detection(self) -> TrackedDetection:
+        return TrackedDetection(self.x, self.y, self.w, self.h, self.score, self.label, self.track_id)
+
+
+def _iou(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class IconTracker:
+    """Keeps track IDs for icons and re-verifies them locally between full detections.
+
+    Args:
+        redetect_every: Frames between full detections (1 detects every frame)
+        search_margin: Pixels searched around a track's last position
+        max_misses: Frames a track may fail verification before it is dropped
+        confidence: Match threshold for verification
+        min_iou: Overlap needed to carry a track over to a fresh detection
+    """
+
+    def __init__(
+        self,
+        redetect_every: int = TRACK_REDETECT_INTERVAL,
+        search_margin: int = TRACK_SEARCH_MARGIN,
+        max_misses: int = TRACK_MAX_MISSES,
+        confidence: float = CONFIDENCE,
+        min_iou: float = 0.3
+    ):
+        self.redetect_every = max(1, redetect_every)
+        self.search_margin = search_margin
+        self.max_misses = max_misses
+        self.confidence = confidence
+        self.min_iou = min_iou
+        self.tracks: List[Track] = []
+        self._next_id = 1
+        self._since_detect: Optional[int] = None
+        self._variants: Optional[List[TemplateVariant]] = None
+        self._shape: Optional[Tuple[int, ...]] = None
+        self._lock = threading.Lock()
+        self.full_detections = 0
+        self.tracked_frames = 0
+        self.lost_tracks = 0
+
+    def reset(self) -> None:
+        """Drop all tracks so the next frame runs a full detection."""
+        with self._lock:
+            self.tracks = []
+            self._since_detect = None
+
+    def update(
+        self,
+        frame: np.ndarray,
+        variants: List[TemplateVariant],
+        labels: List[str],
+        detect: Callable[[], List[Detection]]
+    ) -> List[TrackedDetection]:
+        """Follow known icons into ``frame``, falling back to ``detect()`` when needed.
+
+        Args:
+            frame: Image the detections are expressed in
+            variants: The variants ``detect`` searches with, in ``frame`` scale
+            labels: Label of each variant
+            detect: Full detection over ``frame``
+
+        Returns:
+            Current detections, each with a stable track ID
+        """
+        with self._lock:
+            if (self._since_detect is None or self._since_detect + 1 >= self.redetect_every
+                    or variants is not self._variants or frame.shape != self._shape
+                    or not self._verify(frame, variants)):
+                self._associate(detect(), variants, labels)
+                self._variants = variants
+                self._shape = frame.shape
+                self._since_detect = 0
+                self.full_detections += 1
+            else:
+                self._since_detect += 1
+                self.tracked_frames += 1
+            # Tracks that missed this frame are kept for re-verification but not reported
+            return [track.detection() for track in self.tracks if not track.misses]
+
+    def stats(self) -> Dict[str, int]:
+        """Tracking counters."""
+        return {
+            "tracks": len(self.tracks),
+            "full_detections": self.full_detections,
+            "tracked_frames": self.tracked_frames,
+            "lost_tracks": self.lost_tracks,
+        }
+
+    def _verify(self, frame: np.ndarray, variants: List[TemplateVariant]) -> bool:
+        """Re-locate every track near its last position; False if one was lost."""
+        height, width = frame.shape[:2]
+        margin = self.search_margin
+        lost = False
+        for track in self.tracks:
+            template = variants[track.variant][1]
+            x0, y0 = max(0, track.x - margin), max(0, track.y - margin)
+            x1, y1 = min(width, track.x + track.w + margin), min(height, track.y + track.h + margin)
+            score = -1.0
+            if x1 - x0 >= track.w and y1 - y0 >= track.h:
+                result = cv2.matchTemplate(frame[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+                _, score, _, (px, py) = cv2.minMaxLoc(result)
+            track.age += 1
+            if score >= self.confidence:
+                track.x, track.y, track.score, track.misses = x0 + px, y0 + py, score, 0
+            else:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    lost = True
+        if lost:
+            self.lost_tracks += sum(1 for track in self.tracks if track.misses > self.max_misses)
+        return not lost
+
+    def _associate(self, detections: List[Detection], variants: List[TemplateVariant], labels: List[str]) -> None:
+        """Replace the tracks with ``detections``, keeping IDs of tracks they overlap."""
+        by_shape = {
+            (labels[index] if labels else "", template.shape[1], template.shape[0]): index
+            for index, (_, template) in enumerate(variants)
+        }
+        previous = list(self.tracks)
+        tracks = []
+        for detection in detections:
+            variant = by_shape.get((detection.label, detection.w, detection.h))
+            if variant is None:
+                continue
+            best, best_iou = None, self.min_iou
+            for track in previous:
+                overlap = _iou(tuple(detection[:4]), (track.x, track.y, track.w, track.h))
+                if overlap >= best_iou and track.label == detection.label:
+                    best, best_iou = track, overlap
+            if best is not None:
+                previous.remove(best)
+                best.x, best.y, best.w, best.h = detection[:4]
+                best.score, best.variant, best.misses = detection.score, variant, 0
+                tracks.append(best)
+            else:
+                tracks.append(Track(self._next_id, detection, variant))
+                self._next_id += 1
+        self.tracks = tracks
@@ -0,0 +1,102 @@
+"""
+Mapping from matched-image pixels to screen coordinates.
+
+A detection's box is in the pixels of the image it was matched in: the
+captured frame, possibly downscaled, and on HiDPI displays possibly captured at
+the backing resolution rather than in screen points. One axis-aligned affine
+transform per frame geometry maps whole arrays of boxes to screen coordinates,
+so the click stage does no per-box arithmetic.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+from src.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+Region = Tuple[int, int, int, int]
+
+
+class CoordinateTransform(NamedTuple):
+    """``screen = offset + pixel * scale`` on each axis.
+
+    ``scale`` is screen points per matched pixel, ``1 / (downscale * backing)``,
+    where ``backing`` is captured pixels per screen point.
+    Box sizes already reflect the template scale they were matched at (a
+    variant's box is the size of the scaled template), so only the region
+    offset, the downscale and the backing scale take part.
+    """
+    scale_x: float = 1.0
+    scale_y: float = 1.0
+    offset_x: float = 0.0
+    offset_y: float = 0.0
+
+    @classmethod
+    def for_frame(
+        cls,
+        region: Region,
+        capture_size: Tuple[int, int],
+        matched_size: Optional[Tuple[int, int]] = None
+    ) -> "CoordinateTransform":
+        """The transform for boxes found in a frame captured from ``region``.
+
+        Both factors are measured rather than assumed: the backing scale from
+        the capture against the region (2 on Retina captures, 1 when captures
+        come back in points), and the downscale from the matched image against
+        the capture, which also absorbs the rounding of the resized size.
+
+        Args:
+            region: Captured screen region as (x, y, width, height) in points
+            capture_size: (width, height) of the captured image
+            matched_size: (width, height) of the image the boxes were found in;
+                None when that was the capture itself
+        """
+        x, y, width, height = region
+        capture_width, capture_height = capture_size
+        matched_width, matched_height = matched_size or capture_size
+        backing_x = capture_width / width if width else 1.0
+        backing_y = capture_height / height if height else 1.0
+        downscale_x = matched_width / capture_width if capture_width else 1.0
+        downscale_y = matched_height / capture_height if capture_height else 1.0
+        return cls(1.0 / (downscale_x * backing_x), 1.0 / (downscale_y * backing_y), float(x), float(y))
+
+    def boxes(self, rects: Sequence) -> np.ndarray:
+        """Map (x, y, w, h, ...) rects to an (N, 4) float array of screen boxes."""
+        boxes = _as_boxes(rects)
+        scale = np.array((self.scale_x, self.scale_y, self.scale_x, self.scale_y))
+        return boxes * scale + np.array((self.offset_x, self.offset_y, 0.0, 0.0))
+
+    def centers(self, rects: Sequence) -> np.ndarray:
+        """Screen pixel to click for each rect: its centre, rounded, as an (N, 2) int array."""
+        boxes = _as_boxes(rects)
+        centers = (boxes[:, :2] + boxes[:, 2:] / 2.0) * (self.scale_x, self.scale_y) + (self.offset_x, self.offset_y)
+        return np.floor(centers + 0.5).astype(np.int64)
+
+    def to_image(self, points: Sequence) -> np.ndarray:
+        """Inverse mapping: screen points to matched-image pixels, as an (N, 2) float array."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return (points - (self.offset_x, self.offset_y)) / (self.scale_x, self.scale_y)
+
+
+def _as_boxes(rects: Sequence) -> np.ndarray:
+    if isinstance(rects, np.ndarray):
+        return rects[:, :4].astype(np.float64, copy=False).reshape(-1, 4)
+    # Detections are NamedTuples whose first four fields are x, y, w, h
+    return np.array([rect[:4] for rect in rects], dtype=np.float64).reshape(-1, 4)
+
+
+@lru_cache(maxsize=16)
+def frame_transform(
+    region: Region,
+    capture_size: Tuple[int, int],
+    matched_size: Optional[Tuple[int, int]] = None
+) -> CoordinateTransform:
+    """``CoordinateTransform.for_frame``, computed once per region and image sizes."""
+    return CoordinateTransform.for_frame(region, capture_size, matched_size)
+
+
+def image_size(image: np.ndarray) -> Tuple[int, int]:
+    """(width, height) of an image array."""
+    return image.shape[1], image.shape[0]
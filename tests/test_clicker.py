@@ -0,0 +1,124 @@
+"""ClickExecutor ordering, pacing and cancellation against the recording MockBackend."""
+import threading
+import time
+
+import pytest
+
+from src.clicker import ClickExecutor, InputBackend, MockBackend, nearest_neighbour_order, path_length
+from src.metrics import Metrics
+
+# How long a cancel may take to stop a batch, against a one-second click interval
+BOUND = 0.2
+
+
+def make_executor(interval=0.0, order="nearest", size=(1920, 1080)):
+    backend = MockBackend(size)
+    return ClickExecutor(backend, interval, order=order, metrics=Metrics()), backend
+
+
+def test_backends_must_implement_every_method():
+    class NoPosition(InputBackend):
+        def screen_size(self):
+            return 100, 100
+
+        def click(self, x, y):
+            pass
+
+    with pytest.raises(TypeError, match="position"):
+        NoPosition()
+
+
+def test_nearest_order_starts_from_the_cursor():
+    executor, backend = make_executor()
+    points = [(100, 0), (10, 0), (50, 0)]
+    assert executor.run(points).clicked == [1, 2, 0]
+
+    # The user moved the mouse since the last batch; the next one starts from there
+    backend.cursor = (200, 0)
+    result = executor.run(points)
+    assert result.clicked == [0, 2, 1]
+    assert result.travel == pytest.approx(190)
+
+
+def test_given_order_is_kept():
+    executor, backend = make_executor(order="given")
+    points = [(100, 0), (10, 0), (50, 0)]
+    assert executor.run(points).clicked == [0, 1, 2]
+    assert [(x, y) for _, x, y in backend.clicks] == points
+
+
+def test_nearest_order_is_no_longer_than_given():
+    points = [(500, 40), (20, 40), (900, 40), (260, 40), (700, 40)]
+    ordered = [points[i] for i in nearest_neighbour_order(points, (0, 0))]
+    assert sorted(ordered) == sorted(points)
+    assert path_length(ordered, (0, 0)) <= path_length(points, (0, 0))
+
+
+def test_off_screen_points_are_skipped():
+    executor, backend = make_executor(size=(100, 100))
+    result = executor.run([(-1, 5), (50, 50), (100, 5), (5, 100)])
+    assert result.clicked == [1]
+    assert result.skipped == 3
+    assert backend.total_clicks == 1
+
+
+def test_screen_size_is_cached():
+    executor, backend = make_executor()
+    for _ in range(5):
+        executor.run([(10, 10), (20, 20)])
+    assert backend.size_queries == 1
+    executor.refresh_geometry()
+    executor.run([(10, 10)])
+    assert backend.size_queries == 2
+
+
+def test_clicks_are_paced_within_and_across_batches():
+    interval = 0.02
+    executor, backend = make_executor(interval=interval)
+    clicked = []
+    executor.run([(10, 10), (20, 10), (30, 10)], on_click=lambda index, point: clicked.append(point))
+    executor.run([(40, 10), (50, 10)])
+    stamps = [stamp for stamp, _, _ in backend.clicks]
+    assert len(stamps) == 5
+    assert min(b - a for a, b in zip(stamps, stamps[1:])) >= interval * 0.9
+    assert clicked == [(10, 10), (20, 10), (30, 10)]
+
+
+def test_cancel_stops_a_batch_within_the_bound():
+    executor, backend = make_executor(interval=1.0)
+    results = []
+    worker = threading.Thread(target=lambda: results.append(executor.run([(x, 10) for x in range(10, 100, 10)])))
+    worker.start()
+    while backend.total_clicks == 0:
+        time.sleep(0.001)
+    start = time.monotonic()
+    executor.cancel()
+    worker.join(BOUND * 5)
+    assert time.monotonic() - start < BOUND
+    assert results[0].cancelled
+    assert results[0].clicked == [0]
+    assert executor.metrics.histogram("click_stop").count == 1
+
+
+def test_cancel_between_batches_stops_the_next_one_only():
+    executor, backend = make_executor()
+    executor.cancel()
+    result = executor.run([(10, 10), (20, 10)])
+    assert result.cancelled and result.clicked == []
+    assert executor.run([(10, 10), (20, 10)]).clicked == [0, 1]
+    assert backend.total_clicks == 2
+
+
+def test_clear_cancel_withdraws_a_pending_cancel():
+    executor, _ = make_executor()
+    executor.cancel()
+    executor.clear_cancel()
+    result = executor.run([(10, 10), (20, 10)])
+    assert not result.cancelled and result.clicked == [0, 1]
+
+
+def test_should_stop_ends_the_batch():
+    executor, _ = make_executor()
+    result = executor.run([(10, 10), (20, 10), (30, 10)], should_stop=lambda: executor.clicks >= 2)
+    assert result.cancelled
+    assert result.clicked == [0, 1]
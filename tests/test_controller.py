@@ -0,0 +1,204 @@
+"""Controller waits and how quickly the pipeline reacts to pause and stop."""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.controller import PAUSED, RUNNING, STOPPED, Controller
+from src.metrics import Metrics
+from src.pipeline import Pipeline
+from src.scheduler import ScanScheduler
+
+# How long a pause or stop may take to be seen, against multi-second delays
+BOUND = 0.5
+LONG = 5.0
+
+
+def later(seconds, action):
+    """Run ``action`` on another thread after ``seconds``."""
+    timer = threading.Timer(seconds, action)
+    timer.start()
+    return timer
+
+
+def timed(call):
+    start = time.monotonic()
+    result = call()
+    return result, time.monotonic() - start
+
+
+def test_wait_runs_the_full_delay_while_running():
+    controller = Controller(paused=False)
+    result, elapsed = timed(lambda: controller.wait(0.05))
+    assert result is True
+    assert elapsed >= 0.05
+
+
+@pytest.mark.parametrize("action", ["pause", "stop"])
+def test_wait_returns_early_on_pause_or_stop(action):
+    controller = Controller(paused=False)
+    later(0.05, getattr(controller, action))
+    result, elapsed = timed(lambda: controller.wait(LONG))
+    assert result is False
+    assert elapsed < BOUND
+
+
+def test_wait_returns_at_once_when_not_running():
+    controller = Controller(paused=True)
+    result, elapsed = timed(lambda: controller.wait(LONG))
+    assert result is False
+    assert elapsed < BOUND
+
+
+def test_sleep_until_rereads_the_deadline_on_notify():
+    controller = Controller(paused=False)
+    deadline = [time.monotonic() + LONG]
+
+    def bring_forward():
+        deadline[0] = time.monotonic()
+        controller.notify()
+
+    later(0.05, bring_forward)
+    result, elapsed = timed(lambda: controller.sleep_until(lambda: deadline[0] - time.monotonic()))
+    assert result is True
+    assert elapsed < BOUND
+
+
+@pytest.mark.parametrize("action", ["pause", "stop"])
+def test_sleep_until_returns_early_on_pause_or_stop(action):
+    controller = Controller(paused=False)
+    later(0.05, getattr(controller, action))
+    result, elapsed = timed(lambda: controller.sleep_until(lambda: LONG))
+    assert result is False
+    assert elapsed < BOUND
+
+
+def test_wait_until_active_returns_on_resume():
+    controller = Controller(paused=True)
+    later(0.05, controller.resume)
+    result, elapsed = timed(lambda: controller.wait_until_active(LONG))
+    assert result is True
+    assert elapsed < BOUND
+
+
+def test_wait_until_active_returns_false_on_stop():
+    controller = Controller(paused=True)
+    later(0.05, controller.stop)
+    result, elapsed = timed(lambda: controller.wait_until_active(LONG))
+    assert result is False
+    assert elapsed < BOUND
+
+
+def test_wait_until_active_times_out_while_paused():
+    controller = Controller(paused=True)
+    result, elapsed = timed(lambda: controller.wait_until_active(0.05))
+    assert result is False
+    assert 0.05 <= elapsed < BOUND
+
+
+def test_stop_is_final_and_observers_see_each_change():
+    controller = Controller(paused=True)
+    seen = []
+    controller.add_observer(lambda old, new: seen.append((old, new)))
+    assert controller.toggle() == RUNNING
+    assert controller.toggle() == PAUSED
+    assert controller.stop() == STOPPED
+    assert controller.resume() == STOPPED
+    assert seen == [(PAUSED, RUNNING), (RUNNING, PAUSED), (PAUSED, STOPPED)]
+    assert controller.wait_for_stop(0)
+
+
+class Harness:
+    """A pipeline over blank frames with a scan delay far longer than the bound."""
+
+    def __init__(self, click_delay: float = 0.0):
+        self.controller = Controller(paused=False)
+        self.metrics = Metrics()
+        self.captured = threading.Event()
+        self.clicking = threading.Event()
+        self.click_results = []
+        self.click_delay = click_delay
+        self.pipeline = Pipeline(
+            capture=self.capture,
+            match=lambda frame: [(0, 0, 4, 4)],
+            click=self.click,
+            controller=self.controller,
+            scheduler=ScanScheduler.fixed(LONG, click_interval=0.0),
+            metrics=self.metrics,
+        )
+
+    def capture(self):
+        self.captured.set()
+        return (0, 0, 16, 16), np.zeros((16, 16), np.uint8)
+
+    def click(self, batch, pipeline):
+        self.clicking.set()
+        if self.click_delay:
+            self.click_results.append(pipeline.wait(self.click_delay))
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.pipeline.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.controller.stop()
+        self.thread.join(BOUND)
+
+    def threads_alive(self):
+        return [thread for thread in self.pipeline._threads if thread.is_alive()]
+
+
+def test_stop_ends_the_pipeline_while_it_waits_for_the_next_scan():
+    with Harness() as harness:
+        assert harness.clicking.wait(BOUND)
+        # The capture stage is now sleeping until the next scan, LONG seconds away
+        _, elapsed = timed(lambda: (harness.controller.stop(), harness.thread.join(LONG)))
+        assert not harness.thread.is_alive()
+        assert not harness.threads_alive()
+        assert elapsed < BOUND
+
+
+def test_stop_cuts_a_click_delay_short():
+    with Harness(click_delay=LONG) as harness:
+        assert harness.clicking.wait(BOUND)
+        _, elapsed = timed(lambda: (harness.controller.stop(), harness.thread.join(LONG)))
+        assert not harness.thread.is_alive()
+        assert harness.click_results == [False]
+        assert elapsed < BOUND
+
+
+def test_pause_cuts_a_click_delay_short_and_keeps_the_pipeline_alive():
+    with Harness(click_delay=LONG) as harness:
+        assert harness.clicking.wait(BOUND)
+        start = time.monotonic()
+        harness.controller.pause()
+        deadline = start + BOUND
+        while not harness.click_results and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert harness.click_results == [False]
+        assert time.monotonic() - start < BOUND
+        assert harness.thread.is_alive()
+
+
+def test_pause_is_seen_by_the_capture_stage_within_the_bound():
+    with Harness() as harness:
+        assert harness.clicking.wait(BOUND)
+        harness.metrics.mark("hotkey")
+        harness.controller.pause()
+        deadline = time.monotonic() + BOUND
+        while not harness.metrics.histogram("hotkey_latency").count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert harness.metrics.histogram("hotkey_latency").count == 1
+        assert harness.metrics.histogram("hotkey_latency").max < BOUND
+
+
+def test_resume_after_pause_waits_for_the_scan_that_is_due():
+    with Harness() as harness:
+        assert harness.captured.wait(BOUND)
+        harness.captured.clear()
+        harness.controller.pause()
+        harness.controller.resume()
+        # The next scan is still LONG seconds away; resuming must not trigger one early
+        assert not harness.captured.wait(0.2)
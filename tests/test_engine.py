@@ -0,0 +1,51 @@
+"""The FFT backend agrees with OpenCV and keeps its template spectra bounded."""
+import numpy as np
+import pytest
+
+from src.engine import FFTMatcher
+from src.matcher import compute_responses
+
+
+def textured(shape, seed):
+    return np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+
+
+def variants_of(frame, seed=0):
+    return [(1.0, frame[10:26, 20:36].copy()), (0.8, textured((12, 12) + frame.shape[2:], seed))]
+
+
+@pytest.mark.parametrize("shape", [(80, 240), (81, 97), (60, 200, 3)])
+def test_fft_matches_opencv(shape):
+    frame = textured(shape, 1)
+    variants = variants_of(frame)
+    for result, expected in zip(FFTMatcher().responses(frame, variants), compute_responses(frame, variants)):
+        np.testing.assert_allclose(result, expected, atol=1e-4)
+
+
+def test_spectra_are_kept_for_the_most_recent_shapes_only():
+    matcher = FFTMatcher(max_shapes=2)
+    frames = [textured((80, 120 + 40 * i), i) for i in range(5)]
+    variants = variants_of(frames[0])
+    for frame in frames:
+        matcher.responses(frame, variants)
+    assert len(matcher._spectra) == 2
+
+    # The retained shapes are the two most recent, and still give correct maps
+    for frame in frames[-2:]:
+        for result, expected in zip(matcher.responses(frame, variants), compute_responses(frame, variants)):
+            np.testing.assert_allclose(result, expected, atol=1e-4)
+    assert len(matcher._spectra) == 2
+
+
+def test_replaced_templates_are_dropped():
+    matcher = FFTMatcher()
+    frame = textured((80, 240), 0)
+    for seed in range(10):
+        # A template reload hands over new arrays each time
+        matcher.responses(frame, variants_of(frame, seed))
+    assert [len(spectra) for spectra in matcher._spectra.values()] == [2]
+
+
+def test_max_shapes_must_be_positive():
+    with pytest.raises(ValueError):
+        FFTMatcher(max_shapes=0)
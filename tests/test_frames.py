@@ -0,0 +1,54 @@
+"""The FrameSource interface and the synthetic source used by benchmarks and soak runs."""
+import numpy as np
+import pytest
+
+from src.frames import FrameSource, SyntheticSource
+
+
+class Counted(FrameSource):
+    """Three blank frames, remembering whether it was closed."""
+
+    def __init__(self):
+        self.left = 3
+        self.closed = False
+
+    def read(self):
+        if not self.left:
+            return None
+        self.left -= 1
+        return (0, 0, 4, 2), np.zeros((2, 4, 3), np.uint8)
+
+    def close(self):
+        self.closed = True
+
+
+def test_sources_must_implement_read():
+    class Incomplete(FrameSource):
+        pass
+
+    with pytest.raises(TypeError, match="read"):
+        Incomplete()
+
+
+def test_iteration_ends_when_the_source_is_exhausted_and_the_context_closes_it():
+    with Counted() as source:
+        frames = list(source)
+    assert len(frames) == 3
+    assert source.closed
+
+
+def test_synthetic_frames_are_rgb_with_truth_inside_the_frame():
+    source = SyntheticSource(count=5, size=(320, 40), seed=1)
+    frames = list(source)
+    assert len(frames) == 5
+    region, image = frames[-1]
+    assert image.shape == (40, 320, 3) and image.dtype == np.uint8
+    assert region[2:] == (320, 40)
+    for x, y, w, h in source.truth:
+        assert 0 <= x and x + w <= 320 and 0 <= y and y + h <= 40
+
+
+def test_synthetic_frames_are_deterministic_per_seed():
+    first = [image for _, image in SyntheticSource(count=3, size=(200, 40), seed=4)]
+    second = [image for _, image in SyntheticSource(count=3, size=(200, 40), seed=4)]
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
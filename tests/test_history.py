@@ -0,0 +1,193 @@
+"""SpatialIndex lookups and expiry, and the ClickHistory blacklist built on it."""
+import pytest
+
+from src.history import ClickHistory, SpatialIndex
+from src.scheduler import FakeClock
+
+RADIUS = 10
+
+
+def make_index(capacity=100):
+    clock = FakeClock()
+    return SpatialIndex(RADIUS, capacity, clock), clock
+
+
+@pytest.mark.parametrize("stored, probe", [
+    ((5, 5), (12, 11)),
+    # Neighbouring cells on each side, and diagonally
+    ((9, 50), (11, 50)),
+    ((50, 19), (50, 21)),
+    ((19, 19), (21, 21)),
+    ((-1, -1), (1, 1)),
+    # Exactly at the radius, two cells apart along x
+    ((5, 0), (15, 0)),
+])
+def test_points_within_radius_match_across_cell_borders(stored, probe):
+    index, _ = make_index()
+    index.add(stored)
+    assert index.find(probe) == stored
+    assert probe in index
+
+
+@pytest.mark.parametrize("probe", [(16, 0), (13, 8), (-6, 0)])
+def test_points_beyond_radius_do_not_match(probe):
+    index, _ = make_index()
+    index.add((5, 0))
+    assert index.find(probe) is None
+
+
+def test_find_returns_the_nearest_point():
+    index, _ = make_index()
+    index.add((0, 0))
+    index.add((40, 0))
+    index.add((12, 0))
+    assert len(index) == 3
+    assert index.find((7, 0)) == (12, 0)
+    assert index.find((4, 0)) == (0, 0)
+
+
+def test_adding_near_an_existing_point_replaces_it():
+    index, _ = make_index()
+    index.add((10, 10))
+    index.add((13, 12))
+    assert len(index) == 1
+    assert list(index) == [(13, 12)]
+
+
+def test_expiry_by_round():
+    index, _ = make_index()
+    index.add((0, 0), rounds=2)
+    index.add((100, 0), rounds=1)
+    index.add((200, 0))
+    assert index.advance() == 1
+    assert (100, 0) not in index and (0, 0) in index
+    assert index.advance() == 1
+    assert list(index) == [(200, 0)]
+    assert index.advance(10) == 0
+    assert index.expired == 2
+
+
+def test_expiry_by_time():
+    index, clock = make_index()
+    index.add((0, 0), seconds=5.0)
+    index.add((100, 0), rounds=100, seconds=1.0)
+    clock.advance(1.0)
+    assert index.expire() == 1
+    assert (100, 0) not in index
+    clock.advance(3.9)
+    assert index.expire() == 0
+    clock.advance(0.1)
+    assert index.expire() == 1
+    assert len(index) == 0
+
+
+def test_replaced_entries_do_not_expire_twice():
+    index, _ = make_index()
+    index.add((0, 0), rounds=1)
+    index.add((1, 1), rounds=3)
+    assert index.advance() == 0
+    assert (1, 1) in index
+
+
+def test_eviction_removes_the_soonest_expiring_first():
+    index, clock = make_index(capacity=3)
+    index.add((0, 0), rounds=5)
+    index.add((100, 0), rounds=2)
+    index.add((200, 0))
+    index.add((300, 0), rounds=9)
+    assert index.evicted == 1
+    assert sorted(index) == [(0, 0), (200, 0), (300, 0)]
+
+    index.add((400, 0), seconds=1.0)
+    index.add((500, 0), seconds=2.0)
+    # Round expiries are evicted before time expiries, and entries without any go last
+    assert sorted(index) == [(200, 0), (400, 0), (500, 0)]
+    index.add((600, 0))
+    index.add((700, 0))
+    assert sorted(index) == [(200, 0), (600, 0), (700, 0)]
+    assert len(index) == 3 and index.evicted == 5
+
+
+def test_dead_heap_slots_are_compacted():
+    index, _ = make_index()
+    for _ in range(500):
+        index.add((0, 0), rounds=10)
+    assert len(index) == 1
+    assert len(index._by_round) <= 2 * len(index) + 64
+
+
+def make_history(**kwargs):
+    clock = FakeClock()
+    return ClickHistory(radius=RADIUS, blacklist_rounds=3, clock=clock, **kwargs), clock
+
+
+def test_a_point_clicked_in_consecutive_rounds_is_blacklisted():
+    history, _ = make_history()
+    history.next_round()
+    assert not history.clicked_last_round((50, 50))
+    history.record_click((50, 50))
+
+    history.next_round()
+    assert history.clicked_last_round((53, 48))
+    history.ban((53, 48))
+    assert history.is_blacklisted((50, 50))
+    assert not history.clicked_last_round((50, 50))
+
+    for _ in range(2):
+        history.next_round()
+        assert history.is_blacklisted((50, 50))
+    history.next_round()
+    assert not history.is_blacklisted((50, 50))
+
+
+def test_clicks_are_forgotten_after_the_next_round():
+    history, _ = make_history()
+    history.record_click((50, 50))
+    history.next_round()
+    assert history.clicked_last_round((50, 50))
+    history.next_round()
+    assert not history.clicked_last_round((50, 50))
+
+
+def test_blacklist_seconds_caps_the_ban():
+    history, clock = make_history(blacklist_seconds=2.0)
+    history.ban((50, 50), track_id=7)
+    clock.advance(1.0)
+    history.next_round()
+    assert history.is_blacklisted((50, 50))
+    clock.advance(1.0)
+    history.next_round()
+    assert not history.is_blacklisted((50, 50))
+    assert not history.is_blacklisted((300, 300), track_id=7)
+
+
+def test_track_ids_follow_an_icon_that_moved():
+    history, _ = make_history()
+    history.record_click((50, 50), track_id=7)
+    history.next_round()
+    # Scrolled well beyond the pixel tolerance, but the tracker kept its identity
+    assert history.clicked_last_round((150, 50), track_id=7)
+    assert not history.clicked_last_round((150, 50), track_id=8)
+    history.ban((150, 50), track_id=7)
+    assert history.is_blacklisted((400, 80), track_id=7)
+    assert not history.is_blacklisted((400, 80), track_id=8)
+    for _ in range(3):
+        history.next_round()
+    assert not history.is_blacklisted((400, 80), track_id=7)
+
+
+def test_track_tables_stay_within_capacity():
+    history, _ = make_history(capacity=4)
+    for track_id in range(20):
+        history.record_click((track_id * 100, 0), track_id=track_id)
+    assert len(history._recent_tracks) <= 4
+    assert history.clicked_last_round((-500, -500), track_id=19)
+
+
+def test_stats_count_hits_and_misses():
+    history, _ = make_history()
+    history.ban((10, 10))
+    history.is_blacklisted((10, 10))
+    history.is_blacklisted((500, 500))
+    stats = history.stats()
+    assert (stats["hits"], stats["misses"], stats["blacklisted"]) == (1, 1, 1)
@@ -0,0 +1,58 @@
+"""The incremental matcher must agree with a full rescan, whichever backend computes full scans."""
+import numpy as np
+import pytest
+
+from src.engine import FFTMatcher
+from src.incremental import IncrementalMatcher
+from src.matcher import compute_responses
+
+
+def textured(shape, seed):
+    return np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+
+
+@pytest.fixture
+def frames():
+    first = textured((80, 240), 0)
+    second = first.copy()
+    second[30:50, 100:140] = textured((20, 40), 1)
+    return first, second
+
+
+@pytest.fixture
+def variants(frames):
+    return [(1.0, frames[0][10:26, 20:36].copy()), (1.2, frames[0][40:60, 60:80].copy())]
+
+
+@pytest.mark.parametrize("compute", [compute_responses, FFTMatcher().responses], ids=["opencv", "fft"])
+def test_partial_scan_matches_full_rescan(frames, variants, compute):
+    matcher = IncrementalMatcher()
+    matcher.responses(frames[0], variants, compute)
+    updated = matcher.responses(frames[1], variants, compute)
+    assert matcher.full_scans == 1 and matcher.partial_scans == 1
+    for result, expected in zip(updated, compute_responses(frames[1], variants)):
+        np.testing.assert_allclose(result, expected, atol=1e-4)
+
+
+def test_full_scans_use_the_given_backend(frames, variants):
+    calls = []
+
+    def compute(frame, templates):
+        calls.append(frame.shape)
+        return compute_responses(frame, templates)
+
+    matcher = IncrementalMatcher()
+    matcher.responses(frames[0], variants, compute)
+    matcher.responses(frames[1], variants, compute)
+    matcher.reset()
+    matcher.responses(frames[1], variants, compute)
+    assert calls == [frames[0].shape, frames[1].shape]
+
+
+def test_returned_maps_are_not_changed_by_later_calls(frames, variants):
+    matcher = IncrementalMatcher()
+    first = matcher.responses(frames[0], variants)
+    snapshot = [result.copy() for result in first]
+    matcher.responses(frames[1], variants)
+    for result, expected in zip(first, snapshot):
+        np.testing.assert_array_equal(result, expected)
@@ -0,0 +1,52 @@
+"""Throttling is opt-in, and queued records are all written by shutdown."""
+import logging
+
+from src.log import THROTTLE, RepeatFilter, setup_logging, shutdown_logging
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def record(msg, **extra):
+    rec = logging.LogRecord("test", logging.INFO, __file__, 0, msg, None, None)
+    rec.__dict__.update(extra)
+    return rec
+
+
+def test_only_throttled_messages_are_rate_limited():
+    clock = Clock()
+    repeat = RepeatFilter(interval=30.0, clock=clock)
+    assert [repeat.filter(record("--- Paused ---")) for _ in range(3)] == [True] * 3
+    assert [repeat.filter(record("No bookmarks", **THROTTLE)) for _ in range(3)] == [True, False, False]
+    clock.now = 31.0
+    again = record("No bookmarks", **THROTTLE)
+    assert repeat.filter(again)
+    assert again.msg == "No bookmarks (repeated 2 more times)"
+
+
+def test_sampling_passes_every_nth_repeat():
+    repeat = RepeatFilter(interval=30.0, sample_every=3, clock=Clock())
+    passed = [repeat.filter(record("scan", **THROTTLE)) for _ in range(7)]
+    assert passed == [True, False, False, True, False, False, True]
+
+
+def test_shutdown_writes_every_queued_record(tmp_path):
+    path = tmp_path / "clicker.log"
+    setup_logging(str(path), console=False, repeat_interval=30.0)
+    try:
+        for i in range(1000):
+            logging.info(f"record {i}")
+        for _ in range(10):
+            logging.info("--- Resumed ---")
+            logging.info("No bookmarks found in this scan.", extra=THROTTLE)
+    finally:
+        shutdown_logging()
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1000 + 10 + 1
+    assert lines[999].endswith("record 999")
+    assert sum("--- Resumed ---" in line for line in lines) == 10
@@ -0,0 +1,181 @@
+"""Detection on synthetic frames: one box per icon, however closely icons are packed."""
+import cv2
+import numpy as np
+import pytest
+
+from src.config import NMS_IOU_THRESHOLD
+from src.matcher import compute_responses, detect_from_responses, extract_peaks, non_max_suppression
+
+ICON = 16
+
+
+def make_icon(seed: int = 1) -> np.ndarray:
+    """A textured, asymmetric icon that only matches itself strongly."""
+    rng = np.random.default_rng(seed)
+    icon = rng.integers(0, 256, (ICON, ICON), dtype=np.uint8)
+    icon[4:12, 2:6] = 0
+    icon[2:5, 8:14] = 255
+    return icon
+
+
+def make_frame(positions, size=(240, 96), seed: int = 0):
+    """A noisy background with the icon pasted at each (x, y); returns the frame and the truth boxes."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    frame = np.clip(rng.normal(220, 4, (height, width)), 0, 255).astype(np.uint8)
+    icon = make_icon()
+    for x, y in positions:
+        frame[y:y + ICON, x:x + ICON] = icon
+    return frame, [(x, y, ICON, ICON) for x, y in positions]
+
+
+def variants(scales=(1.0,)):
+    icon = make_icon()
+    return [
+        (scale, icon if scale == 1.0 else cv2.resize(icon, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+        for scale in scales
+    ]
+
+
+def detect(frame, scales=(1.0,), **kwargs):
+    templates = variants(scales)
+    return detect_from_responses(compute_responses(frame, templates), templates, **kwargs)
+
+
+def assert_one_per_icon(found, truth, tolerance=2):
+    assert len(found) == len(truth)
+    for x, y, w, h in truth:
+        hits = [d for d in found if abs(d.x - x) <= tolerance and abs(d.y - y) <= tolerance]
+        assert len(hits) == 1, f"expected one detection at {(x, y)}, got {hits}"
+
+
+LAYOUTS = {
+    "separated": [(10, 10), (80, 40), (180, 70)],
+    "adjacent": [(40, 20), (40 + ICON, 20), (40 + 2 * ICON, 20)],
+    "stacked": [(100, 10), (100, 10 + ICON), (100, 10 + 2 * ICON)],
+    "grid": [(150 + dx, 30 + dy) for dx in (0, ICON) for dy in (0, ICON)],
+    "staggered": [(20, 50), (20 + ICON, 50 + ICON // 2), (20 + 2 * ICON, 50)],
+}
+
+
+@pytest.mark.parametrize("layout", sorted(LAYOUTS))
+def test_each_icon_is_detected_once(layout):
+    frame, truth = make_frame(LAYOUTS[layout])
+    assert_one_per_icon(detect(frame, confidence=0.9), truth)
+
+
+@pytest.mark.parametrize("layout", sorted(LAYOUTS))
+def test_scales_collapse_to_one_detection_per_icon(layout):
+    frame, truth = make_frame(LAYOUTS[layout])
+    found = detect(frame, scales=(0.8, 1.0, 1.2), confidence=0.6)
+    assert_one_per_icon(found, truth)
+    assert all(d.w == ICON and d.h == ICON for d in found)
+
+
+def test_detections_are_sorted_left_to_right_then_top_to_bottom():
+    frame, truth = make_frame(LAYOUTS["grid"])
+    found = detect(frame)
+    assert [(d.x, d.y) for d in found] == sorted((x, y) for x, y, _, _ in truth)
+
+
+def test_empty_frame_has_no_detections():
+    frame, _ = make_frame([])
+    assert detect(frame) == []
+
+
+def test_extract_peaks_keeps_one_point_per_blob():
+    result = np.zeros((40, 40), np.float32)
+    result[9:12, 9:12] = 0.95
+    result[10, 10] = 0.99
+    result[30, 5] = 0.92
+    result[20, 30] = 0.5
+    xs, ys, scores = extract_peaks(result, confidence=0.9)
+    assert sorted(zip(xs.tolist(), ys.tolist())) == [(5, 30), (10, 10)]
+    assert sorted(scores.tolist()) == pytest.approx([0.92, 0.99])
+
+
+def test_extract_peaks_skips_maps_below_confidence():
+    xs, ys, scores = extract_peaks(np.full((10, 10), 0.5, np.float32), confidence=0.9)
+    assert len(xs) == len(ys) == len(scores) == 0
+
+
+def boxes_with_iou(iou: float):
+    """Two 10x10 boxes offset horizontally so that their IoU is ``iou``."""
+    # Overlap 10 * (10 - d) over union 10 * (10 + d)
+    offset = 10 * (1 - iou) / (1 + iou)
+    return np.array([[0, 0, 10, 10], [offset, 0, 10, 10]]), np.array([0.9, 0.8])
+
+
+def test_nms_drops_boxes_overlapping_more_than_the_threshold():
+    boxes, scores = boxes_with_iou(NMS_IOU_THRESHOLD + 0.1)
+    assert non_max_suppression(boxes, scores).tolist() == [0]
+
+
+def test_nms_keeps_boxes_overlapping_less_than_the_threshold():
+    boxes, scores = boxes_with_iou(NMS_IOU_THRESHOLD - 0.1)
+    assert sorted(non_max_suppression(boxes, scores).tolist()) == [0, 1]
+
+
+def test_nms_threshold_is_exclusive():
+    boxes, scores = np.array([[0, 0, 10, 10], [5, 0, 10, 10]]), np.array([0.9, 0.8])
+    # IoU of exactly 1/3 is kept at 1/3 and dropped just below it
+    assert sorted(non_max_suppression(boxes, scores, 1 / 3 + 1e-9).tolist()) == [0, 1]
+    assert non_max_suppression(boxes, scores, 1 / 3 - 1e-9).tolist() == [0]
+
+
+def test_nms_keeps_touching_boxes():
+    boxes = np.array([[0, 0, 10, 10], [10, 0, 10, 10], [0, 10, 10, 10]])
+    assert sorted(non_max_suppression(boxes, np.array([0.9, 0.8, 0.7]), 0.0).tolist()) == [0, 1, 2]
+
+
+def test_nms_keeps_highest_score_first():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [50, 0, 10, 10]])
+    assert non_max_suppression(boxes, np.array([0.7, 0.95, 0.8])).tolist() == [1, 2]
+
+
+def test_nms_of_nothing_is_empty():
+    assert non_max_suppression(np.empty((0, 4)), np.empty(0)).size == 0
+
+
+def test_iou_threshold_controls_overlapping_icons():
+    # Icons overlapping by a quarter of their width have an IoU of 1/7: two icons
+    # at the default threshold, merged into one once the threshold drops below it
+    frame, truth = make_frame([(60, 30), (60 + ICON * 3 // 4, 30)])
+    assert_one_per_icon(detect(frame, confidence=0.6, iou_threshold=NMS_IOU_THRESHOLD), truth)
+    assert len(detect(frame, confidence=0.6, iou_threshold=0.1)) == 1
+
+
+def test_colour_templates_match_rgb_frames(tmp_path):
+    from src.frames import SyntheticSource
+    from src.templates import TemplateStore
+
+    path = tmp_path / "icon.png"
+    icon = np.zeros((20, 20, 3), np.uint8)
+    # Pure blue in RGB; an unconverted BGR template would look for pure red
+    icon[:, :] = (0, 0, 255)
+    icon[5:15, 5:15] = (255, 255, 0)
+    assert cv2.imwrite(str(path), cv2.cvtColor(icon, cv2.COLOR_RGB2BGR))
+
+    source = SyntheticSource(count=5, size=(320, 40), template_path=str(path), seed=2)
+    templates = TemplateStore(downscales=()).variants(str(path), grayscale=False, scales=(1.0,))
+    found = truth = 0
+    for _ in range(5):
+        _, frame = source.read()
+        detections = detect_from_responses(compute_responses(frame, templates), templates, confidence=0.9)
+        found += len(detections)
+        truth += len(source.truth)
+        assert_one_per_icon(detections, source.truth)
+    assert truth > 0 and found == truth
+
+
+def test_store_warms_the_configured_downscales(tmp_path):
+    from src.templates import TemplateStore
+
+    path = tmp_path / "icon.png"
+    assert cv2.imwrite(str(path), make_icon())
+    store = TemplateStore(downscales=(0.3,), scales=(1.0,))
+    store.warm((0.25, 1.0))
+    pyramid = store.get(str(path))
+    assert {key[1] for key in pyramid._variants} == {0.25, 1.0}
+    store.warm((0.5,))
+    assert 0.5 in {key[1] for key in pyramid._variants}
@@ -0,0 +1,142 @@
+"""Histogram buckets and quantiles, and the Prometheus text the metrics endpoint serves."""
+import re
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from src.metrics import Histogram, Metrics, MetricsServer
+
+PER_DECADE = 10
+RATIO = 10 ** (1 / PER_DECADE)
+
+
+def test_bounds_span_ten_microseconds_to_a_hundred_seconds():
+    histogram = Histogram(PER_DECADE)
+    assert histogram.bounds[0] == pytest.approx(1e-5)
+    assert histogram.bounds[-1] == pytest.approx(100.0)
+    assert len(histogram.bounds) == 7 * PER_DECADE + 1
+    assert len(histogram.counts) == len(histogram.bounds) + 1
+    ratios = np.diff(np.log10(histogram.bounds))
+    assert np.allclose(ratios, 1 / PER_DECADE)
+
+
+@pytest.mark.parametrize("index", [0, 17, 40, 7 * PER_DECADE])
+def test_values_on_a_bound_fall_in_that_bucket(index):
+    histogram = Histogram(PER_DECADE)
+    bound = histogram.bounds[index]
+    histogram.record(bound)
+    histogram.record(bound * 1.0001)
+    assert histogram.counts[index] == 1
+    assert histogram.counts[index + 1] == 1
+
+
+def test_out_of_range_values_use_the_end_buckets():
+    histogram = Histogram(PER_DECADE)
+    histogram.record(0.0)
+    histogram.record(1e-9)
+    histogram.record(1e3)
+    assert histogram.counts[0] == 2
+    assert histogram.counts[-1] == 1
+    # Beyond the last bound, the maximum is the best estimate
+    assert histogram.percentile(100) == 1e3
+    assert (histogram.min, histogram.max, histogram.count) == (0.0, 1e3, 3)
+
+
+@pytest.mark.parametrize("q", [1, 50, 90, 99, 99.9, 100])
+def test_percentiles_are_within_one_bucket_of_exact(q):
+    samples = np.random.default_rng(4).lognormal(mean=np.log(0.02), sigma=1.0, size=5000)
+    histogram = Histogram(PER_DECADE)
+    for value in samples:
+        histogram.record(float(value))
+    exact = np.percentile(samples, q, method="inverted_cdf")
+    estimate = histogram.percentile(q)
+    # The estimate is the upper bound of the bucket holding the exact value, capped at the maximum
+    assert exact <= estimate <= exact * RATIO * (1 + 1e-9)
+
+
+def test_empty_histogram():
+    histogram = Histogram()
+    assert histogram.percentile(99) == 0.0
+    assert histogram.summary() == {"count": 0}
+
+
+def test_summary_is_in_milliseconds():
+    histogram = Histogram()
+    for value in (0.001, 0.002, 0.003):
+        histogram.record(value)
+    summary = histogram.summary()
+    assert summary["count"] == 3
+    assert summary["mean"] == pytest.approx(2.0)
+    assert summary["max"] == pytest.approx(3.0)
+    assert 2.0 <= summary["p50"] <= 2.0 * RATIO
+
+
+def test_timer_and_marks_use_the_clock():
+    now = [0.0]
+    metrics = Metrics(clock=lambda: now[0])
+    with metrics.timer("match"):
+        now[0] += 0.25
+    metrics.mark("pause")
+    now[0] += 0.5
+    metrics.acknowledge("pause")
+    metrics.acknowledge("pause")
+    assert metrics.histogram("match").total == pytest.approx(0.25)
+    assert metrics.histogram("pause_latency").count == 1
+    assert metrics.histogram("pause_latency").max == pytest.approx(0.5)
+
+
+def populated():
+    metrics = Metrics()
+    metrics.inc("clicks", 3)
+    metrics.inc("scans")
+    for value in (0.002, 0.004, 0.004, 0.5):
+        metrics.observe("scan", value)
+    return metrics
+
+
+SAMPLE = re.compile(r'^[a-z_]+(\{le="([^"]+)"\})? [0-9.e+-]+$')
+
+
+def test_prometheus_text_format():
+    text = populated().prometheus()
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    for line in lines:
+        assert line.startswith("# TYPE ") or SAMPLE.match(line), line
+
+    assert "# TYPE bookmark_clicker_clicks_total counter" in lines
+    assert "bookmark_clicker_clicks_total 3" in lines
+    assert "bookmark_clicker_scans_total 1" in lines
+    assert "# TYPE bookmark_clicker_scan_seconds histogram" in lines
+
+    buckets = [(SAMPLE.match(line).group(2), int(line.split()[-1]))
+               for line in lines if line.startswith("bookmark_clicker_scan_seconds_bucket")]
+    counts = [count for _, count in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1] == ("+Inf", 4)
+    bounds = [float(le) for le, _ in buckets[:-1]]
+    assert bounds == sorted(bounds)
+    # Cumulative counts step up at the buckets holding 2 ms, 4 ms and 500 ms
+    assert sorted(set(counts)) == [1, 3, 4]
+    assert all(float(le) >= 0.002 for le, count in buckets[:-1] if count >= 1)
+    assert "bookmark_clicker_scan_seconds_count 4" in lines
+    assert "bookmark_clicker_scan_seconds_sum 0.510000" in lines
+
+
+def test_server_serves_metrics_on_localhost():
+    server = MetricsServer(populated(), 0)
+    server.start()
+    try:
+        url = f"http://127.0.0.1:{server.port}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.status == 200
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            body = response.read().decode()
+        assert "bookmark_clicker_clicks_total 3" in body
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.stop()
@@ -0,0 +1,116 @@
+"""Mouse tracker recording, exports and the source-to-UI hand-off, without a Tk window."""
+import time
+
+import pytest
+
+from mouse_tracker.mouse_tracker import BINARY_HEADER, CursorStream, FakeSource, RingRecorder, load_binary
+
+
+def filled(capacity, count):
+    recorder = RingRecorder(capacity)
+    for i in range(count):
+        recorder.append(i * 0.5, i, -i)
+    return recorder
+
+
+def test_columns_before_wraparound():
+    recorder = filled(8, 5)
+    assert len(recorder) == 5
+    t, x, y = recorder.columns()
+    assert list(t) == [0.0, 0.5, 1.0, 1.5, 2.0]
+    assert list(x) == [0, 1, 2, 3, 4]
+    assert list(y) == [0, -1, -2, -3, -4]
+
+
+@pytest.mark.parametrize("count", [8, 9, 13, 16, 21])
+def test_wraparound_keeps_the_newest_in_order(count):
+    recorder = filled(8, count)
+    assert len(recorder) == 8
+    t, x, y = recorder.columns()
+    assert list(x) == list(range(count - 8, count))
+    assert list(y) == [-i for i in range(count - 8, count)]
+    assert list(t) == [i * 0.5 for i in range(count - 8, count)]
+
+
+def test_clear_starts_over():
+    recorder = filled(4, 10)
+    recorder.clear()
+    assert len(recorder) == 0
+    recorder.append(1.0, 7, 8)
+    assert [list(column) for column in recorder.columns()] == [[1.0], [7], [8]]
+
+
+def test_csv_export_is_relative_to_the_first_position(tmp_path):
+    recorder = filled(4, 6)
+    path = tmp_path / "track.csv"
+    recorder.export(str(path))
+    lines = path.read_text().splitlines()
+    assert lines[0] == "t,x,y"
+    assert lines[1:] == ["0.000000,2,-2", "0.500000,3,-3", "1.000000,4,-4", "1.500000,5,-5"]
+
+
+def test_binary_export_round_trips(tmp_path):
+    recorder = filled(64, 100)
+    path = tmp_path / "track.bin"
+    recorder.export(str(path))
+    assert path.stat().st_size == BINARY_HEADER.size + 16 * 64
+    assert [list(column) for column in load_binary(str(path))] == [list(c) for c in recorder.columns()]
+
+
+def test_empty_exports(tmp_path):
+    recorder = RingRecorder(4)
+    recorder.export(str(tmp_path / "empty.csv"))
+    recorder.export(str(tmp_path / "empty.bin"))
+    assert (tmp_path / "empty.csv").read_text() == "t,x,y\n"
+    assert [len(column) for column in load_binary(str(tmp_path / "empty.bin"))] == [0, 0, 0]
+
+
+def test_load_binary_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(BINARY_HEADER.pack(b"NOPE", 1, 0))
+    with pytest.raises(ValueError):
+        load_binary(str(path))
+
+
+def test_drain_returns_the_newest_and_records_only_while_recording():
+    recorder = RingRecorder(16)
+    stream = CursorStream(source=None, queue_size=4, recorder=recorder)
+    assert stream.drain() is None
+
+    for i in range(6):
+        stream.push(float(i), i, i)
+    # The two oldest were dropped to stay within the queue size
+    assert (stream.received, stream.dropped) == (6, 2)
+    assert stream.drain() == (5.0, 5, 5)
+    assert len(recorder) == 0
+
+    stream.recording = True
+    stream.push(6.0, 6, 6)
+    stream.push(7.0, 7, 7)
+    assert stream.drain() == (7.0, 7, 7)
+    assert list(recorder.columns()[1]) == [6, 7]
+    assert stream.drained == 6
+
+
+def test_fake_source_drives_the_stream():
+    recorder = RingRecorder(10_000)
+    source = FakeSource(rate=2000.0, center=(500, 400), radius=300)
+    stream = CursorStream(source, recorder=recorder)
+    stream.recording = True
+    stream.start()
+    try:
+        deadline = time.monotonic() + 5.0
+        while source.sent < 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stream.stop()
+    latest = stream.drain()
+    assert source.sent >= 200
+    assert stream.received == source.sent
+    assert len(recorder) == stream.drained == source.sent - stream.dropped
+
+    # Every position lies on the circle, in time order
+    t, x, y = recorder.columns()
+    assert all(abs(((xi - 500) ** 2 + (yi - 400) ** 2) ** 0.5 - 300) <= 1 for xi, yi in zip(x, y))
+    assert list(t) == sorted(t)
+    assert latest == (t[-1], x[-1], y[-1])
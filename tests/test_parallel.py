@@ -0,0 +1,77 @@
+"""ParallelMatcher agrees with in-process matching, including icons on tile seams."""
+import numpy as np
+import pytest
+
+from src.matcher import compute_responses, detect_from_responses, refine_candidates
+from src.parallel import ParallelMatcher, match_tile, tile_grid
+
+ICON = 16
+TILE = 64
+
+
+def make_icon(seed=1):
+    rng = np.random.default_rng(seed)
+    icon = rng.integers(0, 256, (ICON, ICON), dtype=np.uint8)
+    icon[4:12, 2:6] = 0
+    return icon
+
+
+def make_frame(positions, size=(200, 150), seed=0):
+    width, height = size
+    rng = np.random.default_rng(seed)
+    frame = np.clip(rng.normal(220, 4, (height, width)), 0, 255).astype(np.uint8)
+    for x, y in positions:
+        frame[y:y + ICON, x:x + ICON] = make_icon()
+    return frame
+
+
+# Inside tiles, across a vertical seam, across a horizontal seam and on a corner
+POSITIONS = [(5, 5), (TILE - ICON // 2, 20), (100, TILE - 5), (2 * TILE - 8, 2 * TILE - 8), (180, 130)]
+
+
+@pytest.mark.parametrize("shape", [(150, 200), (64, 64), (65, 129), (10, 300)])
+def test_tiles_cover_every_position_exactly_once(shape):
+    covered = np.zeros(shape, np.int32)
+    for x0, y0, x1, y1 in tile_grid(shape, TILE):
+        assert 0 < x1 - x0 <= TILE and 0 < y1 - y0 <= TILE
+        covered[y0:y1, x0:x1] += 1
+    assert np.all(covered == 1)
+
+
+def test_icons_on_tile_seams_are_found_once_by_their_owning_tile():
+    frame = make_frame(POSITIONS)
+    variants = [(1.0, make_icon())]
+    hits = np.concatenate([match_tile(frame, tile, variants, 0.9) for tile in tile_grid(frame.shape, TILE)])
+    assert sorted(map(tuple, hits[:, :2].astype(int).tolist())) == sorted(POSITIONS)
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    with ParallelMatcher(workers=2, tile_size=TILE, confidence=0.8) as parallel:
+        yield parallel
+
+
+def test_parallel_equals_serial(matcher):
+    frame = make_frame(POSITIONS)
+    variants = [(1.0, make_icon()), (1.0, make_icon(seed=2))]
+    labels = ["bookmark", "other"]
+    assert matcher.worthwhile(frame)
+
+    serial = detect_from_responses(compute_responses(frame, variants), variants, 0.8, labels=labels)
+    parallel = matcher.detect(frame, variants, labels)
+    assert [tuple(d[:4]) + (d.label,) for d in parallel] == [tuple(d[:4]) + (d.label,) for d in serial]
+    assert [d.score for d in parallel] == pytest.approx([d.score for d in serial], abs=1e-5)
+    assert len(parallel) == len(POSITIONS)
+
+
+def test_parallel_coarse_proposals_refine_like_serial(matcher):
+    frame = make_frame([(x * 2, y * 2) for x, y in [(5, 5), (60, 20), (150, 40)]], size=(400, 150))
+    small = frame[::2, ::2].copy()
+    coarse = [(1.0, make_icon()[::2, ::2].copy())]
+    fine = [(1.0, make_icon())]
+
+    serial = detect_from_responses(compute_responses(small, coarse), coarse, 0.5)
+    parallel = matcher.detect(small, coarse, confidence=0.5)
+    assert [tuple(d[:4]) for d in parallel] == [tuple(d[:4]) for d in serial]
+    refined = refine_candidates(frame, parallel, fine, 0.5, 0.8)
+    assert [(d.x, d.y) for d in refined] == [(10, 10), (120, 40), (300, 80)]
@@ -0,0 +1,102 @@
+"""RegionTracker caching, invalidation and background refresh against a scripted backend."""
+import threading
+
+import pytest
+
+from src.region import FakeBackend, RegionBackend, RegionTracker
+from src.scheduler import FakeClock
+
+WINDOW = (10, 20, 800, 600)
+MOVED = (50, 60, 1024, 768)
+
+
+def make_tracker(script, ttl=1.0):
+    clock = FakeClock()
+    backend = FakeBackend(script)
+    return RegionTracker(backend, ttl=ttl, toolbar_height=80, clock=clock), backend, clock
+
+
+def test_backends_must_implement_query():
+    class Incomplete(RegionBackend):
+        pass
+
+    with pytest.raises(TypeError, match="query"):
+        Incomplete()
+
+
+def test_current_is_cropped_to_the_toolbar():
+    tracker, _, _ = make_tracker([WINDOW])
+    assert tracker.current() == (10, 20, 800, 80)
+
+
+def test_ttl_hit_and_miss():
+    tracker, backend, clock = make_tracker([WINDOW, MOVED])
+    tracker.current()
+    clock.advance(0.5)
+    assert tracker.current() == (10, 20, 800, 80)
+    assert backend.calls == 1
+
+    clock.advance(0.5)
+    assert tracker.is_stale()
+    assert tracker.current() == (50, 60, 1024, 80)
+    assert backend.calls == 2
+
+
+def test_invalidate_forces_a_query_within_the_ttl():
+    tracker, backend, clock = make_tracker([WINDOW, MOVED])
+    tracker.current()
+    tracker.invalidate()
+    assert tracker.is_stale()
+    assert tracker.current() == (50, 60, 1024, 80)
+    assert backend.calls == 2
+
+
+def test_generation_and_listeners_only_change_with_the_region():
+    tracker, _, _ = make_tracker([WINDOW, WINDOW, MOVED, None])
+    seen = []
+    tracker.add_listener(seen.append)
+
+    tracker.refresh()
+    tracker.refresh()
+    assert tracker.generation == 1
+    assert seen == [(10, 20, 800, 80)]
+
+    tracker.refresh()
+    tracker.refresh()
+    assert tracker.generation == 3
+    assert seen == [(10, 20, 800, 80), (50, 60, 1024, 80), None]
+    assert tracker.queries == 4
+
+
+def test_lost_window_is_retried_on_the_next_read():
+    tracker, backend, _ = make_tracker([None, WINDOW], ttl=0.0)
+    assert tracker.current() is None
+    assert tracker.current() == (10, 20, 800, 80)
+    assert backend.calls == 2
+
+
+def test_background_thread_refreshes_on_invalidate_and_idles_while_suspended():
+    # A long TTL so only invalidate/resume wake the thread
+    tracker, backend, _ = make_tracker([WINDOW, MOVED, WINDOW], ttl=60.0)
+    changed = threading.Event()
+    tracker.add_listener(lambda region: changed.set())
+
+    tracker.start()
+    try:
+        assert backend.calls == 1
+        changed.clear()
+        tracker.invalidate()
+        assert changed.wait(2.0)
+        assert tracker.current() == (50, 60, 1024, 80)
+
+        tracker.suspend()
+        changed.clear()
+        tracker.invalidate()
+        assert not changed.wait(0.2)
+        assert backend.calls == 2
+
+        tracker.resume()
+        assert changed.wait(2.0)
+        assert tracker.current() == (10, 20, 800, 80)
+    finally:
+        tracker.stop()
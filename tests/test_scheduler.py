@@ -0,0 +1,133 @@
+"""ScanScheduler backoff, resets, change detection and replays on a fake clock."""
+import numpy as np
+import pytest
+
+from src.scheduler import ACTIVE, CHANGED, CLICKED, IDLE, FakeClock, ScanScheduler, replay
+
+BLANK = np.zeros((40, 200), np.uint8)
+
+
+def frame(value=0, at=(0, 0)):
+    image = BLANK.copy()
+    image[at] = value
+    return image
+
+
+def make_scheduler(**kwargs):
+    clock = FakeClock()
+    options = dict(min_interval=0.1, max_interval=2.0, initial_interval=0.1, backoff=2.0, click_interval=0.5)
+    options.update(kwargs)
+    return ScanScheduler(clock=clock, **options), clock
+
+
+def test_idle_frames_back_off_up_to_the_cap():
+    scheduler, _ = make_scheduler()
+    scheduler.record_scan(BLANK, 0)
+    intervals = [scheduler.record_scan(BLANK, 0).interval for _ in range(6)]
+    assert intervals == pytest.approx([0.2, 0.4, 0.8, 1.6, 2.0, 2.0])
+    assert scheduler.reasons[IDLE] == 6
+
+
+def test_a_click_resets_the_interval():
+    scheduler, _ = make_scheduler()
+    for _ in range(4):
+        scheduler.record_scan(BLANK, 0)
+    assert scheduler.interval == pytest.approx(0.8)
+
+    scheduler.record_click()
+    # A scan already waiting sees the short interval at once
+    assert scheduler.interval == pytest.approx(0.1)
+    decision = scheduler.record_scan(BLANK, 0)
+    assert decision.reason == CLICKED
+    assert decision.interval == pytest.approx(0.1)
+    assert scheduler.record_scan(BLANK, 0).reason == IDLE
+
+
+def test_a_changed_frame_resets_or_shrinks_the_interval():
+    scheduler, _ = make_scheduler()
+    for _ in range(5):
+        scheduler.record_scan(BLANK, 0)
+    assert scheduler.interval == pytest.approx(1.6)
+
+    decision = scheduler.record_scan(frame(255), 0)
+    assert (decision.reason, decision.interval) == (CHANGED, pytest.approx(0.8))
+    decision = scheduler.record_scan(frame(255, at=(1, 1)), 2)
+    assert (decision.reason, decision.interval) == (ACTIVE, pytest.approx(0.1))
+
+
+def test_frame_changed_respects_the_threshold():
+    scheduler, _ = make_scheduler(diff_threshold=10)
+    assert scheduler.frame_changed(BLANK)
+    assert not scheduler.frame_changed(BLANK)
+    assert not scheduler.frame_changed(frame(10))
+    assert scheduler.frame_changed(frame(11))
+    # The changed frame becomes the reference
+    assert not scheduler.frame_changed(frame(11))
+    # A new size or type always counts as a change
+    assert scheduler.frame_changed(np.zeros((40, 100), np.uint8))
+    assert scheduler.frame_changed(np.zeros((40, 100), np.float32))
+
+
+def test_drift_is_measured_from_the_last_changed_frame():
+    scheduler, _ = make_scheduler(diff_threshold=10)
+    scheduler.frame_changed(BLANK)
+    # The reference only moves on a change, so slow drift is still seen every few steps
+    changed = [value for value in range(5, 60, 5) if scheduler.frame_changed(frame(value))]
+    assert changed == [15, 30, 45]
+
+
+def test_next_scan_waits_for_the_click_interval():
+    scheduler, clock = make_scheduler()
+    scheduler.scan_started()
+    assert scheduler.due_in() == pytest.approx(0.1)
+    scheduler.record_click()
+    assert scheduler.due_in() == pytest.approx(0.5)
+    assert scheduler.click_pause() == pytest.approx(0.5)
+    clock.advance(0.3)
+    assert scheduler.due_in() == pytest.approx(0.2)
+    clock.advance(0.3)
+    assert scheduler.due_in() == 0.0
+    assert scheduler.click_pause() == 0.0
+
+
+def test_retune_clamps_and_notifies():
+    scheduler, _ = make_scheduler()
+    calls = []
+    scheduler.add_listener(lambda: calls.append(True))
+    for _ in range(6):
+        scheduler.record_scan(BLANK, 0)
+    assert scheduler.interval == pytest.approx(2.0)
+
+    scheduler.retune(max_interval=0.5, backoff=4.0)
+    assert scheduler.interval == pytest.approx(0.5)
+    assert calls == [True]
+    scheduler.retune(min_interval=0.2)
+    scheduler.record_click()
+    assert scheduler.interval == pytest.approx(0.2)
+    assert scheduler.record_scan(BLANK, 0).interval == pytest.approx(0.2)
+    assert scheduler.record_scan(BLANK, 0).interval == pytest.approx(0.5)
+    assert len(calls) == 3
+
+
+def test_fixed_scheduler_never_changes_interval():
+    clock = FakeClock()
+    scheduler = ScanScheduler.fixed(0.3, click_interval=0.1, clock=clock)
+    for image, detections in ((BLANK, 0), (frame(255), 3), (BLANK, 0)):
+        assert scheduler.record_scan(image, detections).interval == pytest.approx(0.3)
+
+
+def test_replay_backs_off_on_a_static_screen_and_stays_fast_while_clicking():
+    static, clock = make_scheduler()
+    idle = replay(static, [BLANK] * 20, lambda image: [], clock)
+
+    busy, clock = make_scheduler()
+    frames = [frame(255, at=(0, i)) for i in range(20)]
+    active = replay(busy, frames, lambda image: [object()], clock)
+
+    assert idle["scans"] == active["scans"] == 20
+    assert idle["at_max"] > 10
+    assert active["clicks"] == 20
+    assert active["at_min"] == 20
+    # Clicks are paced: 20 scans with a click each take at least 19 click intervals
+    assert active["elapsed"] >= 19 * 0.5
+    assert idle["elapsed"] > active["elapsed"]
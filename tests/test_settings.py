@@ -0,0 +1,146 @@
+"""Every tuning knob in src/config.py is a validated setting, layered and reloaded in order."""
+import json
+import os
+
+import pytest
+
+from src import config
+from src.settings import FIELDS_BY_NAME, RESTART_REQUIRED, ConfigWatcher, Settings, load_settings
+
+KNOBS = {
+    "nms_iou_threshold": config.NMS_IOU_THRESHOLD,
+    "track_search_margin": config.TRACK_SEARCH_MARGIN,
+    "track_max_misses": config.TRACK_MAX_MISSES,
+    "region_refresh_interval": config.REGION_REFRESH_INTERVAL,
+    "click_geometry_ttl": config.CLICK_GEOMETRY_TTL,
+    "history_capacity": config.HISTORY_CAPACITY,
+    "parallel_tile_size": config.PARALLEL_TILE_SIZE,
+    "log_max_bytes": config.LOG_MAX_BYTES,
+    "log_rotate_when": config.LOG_ROTATE_WHEN,
+    "log_repeat_interval": config.LOG_REPEAT_INTERVAL,
+    "log_sample_every": config.LOG_SAMPLE_EVERY,
+}
+
+
+@pytest.mark.parametrize("name", sorted(KNOBS))
+def test_knobs_default_to_config(name):
+    assert name in FIELDS_BY_NAME
+    assert Settings()[name] == KNOBS[name]
+
+
+@pytest.mark.parametrize("name, value", [
+    ("nms_iou_threshold", 1.5),
+    ("track_search_margin", -1),
+    ("history_capacity", 0),
+    ("parallel_tile_size", 0),
+    ("log_max_bytes", 0),
+    ("log_rotate_when", "weekly"),
+    ("log_sample_every", -1),
+])
+def test_out_of_range_values_are_rejected(name, value):
+    with pytest.raises(ValueError, match=name):
+        Settings(**{name: value})
+
+
+def test_rotation_intervals_are_case_insensitive():
+    assert Settings(log_rotate_when="midnight")["log_rotate_when"] == "midnight"
+    assert Settings(log_rotate_when="w6")["log_rotate_when"] == "w6"
+
+
+def test_startup_only_settings_need_a_restart():
+    assert {"scan_delay", "history_capacity", "log_max_bytes", "log_rotate_when"} <= RESTART_REQUIRED
+    assert "nms_iou_threshold" not in RESTART_REQUIRED
+
+
+def write_config(path, **values):
+    """Write ``values`` as the settings file, making sure the watcher sees a new signature."""
+    previous = os.stat(path).st_mtime_ns if path.exists() else 0
+    path.write_text(json.dumps(values))
+    os.utime(path, ns=(previous + 10**9, previous + 10**9))
+
+
+def test_file_then_environment_then_command_line(tmp_path):
+    path = tmp_path / "config.json"
+    write_config(path, confidence=0.7, scan_backoff=3.0, click_delay=0.5)
+    environ = {f"{config.CONFIG_ENV_PREFIX}SCAN_BACKOFF": "2.5", f"{config.CONFIG_ENV_PREFIX}CONFIDENCE": "0.75"}
+
+    settings = load_settings(str(path), environ, {"confidence": 0.8})
+    assert settings.confidence == 0.8
+    assert settings.scan_backoff == 2.5
+    assert settings.click_delay == 0.5
+    assert settings.coarse_to_fine == config.COARSE_TO_FINE
+
+
+def test_watcher_reloads_changes_and_keeps_overrides(tmp_path):
+    path = tmp_path / "config.json"
+    write_config(path, confidence=0.7)
+    watcher = ConfigWatcher(load_settings(str(path), {}, {"click_delay": 0.4}), str(path), environ={},
+                            overrides={"click_delay": 0.4})
+    seen = []
+    watcher.add_listener(lambda old, new, changed: seen.append(changed))
+    assert not watcher.check()
+
+    write_config(path, confidence=0.9, click_delay=1.0)
+    assert watcher.check()
+    assert seen == [{"confidence"}]
+    assert watcher.settings.confidence == 0.9
+    assert watcher.settings.click_delay == 0.4
+    assert watcher.reloads == 1
+
+
+def test_watcher_ignores_an_invalid_file(tmp_path):
+    path = tmp_path / "config.json"
+    write_config(path, confidence=0.7)
+    watcher = ConfigWatcher(load_settings(str(path), {}), str(path), environ={})
+    write_config(path, confidence=7)
+    assert not watcher.check()
+    assert watcher.errors == 1
+    assert watcher.settings.confidence == 0.7
+
+
+@pytest.fixture
+def runtime():
+    import bookmark_clicker
+
+    bookmark_clicker.init_runtime(Settings())
+    yield bookmark_clicker
+    bookmark_clicker.init_runtime(Settings())
+
+
+def test_apply_settings_keeps_the_templates_when_a_new_one_fails_to_load(runtime, tmp_path):
+    engine = runtime.MATCH_ENGINE
+    applied = runtime.apply_settings(runtime.CONFIG.replace(image_path=str(tmp_path / "missing.png"), confidence=0.7))
+    assert runtime.MATCH_ENGINE is engine
+    assert applied is runtime.CONFIG
+    assert applied.image_path == Settings().image_path
+    assert applied.confidence == 0.7
+
+
+def test_watcher_follows_the_settings_that_took_effect(runtime, tmp_path):
+    path = tmp_path / "config.json"
+    write_config(path, confidence=0.7)
+    runtime.apply_settings(load_settings(str(path), {}))
+    watcher = runtime.watch_settings(str(path), {})
+
+    write_config(path, confidence=0.75, image_path=str(tmp_path / "missing.png"))
+    assert watcher.check()
+    assert watcher.settings == runtime.CONFIG
+    assert runtime.CONFIG.confidence == 0.75
+    assert runtime.CONFIG.image_path == Settings().image_path
+
+
+@pytest.mark.parametrize("command", ["bench", "detect"])
+@pytest.mark.parametrize("flags, configured, expected", [
+    ([], True, True),
+    ([], False, False),
+    (["--no-coarse-to-fine"], True, False),
+    (["--coarse-to-fine"], False, True),
+])
+def test_coarse_to_fine_flag_overrides_the_setting(command, flags, configured, expected):
+    from src.__main__ import apply_config_defaults, build_parser
+
+    parser, _ = build_parser()
+    argv = [command, *flags] + (["shots"] if command == "detect" else [])
+    args = parser.parse_args(argv)
+    apply_config_defaults(args, Settings(coarse_to_fine=configured))
+    assert args.coarse_to_fine is expected
@@ -0,0 +1,98 @@
+"""A short soak run end to end, and the bounds that decide whether a run passes."""
+import pytest
+
+from src.controller import Controller
+from src.soak import SoakLimits, check_series, quarters, run_soak
+
+SAMPLE_FIELDS = {
+    "t_s", "simulated_s", "rss_mb", "traced_mb", "blocks", "threads", "scans", "clicks", "errors",
+    "log_dropped", "history", "scan_p99_ms", "cycle_p99_ms",
+}
+
+
+def series(count=9, rss=(100.0, 100.0), traced=(5.0, 5.0), threads=(6, 6), errors=0):
+    """Samples that move linearly from the first value of each pair to the second."""
+    def at(pair, i):
+        return pair[0] + (pair[1] - pair[0]) * i / (count - 1)
+
+    return [
+        {"rss_mb": at(rss, i), "traced_mb": at(traced, i), "threads": round(at(threads, i)), "errors": errors}
+        for i in range(count)
+    ]
+
+
+def test_quarters_skip_the_warm_up():
+    assert quarters(9) == ((1, 3), (7, 9))
+    assert quarters(5) == ((1, 2), (4, 5))
+    assert quarters(4) is None
+
+
+def test_steady_series_passes():
+    assert check_series(series(), SoakLimits(), {"scan": (10.0, 15.0)}) == []
+
+
+@pytest.mark.parametrize("samples, p99, fragment", [
+    (series(rss=(100.0, 200.0)), None, "RSS grew"),
+    (series(traced=(5.0, 30.0)), None, "traced Python memory grew"),
+    (series(threads=(6, 8)), None, "more threads"),
+    (series(errors=1), None, "stage errors"),
+    (series(), {"cycle": (10.0, 25.0)}, "cycle p99 drifted"),
+    (series(count=4), None, "need 4"),
+])
+def test_each_bound_fails_the_run(samples, p99, fragment):
+    failures = check_series(samples, SoakLimits(), p99)
+    assert len(failures) == 1
+    assert fragment in failures[0]
+
+
+def test_limits_are_inclusive_and_configurable():
+    limits = SoakLimits(max_rss_growth_mb=100.0, max_thread_growth=2, max_p99_drift=3.0, max_errors=1)
+    samples = series(rss=(100.0, 200.0), threads=(6, 8), errors=1)
+    # The first quarter averages samples 1-2 and the last 7-8, so the measured growth is 75 MiB
+    assert check_series(samples, limits, {"scan": (10.0, 30.0)}) == []
+
+
+def test_untraced_runs_skip_the_traced_check():
+    samples = [dict(sample, traced_mb=None) for sample in series(traced=(0.0, 100.0))]
+    assert check_series(samples, SoakLimits()) == []
+
+
+def test_missing_latencies_are_not_drift():
+    assert check_series(series(), SoakLimits(), {"scan": (None, 50.0), "cycle": (10.0, None)}) == []
+
+
+@pytest.fixture
+def clicker():
+    import bookmark_clicker
+
+    yield bookmark_clicker
+    # The run stops the shared controller; later users get a fresh one
+    bookmark_clicker.CONTROLLER = Controller(paused=True)
+
+
+def test_short_soak_run(clicker, tmp_path):
+    limits = SoakLimits(max_rss_growth_mb=500.0, max_traced_growth_mb=100.0, max_p99_drift=1000.0,
+                        max_thread_growth=5)
+    report = run_soak(duration=2.0, speed=50.0, sample_interval=0.2, scene_length=5, limits=limits,
+                      log_path=str(tmp_path / "soak.log"))
+
+    assert set(report) >= {
+        "config", "elapsed_s", "simulated_s", "scans", "clicks", "counters", "latency_ms",
+        "p99_quarters_ms", "samples", "failures", "passed",
+    }
+    assert report["config"]["speed"] == 50.0
+    assert report["config"]["limits"] == limits._asdict()
+    assert report["scans"] > 0 and report["clicks"] > 0
+    assert report["simulated_s"] == pytest.approx(report["elapsed_s"] * 50.0, rel=0.01)
+
+    samples = report["samples"]
+    assert len(samples) >= 5
+    assert all(set(sample) == SAMPLE_FIELDS for sample in samples)
+    assert all(sample["traced_mb"] is not None for sample in samples)
+    assert [s["scans"] for s in samples] == sorted(s["scans"] for s in samples)
+    assert set(report["p99_quarters_ms"]) == {"scan", "cycle"}
+
+    assert report["failures"] == check_series(samples, limits, report["p99_quarters_ms"])
+    assert report["passed"] is (not report["failures"])
+    assert report["passed"], report["failures"]
+    assert (tmp_path / "soak.log").exists()
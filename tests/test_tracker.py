@@ -0,0 +1,128 @@
+"""IconTracker identities, local verification and fallback to full detection."""
+import numpy as np
+
+from src.matcher import compute_responses, detect_from_responses
+from src.tracker import IconTracker
+
+ICON = 16
+LABELS = ["bookmark"]
+
+
+def make_icon(seed=1):
+    rng = np.random.default_rng(seed)
+    icon = rng.integers(0, 256, (ICON, ICON), dtype=np.uint8)
+    icon[4:12, 2:6] = 0
+    return icon
+
+
+VARIANTS = [(1.0, make_icon())]
+
+
+def make_frame(positions, size=(320, 60)):
+    width, height = size
+    frame = np.clip(np.random.default_rng(0).normal(220, 4, (height, width)), 0, 255).astype(np.uint8)
+    for x, y in positions:
+        frame[y:y + ICON, x:x + ICON] = make_icon()
+    return frame
+
+
+class Detector:
+    """Full detection over the current frame, counting how often it runs."""
+
+    def __init__(self):
+        self.frame = None
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        responses = compute_responses(self.frame, VARIANTS)
+        return detect_from_responses(responses, VARIANTS, 0.9, labels=LABELS)
+
+
+def run(tracker, detector, positions):
+    detector.frame = make_frame(positions)
+    found = tracker.update(detector.frame, VARIANTS, LABELS, detector)
+    return {(d.x, d.y): d.track_id for d in found}
+
+
+def test_ids_survive_small_moves_between_and_across_full_detections():
+    tracker, detector = IconTracker(redetect_every=3, search_margin=8, confidence=0.9), Detector()
+    first = run(tracker, detector, [(20, 20), (120, 20)])
+    assert detector.calls == 1
+    ids = sorted(first.values())
+
+    # Verified locally, no full detection, same IDs at the new positions
+    moved = run(tracker, detector, [(24, 22), (117, 18)])
+    assert detector.calls == 1
+    assert moved == {(24, 22): first[(20, 20)], (117, 18): first[(120, 20)]}
+
+    run(tracker, detector, [(27, 22), (114, 18)])
+    # Third frame: a scheduled full detection, matched back to the tracks by overlap
+    redetected = run(tracker, detector, [(30, 22), (111, 18)])
+    assert detector.calls == 2
+    assert sorted(redetected.values()) == ids
+    assert tracker.stats()["tracked_frames"] == 2
+
+
+def test_new_ids_appear_past_the_gate():
+    tracker, detector = IconTracker(redetect_every=1, confidence=0.9, min_iou=0.3), Detector()
+    first = run(tracker, detector, [(20, 20)])
+    (old_id,) = first.values()
+
+    # A shift of 8 px leaves IoU 1/3: still the same icon
+    assert run(tracker, detector, [(28, 20)]) == {(28, 20): old_id}
+    # A jump to where the boxes no longer overlap enough is a new icon
+    jumped = run(tracker, detector, [(200, 20)])
+    assert list(jumped.values()) != [old_id]
+    assert list(jumped.values())[0] > old_id
+
+
+def test_new_icons_get_fresh_ids_next_to_existing_ones():
+    tracker, detector = IconTracker(redetect_every=1, confidence=0.9), Detector()
+    first = run(tracker, detector, [(20, 20)])
+    both = run(tracker, detector, [(20, 20), (150, 20)])
+    assert both[(20, 20)] == first[(20, 20)]
+    assert both[(150, 20)] not in first.values()
+
+
+def test_verification_drops_tracks_that_no_longer_match():
+    tracker = IconTracker(redetect_every=100, search_margin=8, max_misses=1, confidence=0.9)
+    detector = Detector()
+    first = run(tracker, detector, [(20, 20), (120, 20)])
+    assert len(first) == 2
+
+    # The second icon is gone: its track misses once, is hidden but kept
+    assert run(tracker, detector, [(20, 20)]) == {(20, 20): first[(20, 20)]}
+    assert detector.calls == 1
+    assert len(tracker.tracks) == 2
+
+    # A second miss exceeds max_misses, which forces a full detection that drops the track
+    assert run(tracker, detector, [(20, 20)]) == {(20, 20): first[(20, 20)]}
+    assert detector.calls == 2
+    assert len(tracker.tracks) == 1
+    assert tracker.stats()["lost_tracks"] == 1
+
+
+def test_moves_beyond_the_search_margin_fall_back_to_detection():
+    tracker = IconTracker(redetect_every=100, search_margin=4, max_misses=0, confidence=0.9)
+    detector = Detector()
+    run(tracker, detector, [(20, 20)])
+    found = run(tracker, detector, [(60, 20)])
+    assert detector.calls == 2
+    assert list(found) == [(60, 20)]
+
+
+def test_new_variants_or_frame_size_force_a_full_detection():
+    tracker, detector = IconTracker(redetect_every=100, confidence=0.9), Detector()
+    run(tracker, detector, [(20, 20)])
+    detector.frame = make_frame([(20, 20)])
+    tracker.update(detector.frame, list(VARIANTS), LABELS, detector)
+    assert detector.calls == 2
+
+    detector.frame = make_frame([(20, 20)], size=(300, 60))
+    tracker.update(detector.frame, VARIANTS, LABELS, detector)
+    assert detector.calls == 3
+
+    tracker.reset()
+    run(tracker, detector, [(20, 20)])
+    assert detector.calls == 4
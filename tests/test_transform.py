@@ -0,0 +1,92 @@
+"""Matched-pixel to screen mapping for region offsets, Retina captures, downscaling and coarse-to-fine."""
+import cv2
+import numpy as np
+import pytest
+
+from src.matcher import compute_responses, detect_from_responses
+from src.transform import CoordinateTransform, frame_transform, image_size
+
+REGION = (100, 50, 200, 40)
+
+
+def test_region_offset_only():
+    transform = CoordinateTransform.for_frame(REGION, (200, 40))
+    assert transform == CoordinateTransform(1.0, 1.0, 100.0, 50.0)
+    assert transform.centers([(10, 5, 20, 10)]).tolist() == [[120, 60]]
+    assert transform.boxes([(10, 5, 20, 10)]).tolist() == [[110, 55, 20, 10]]
+
+
+def test_retina_capture_is_halved():
+    # A 2x backing store captures twice the pixels of the region in points
+    transform = CoordinateTransform.for_frame(REGION, (400, 80))
+    assert (transform.scale_x, transform.scale_y) == (0.5, 0.5)
+    assert transform.centers([(40, 10, 40, 20)]).tolist() == [[130, 60]]
+
+
+def test_downscale_of_a_retina_capture():
+    transform = CoordinateTransform.for_frame(REGION, (400, 80), (100, 20))
+    assert (transform.scale_x, transform.scale_y) == (2.0, 2.0)
+    assert transform.centers([(10, 0, 10, 10)]).tolist() == [[130, 60]]
+
+
+def test_coarse_to_fine_boxes_are_native():
+    # Refined boxes are in the native capture, so the matched image is the capture itself
+    native = CoordinateTransform.for_frame(REGION, (400, 80), (400, 80))
+    assert native == CoordinateTransform.for_frame(REGION, (400, 80))
+    assert native.centers([(40, 10, 40, 20)]).tolist() == [[130, 60]]
+
+
+@pytest.mark.parametrize("region, capture_size, downscale", [
+    ((0, 0, 640, 80), (640, 80), 1.0),
+    ((37, 25, 640, 80), (640, 80), 0.5),
+    ((37, 25, 640, 80), (1280, 160), 1.0),
+    ((37, 25, 301, 81), (602, 162), 0.3),
+])
+def test_round_trip_between_screen_and_matched_pixels(region, capture_size, downscale):
+    capture = np.zeros(capture_size[::-1], np.uint8)
+    matched = cv2.resize(capture, (0, 0), fx=downscale, fy=downscale) if downscale != 1.0 else capture
+    transform = CoordinateTransform.for_frame(region, capture_size, image_size(matched))
+
+    screen = [(region[0] + 10, region[1] + 7), (region[0] + region[2] - 1, region[1] + region[3] - 1)]
+    pixels = transform.to_image(screen)
+    assert np.all(pixels >= 0)
+    assert np.all(pixels < (matched.shape[1], matched.shape[0]))
+    boxes = np.hstack([pixels, np.zeros_like(pixels)])
+    assert transform.centers(boxes).tolist() == [list(point) for point in screen]
+
+
+def test_detection_on_a_retina_capture_lands_on_the_icon():
+    rng = np.random.default_rng(3)
+    icon = rng.integers(0, 256, (16, 16), dtype=np.uint8)
+    capture = np.full((80, 400), 220, np.uint8)
+    capture[20:36, 60:76] = icon
+
+    templates = [(1.0, icon)]
+    found = detect_from_responses(compute_responses(capture, templates), templates, confidence=0.9)
+    assert len(found) == 1
+    centre = frame_transform(REGION, image_size(capture), image_size(capture)).centers(found)
+    # Icon centre (68, 28) in capture pixels is (34, 14) points into the region
+    assert centre.tolist() == [[134, 64]]
+
+
+def test_frame_transform_cache_is_keyed_on_every_input():
+    frame_transform.cache_clear()
+    base = (REGION, (400, 80), (200, 40))
+    assert frame_transform(*base) is frame_transform(*base)
+    # Changing any one input is a cache miss and gives that input's own transform
+    changed = [
+        ((101, 50, 200, 40), (400, 80), (200, 40)),
+        ((100, 51, 200, 40), (400, 80), (200, 40)),
+        ((100, 50, 400, 40), (400, 80), (200, 40)),
+        ((100, 50, 200, 80), (400, 80), (200, 40)),
+        (REGION, (200, 80), (200, 40)),
+        (REGION, (400, 40), (200, 40)),
+        (REGION, (400, 80), (100, 40)),
+        (REGION, (400, 80), (200, 20)),
+        (REGION, (400, 80)),
+    ]
+    for args in changed:
+        transform = frame_transform(*args)
+        assert transform == CoordinateTransform.for_frame(*args)
+    info = frame_transform.cache_info()
+    assert info.misses == 1 + len(changed)